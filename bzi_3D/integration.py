@@ -4,14 +4,19 @@
 import numpy as np
 from bzi_3D.sampling import HermiteNormalForm
 
-def rectangular_method(EPM, grid, weights):
+def rectangular_method(EPM, grid, weights, energies=None):
     """Find the Fermi level and total energy of an empirical pseudopotential using
     the rectangular method.
     
     Args:
-        EPM (function): the empirical pseudopotential.
+        EPM (function): the empirical pseudopotential. It can be an
+            `EigenvalueCache` to share the eigenvalues with other integrations.
         grid (list): a list of grid points.
         weights(list): a list of k-point weights in the same order as grid.
+        energies (numpy.ndarray): the band energies at the grid points, such as
+            those from `store_grid_energies`, which may be memory-mapped. If None,
+            they are evaluated. Only the bands needed are read, and there must be
+            at least half as many as valence electrons.
     Returns:
         fermi_level (float): the energy of the highest occupied state
         total_energy (float): the band energy
@@ -19,11 +24,16 @@ def rectangular_method(EPM, grid, weights):
 
     C = np.ceil(np.round(EPM.nvalence_electrons*np.sum(weights)/2., 3)).astype(int)
     neigvals = np.ceil(np.round(EPM.nvalence_electrons/2+1, 3)).astype(int) + 4
-    energies = np.array([])
-    for i,g in enumerate(grid):
-        energies = np.concatenate((energies, list(EPM.eval(g, neigvals))*
-                                   int(np.round(weights[i]))))
-    energies = np.sort(energies)[:C]
+    if energies is None:
+        energies = EPM.eval_many(grid, neigvals)
+    else:
+        if np.shape(energies)[1] < np.ceil(EPM.nvalence_electrons/2):
+            msg = ("There must be at least as many bands as half the number of "
+                   "valence electrons.")
+            raise ValueError(msg)
+        energies = np.asarray(energies)[:, :neigvals]
+    energies = np.repeat(energies, np.round(weights).astype(int), axis=0)
+    energies = np.sort(energies.flatten())[:C]
     fermi_level = energies[-1]
     total_energy = np.sum(energies)*np.linalg.det(EPM.lattice.reciprocal_vectors)/(
                    np.sum(weights))
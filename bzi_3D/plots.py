@@ -9,7 +9,7 @@ from matplotlib.patches import FancyArrowPatch
 from mpl_toolkits.mplot3d import proj3d
 import matplotlib.pyplot as plt
 
-from itertools import product, chain
+from itertools import product
 from scipy.spatial import ConvexHull
 from copy import deepcopy
 import time, pickle, os
@@ -30,10 +30,13 @@ from bzi_3D.integration import rectangular_method, rec_dos_nos
 from bzi_3D.tetrahedron import (grid_and_tetrahedra, calc_fermi_level,
                                 calc_total_energy, get_extended_tetrahedra,
                                 get_corrected_total_energy, density_of_states,
-                                number_of_states, tet_dos_nos, find_irreducible_tetrahedra)
+                                number_of_states, tet_dos_nos, find_irreducible_tetrahedra,
+                                get_optimized_tetrahedra, get_optimized_total_energy)
 
 from bzi_3D.make_IBZ import find_bz, orderAngle, planar3dTo2d
 
+from bzi_3D.pseudopots import ParallelEvaluator
+
 from bzi_3D.utilities import remove_points, find_point_indices, check_contained
 
 def ScatterPlotMultiple(func, states, ndivisions, cutoff=None):
@@ -136,7 +139,7 @@ def scatter_plot_pp(EPM, states, nbands, ndivisions, grid_vectors,
         kxlist.append(grid[-1][grid_vectors[0]])
         kylist.append(grid[-1][grid_vectors[1]])
     
-    all_estates = [EPM.eval(kpt, nbands) for kpt in grid]
+    all_estates = EPM.eval_many(grid, nbands)
     prows = int(np.sqrt(len(states)))
     pcols = int(np.ceil(len(states)/prows))
     
@@ -494,10 +497,8 @@ def plot_band_structure(materials_list, EPMlist, EPMargs_list, lattice, npts,
         EPM = EPMlist[i]
         EPMargs = EPMargs_list[i]
         EPMargs["neigvals"] = neigvals
-        for kpt in car_kpoints:
-            EPMargs["kpoint"] = kpt
-            energies[i].append(EPM.eval(**EPMargs) - energy_shift)
-            # energies[i].append(EPM.eval(**EPMargs))
+        EPMargs.pop("kpoint", None)
+        energies[i] = EPM.eval_many(car_kpoints, **EPMargs) - energy_shift
 
 
     colors = ["blue", "green", "red", "violet", "orange", "cyan", "black"]            
@@ -813,7 +814,8 @@ def plot_paths(EPM, npts, save=False):
 
 def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
                             file_names, location, err_correlation=False,
-                            convention="ordinary", degree=None):
+                            convention="ordinary", degree=None, optimized=False,
+                            processes=None):
     """Create a convergence plot of the total energy fermi level convergence for the
     free elecetron model.
     
@@ -830,6 +832,9 @@ def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
         location (str): the file path to where the plots are saved.
         err_correlation (bool): if true, generate a plot of Fermi level error against
             total energy error, and must include three strings in file names.
+        optimized (bool): if true include the optimized tetrahedron method.
+        processes (int): if provided, the eigenvalues are evaluated in this many
+            processes with a `ParallelEvaluator`.
     """
     
     if err_correlation:
@@ -843,6 +848,7 @@ def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
     tet_fl_err = []
     tet_te_err = []
     ctet_te_err = []
+    otet_te_err = []
     sym_rec_fl_err = []
     sym_rec_te_err = []
     sym_tet_fl_err = []
@@ -856,6 +862,10 @@ def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
     lat_shift = [-1./2]*3
     grid_shift = [0,0,0]
 
+    # Evaluate the eigenvalues on the grids in a pool of processes.
+    if processes is not None:
+        EPM = ParallelEvaluator(EPM, processes)
+
     # Change the degree for the free electron model.
     if degree is not None:
         EPM.set_degree(degree)
@@ -937,7 +947,18 @@ def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
             EPM.total_energy = get_corrected_total_energy(EPM, tetrahedra, extended_tetrahedra,
                                                          grid, extended_grid, ndiv0)
             ctet_te_err.append( abs(EPM.total_energy - EPM.total_energy_ans)/EPM.total_energy_ans*100)
+
+        # Calculate the error for the optimized tetrahedron method.
+        if optimized:
+            extended_grid, neighborhoods = get_optimized_tetrahedra(EPM, ndivs, lat_shift,
+                                                                    grid_shift)
+            EPM.total_energy = get_optimized_total_energy(EPM, neighborhoods, extended_grid,
+                                                          [ndivs]*3)
+            otet_te_err.append( abs(EPM.total_energy - EPM.total_energy_ans)/EPM.total_energy_ans*100)
         print("run time", time.time() - t0)            
+
+    if processes is not None:
+        EPM.close()
     
     # Location where plots are saved.
     loc = os.path.join(location, EPM.material)
@@ -964,6 +985,9 @@ def create_convergence_plot(EPM, ndivisions, exact_fl, improved, symmetry,
     
     if improved:
         energy_axes.loglog(np.array(ndivisions)**3, ctet_te_err,label="Improved Tetrahedra")
+
+    if optimized:
+        energy_axes.loglog(np.array(ndivisions)**3, otet_te_err,label="Optimized Tetrahedra")
     
     if symmetry:
         energy_axes.loglog(np.array(ndivisions)**3, sym_rec_te_err,label="Reduced Rectangles")
@@ -1024,7 +1048,7 @@ def plot_states(EPM, grid, tetrahedra, weights, method, energy_list, quantity, n
     """
     
     if method == "rectangles":
-        energies = np.sort(np.array([EPM.eval(g, nbands) for g in grid]).flatten())
+        energies = np.sort(EPM.eval_many(grid, nbands).flatten())
         dE = bin_size
         dV = EPM.lattice.reciprocal_volume/len(grid)
         V = EPM.lattice.reciprocal_volume
@@ -1072,20 +1096,20 @@ def plot_states(EPM, grid, tetrahedra, weights, method, energy_list, quantity, n
         VT = VG/len(weights)
         dos = np.zeros(len(energy_list))
         nos = np.zeros(len(energy_list))
-
+        grid_energies = EPM.eval_many(grid, nbands)
 
         if quantity == "dos":
             for i,energy in enumerate(energy_list):
                 for tet in tetrahedra:
                     for band in range(nbands):
-                        tet_energies = np.sort([EPM.eval(grid[j], nbands)[band] for j in tet])
+                        tet_energies = np.sort(grid_energies[tet, band])
                         dos[i] += density_of_states(VG, VT, tet_energies, energy)
 
         elif quantity == "nos":
             for i,energy in enumerate(energy_list):
                 for tet in tetrahedra:
                     for band in range(nbands):
-                        tet_energies = np.sort([EPM.eval(grid[j], nbands)[band] for j in tet])
+                        tet_energies = np.sort(grid_energies[tet, band])
                         nos[i] += number_of_states(VG, VT, tet_energies, energy)
         else:
             msg = "The supported quantities are dos and nos."
@@ -1185,8 +1209,8 @@ def generate_states_data(EPM, nbands, grid, methods_list, weights_list,
             os.mkdir(rec_prefix)
         
         # The energies of the potential at each point in the grid.
-        rec_energies = np.array(list(chain(*[EPM.eval(grid[i], nbands)*rec_weights[i]
-                                             for i in range(len(grid))])))
+        rec_energies = (EPM.eval_many(grid, nbands)*
+                        np.reshape(rec_weights, (-1, 1))).flatten()
         energies, dos, nos = rec_dos_nos(rec_energies, nbands, bin_size)
 
         # Generate and save the exact values of the quantities provided at the energies
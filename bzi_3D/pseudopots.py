@@ -3,15 +3,296 @@
 """
 
 import itertools
+import warnings
+import os
+import pickle
+import inspect
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 import numpy as np
-from numpy.linalg import norm
-from bzi_3D.symmetry import shells, make_ptvecs, make_rptvecs, Lattice
+from numpy.linalg import norm, inv
+from scipy.linalg import eigh
+from scipy.sparse.linalg import lobpcg
+from bzi_3D.symmetry import (shells, make_ptvecs, make_rptvecs, Lattice,
+                             get_space_group, get_point_group)
 from bzi_3D.sampling import sphere_pts
 
 # Conversions
 angstrom_to_Bohr = 1.889725989
 Ry_to_eV = 13.605698066
 
+# The approximate size in bytes of a stack of Hamiltonians diagonalized at once.
+_max_stack_bytes = 2**26
+
+
+def _batched_eigvalsh(offdiag, rlat_pts, kpoints, neigvals, diag_scale=1.,
+                      eig_scale=1., chunk_size=None):
+    """Diagonalize the Hamiltonians at many k-points as stacks of matrices.
+    The Hamiltonian at k is the k-independent matrix plus a diagonal of
+    kinetic energies, |k + G|^2, for each reciprocal lattice point G.
+
+    Args:
+        offdiag (numpy.ndarray): the k-independent part of the Hamiltonian.
+        rlat_pts (numpy.ndarray): the reciprocal lattice points in the Fourier
+            expansion.
+        kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+        neigvals (int): the number of eigenvalues to keep at each k-point.
+        diag_scale (float): a factor multiplying the kinetic energies.
+        eig_scale (float): a factor multiplying the eigenvalues.
+        chunk_size (int): the number of Hamiltonians diagonalized together.
+
+    Returns:
+        eigvals (numpy.ndarray): the lowest 'neigvals' eigenvalues at each
+            k-point with shape (N, neigvals).
+    """
+
+    nrlat_pts = len(rlat_pts)
+    if chunk_size is None:
+        chunk_size = max(1, _max_stack_bytes//(nrlat_pts**2*offdiag.itemsize))
+    diag_indices = np.arange(nrlat_pts)
+
+    eigvals = np.empty((len(kpoints), min(neigvals, nrlat_pts)))
+    for start in range(0, len(kpoints), chunk_size):
+        kpts = kpoints[start:start + chunk_size]
+        H = np.repeat(offdiag[np.newaxis, :, :], len(kpts), axis=0)
+        H[:, diag_indices, diag_indices] += diag_scale*np.sum(
+            (rlat_pts[np.newaxis, :, :] + kpts[:, np.newaxis, :])**2, -1)
+        eigvals[start:start + chunk_size] = np.linalg.eigvalsh(H)[:, :neigvals]
+    return eigvals*eig_scale
+
+# The eigensolvers that can be selected on the pseudopotentials.
+eigensolvers = ["auto", "dense", "subset", "lobpcg"]
+
+# The number of extra eigenvectors iterated by LOBPCG to help convergence of the
+# highest requested eigenvalue, the tolerance of the residuals, and the maximum
+# number of iterations before falling back to a dense solver.
+_lobpcg_nextra = 4
+_lobpcg_tol = 1e-7
+_lobpcg_maxiter = 100
+
+# The basis sizes above which "auto" uses the subset solver and LOBPCG. Finding
+# only the lowest eigenvalues pays off once the basis is a few times larger than
+# the number of eigenvalues, and an iterative solver only once the matrices are
+# large enough that a good starting guess saves more than its iterations cost.
+_subset_min_basis = 150
+_lobpcg_min_basis = 2000
+
+
+def _check_eigensolver(eigensolver):
+    """Make sure the eigensolver is one of the available eigensolvers.
+
+    Args:
+        eigensolver (str): the name of the eigensolver.
+
+    Returns:
+        eigensolver (str): the name of the eigensolver.
+    """
+
+    if eigensolver not in eigensolvers:
+        msg = ("Unknown eigensolver {}. The options are 'auto', 'dense', "
+               "'subset', and 'lobpcg'.")
+        raise ValueError(msg.format(eigensolver))
+    return eigensolver
+
+
+def _choose_eigensolver(nbasis, neigvals, eigensolver="auto", warm_start=False):
+    """Choose an eigensolver from the size of the basis and the number of
+    eigenvalues needed.
+
+    Args:
+        nbasis (int): the number of basis functions, or the size of the
+            Hamiltonian.
+        neigvals (int): the number of eigenvalues needed.
+        eigensolver (str): the requested eigensolver. If "auto", a full
+            diagonalization is used for small matrices or when most of the
+            eigenvalues are needed, LOBPCG for large matrices when only a few
+            eigenvalues are needed and the eigenvectors of a neighboring
+            k-point are available, and a dense subset solver otherwise.
+        warm_start (bool): if true, LOBPCG can be started from the eigenvectors
+            of a neighboring k-point. This is only the case when `eval_many`
+            walks through the k-points, so with "auto" a single k-point from
+            `eval` never uses LOBPCG while the same k-point in `eval_many` may.
+            When `eval_many` doesn't use LOBPCG, it diagonalizes the
+            Hamiltonians as a stack with full diagonalizations instead of the
+            subset solver `eval` may choose. The eigenvalues agree to the
+            tolerance of LOBPCG.
+
+    Returns:
+        eigensolver (str): the name of the eigensolver.
+    """
+
+    small = 5*(min(neigvals, nbasis) + _lobpcg_nextra) >= nbasis
+    if _check_eigensolver(eigensolver) == "lobpcg":
+        # LOBPCG doesn't work when the block of vectors is a large fraction of
+        # the basis.
+        return "dense" if small else "lobpcg"
+    elif eigensolver != "auto":
+        return eigensolver
+    elif nbasis <= _subset_min_basis or 2*neigvals >= nbasis:
+        return "dense"
+    elif warm_start and nbasis >= _lobpcg_min_basis and not small:
+        return "lobpcg"
+    else:
+        return "subset"
+
+
+def _lowest_eigvals(H, neigvals, eigensolver="auto", guess=None):
+    """Find the lowest eigenvalues of a Hermitian matrix.
+
+    Args:
+        H (numpy.ndarray): a Hermitian matrix.
+        neigvals (int): the number of eigenvalues to return.
+        eigensolver (str): the eigensolver. See `eigensolvers`.
+        guess (numpy.ndarray): eigenvectors used to start LOBPCG, typically
+            those of a neighboring k-point.
+
+    Returns:
+        eigvals (numpy.ndarray): the lowest 'neigvals' eigenvalues in
+            ascending order.
+        eigvecs (numpy.ndarray): the eigenvectors found by LOBPCG, which can
+            start the calculation at a neighboring k-point. It is None for the
+            other eigensolvers.
+    """
+
+    nbasis = len(H)
+    neigvals = min(neigvals, nbasis)
+    eigensolver = _choose_eigensolver(nbasis, neigvals, eigensolver,
+                                      guess is not None)
+
+    if eigensolver == "lobpcg":
+        nblock = neigvals + _lobpcg_nextra
+        if guess is None or np.shape(guess) != (nbasis, nblock):
+            # Start from the plane waves with the lowest kinetic energies.
+            guess = np.zeros((nbasis, nblock))
+            guess[np.argsort(np.real(np.diag(H)))[:nblock], np.arange(nblock)] = 1.
+        with warnings.catch_warnings():
+            # Convergence is checked below.
+            warnings.filterwarnings("ignore", message="(Exited|Failed) at",
+                                    category=UserWarning)
+            warnings.filterwarnings("ignore", message="Exited postprocessing",
+                                    category=UserWarning)
+            eigvals, eigvecs = lobpcg(H, guess.astype(H.dtype), largest=False,
+                                      tol=_lobpcg_tol, maxiter=_lobpcg_maxiter)
+        order = np.argsort(eigvals)
+        eigvals, eigvecs = eigvals[order], eigvecs[:, order]
+        residuals = norm(np.dot(H, eigvecs) - eigvecs*eigvals, axis=0)
+        if np.all(residuals[:neigvals] <= _lobpcg_tol*np.maximum(
+                1., np.abs(eigvals[:neigvals]))):
+            return eigvals[:neigvals], eigvecs
+        # LOBPCG didn't converge. Fall back to the dense subset solver.
+        eigensolver = "subset"
+
+    if eigensolver == "subset":
+        return eigh(H, eigvals_only=True, subset_by_index=[0, neigvals - 1]), None
+    else:
+        return np.sort(np.linalg.eigvalsh(H))[:neigvals], None
+
+
+def _walk_kpoints(eval_kpoint, kpoints):
+    """Evaluate the eigenvalues at a sequence of k-points one at a time. The
+    eigenvectors found at each k-point start the calculation at the next.
+
+    Args:
+        eval_kpoint (function): a function of a k-point and starting
+            eigenvectors that returns the eigenvalues and eigenvectors.
+        kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+
+    Returns:
+        (numpy.ndarray): the eigenvalues at each k-point.
+    """
+
+    eigvals = []
+    eigvecs = None
+    for kpt in kpoints:
+        kpt_eigvals, eigvecs = eval_kpoint(kpt, eigvecs)
+        eigvals.append(kpt_eigvals)
+    return np.array(eigvals)
+
+
+class KCenteredBasis(object):
+    """The plane waves of expansions centered on many k-points. The reciprocal
+    lattice points within the cutoff of every k-point no farther than `kmax` from
+    the origin, and the form factors of their differences, are found once. The
+    basis at a k-point is then selected from them with a mask.
+
+    Args:
+        reciprocal_vectors (numpy.ndarray): the reciprocal lattice vectors as
+            columns of an array.
+        energy_cutoff (float): the cutoff energy of the Fourier expansion.
+        form_factors (list): the form factors of the energy shells.
+        energy_shells (list): the squared radii of the energy shells.
+        kmax (float): the largest distance of a k-point from the origin.
+
+    Attributes:
+        energy_cutoff (float): the cutoff energy of the Fourier expansion.
+        kmax (float): the largest distance of a k-point from the origin.
+        rlat_pts (numpy.ndarray): the reciprocal lattice points within
+            sqrt(energy_cutoff) + kmax of the origin.
+        form_factor_table (numpy.ndarray): the form factors of the differences of
+            the points of `rlat_pts`, flattened from a box of lattice coordinates.
+        flat_indices (numpy.ndarray): the lattice coordinates of `rlat_pts`
+            flattened in the same way. The form factor of two points is at the
+            difference of their flat indices plus `origin_index` in
+            `form_factor_table`.
+        origin_index (int): the index of the origin in `form_factor_table`.
+    """
+
+    def __init__(self, reciprocal_vectors, energy_cutoff, form_factors,
+                 energy_shells, kmax):
+        self.energy_cutoff = energy_cutoff
+        self.kmax = kmax
+        self.rlat_pts = sphere_pts(reciprocal_vectors,
+                                   (np.sqrt(energy_cutoff) + kmax)**2)
+
+        # The form factor of two points only depends on the difference of their
+        # lattice coordinates, which lie within a box twice the size of the points.
+        # The form factors are found once on the box instead of for every pair.
+        coords = np.round(np.dot(inv(reciprocal_vectors),
+                                 np.transpose(self.rlat_pts))).astype(int).T
+        span = 2*np.max(np.abs(coords), axis=0)
+        size = 2*span + 1
+        diffs = np.reshape(np.stack(np.meshgrid(*[np.arange(-n, n + 1) for n in span],
+                                                indexing="ij"), -1), (-1, 3))
+        r2 = np.sum(np.dot(diffs, np.transpose(reciprocal_vectors))**2, 1)
+        self.form_factor_table = np.zeros(len(diffs))
+        for i in range(1,len(form_factors)):
+            if form_factors[i] == 0.:
+                continue
+            else:
+                self.form_factor_table[np.isclose(r2, energy_shells[i])] = (
+                    form_factors[i])
+        self.flat_indices = (coords[:, 0]*size[1] + coords[:, 1])*size[2] + coords[:, 2]
+        self.origin_index = int((span[0]*size[1] + span[1])*size[2] + span[2])
+
+        # The basis of the last k-point, which is often the same at the next.
+        self._mask = None
+        self._basis = None
+
+    def select(self, kpoint, eps=1e-12):
+        """Select the plane waves within the cutoff of a k-point. These are the
+        points `sphere_pts` finds with the k-point as the offset.
+
+        Args:
+            kpoint (numpy.ndarray): a k-point no farther than `kmax` from the
+                origin.
+            eps (float): the tolerance of `sphere_pts`.
+
+        Returns:
+            rlat_pts (numpy.ndarray): the reciprocal lattice points of the basis,
+                in the same order as `sphere_pts`.
+            form_factor_mat (numpy.ndarray): the form factors between them.
+        """
+
+        mask = np.sum((self.rlat_pts - kpoint)**2, 1) < self.energy_cutoff + eps
+        if self._mask is None or not np.array_equal(mask, self._mask):
+            self._mask = mask
+            indices = self.flat_indices[mask]
+            self._basis = (self.rlat_pts[mask], self.form_factor_table[
+                indices[:, np.newaxis] - indices[np.newaxis, :] + self.origin_index])
+        return self._basis
+
 
 class EmpiricalPseudopotential(object):
     """Create an empirical pseudopotential.
@@ -31,6 +312,13 @@ class EmpiricalPseudopotential(object):
             such as the chemical formula.
         fermi_level (float): the fermi level.
         total_energy (float): the total energy.
+        eigensolver (str): the eigensolver used to find the lowest eigenvalues.
+            The options are "dense", "subset" for a dense solver that only
+            finds the eigenvalues needed, "lobpcg" for an iterative solver
+            started from the eigenvectors of the previous k-point, and "auto",
+            which chooses from the size of the basis and number of eigenvalues.
+            With "auto", `eval` and `eval_many` may choose differently. See
+            `_choose_eigensolver`.
 
     Attributes:
         lattice (:py:obj:`BZI.symmetry.lattice`): an instance of Lattice.
@@ -49,6 +337,7 @@ class EmpiricalPseudopotential(object):
             level at the correct position.
         fermi_level (float): the fermi level.
         total_energy (float): the total energy.
+        eigensolver (str): the eigensolver used to find the lowest eigenvalues.
 
     Example:
         >>> centering_type = "face"
@@ -66,7 +355,7 @@ class EmpiricalPseudopotential(object):
     
     def __init__(self, lattice, form_factors, energy_cutoff, atom_labels, atom_positions,
                  nvalence_electrons, material, energy_shift=None,
-                 fermi_level=None, total_energy=None):
+                 fermi_level=None, total_energy=None, eigensolver="auto"):
         self.material = material
         self.lattice = lattice
         self.form_factors = form_factors
@@ -88,8 +377,12 @@ class EmpiricalPseudopotential(object):
         self.energy_shift = energy_shift or 0.
         self.fermi_level = fermi_level or 0.
         self.total_energy = total_energy or 0.        
+        self.eigensolver = _check_eigensolver(eigensolver)
         self.init_hamiltonian = self.hamiltonian([0.]*3) - np.diag(
             np.diag(self.hamiltonian([0.]*3)))
+        # The plane waves of the expansions about each k-point.
+        self._kcentered_key = None
+        self._kcentered_basis = None
         
     def find_energy_shells(self):
         """Find the spherical shells of constant energy on which the points in
@@ -116,41 +409,26 @@ class EmpiricalPseudopotential(object):
             adjust (bool): if true, the Fourier expansion will be performed about
                 the k-point being considered.
         """
+
+        return self._eval(kpoint, neigvals, adjust)[0]
+
+    def _eval(self, kpoint, neigvals, adjust=False, guess=None):
+        """Evaluate the empirical pseudopotential eigenvalues at the provided
+        k-point. The eigenvectors found by LOBPCG are also returned so that
+        they can start the calculation at a neighboring k-point.
+        """
         
 
         if adjust:
-            # Find all the reciprocal lattice points within a sphere surrounding the
-            # k-point being considered.
-            rlat_pts = sphere_pts(self.lattice.reciprocal_vectors,
-                                  self.energy_cutoff, offset=kpoint)
+            # Select the reciprocal lattice points within a sphere surrounding the
+            # k-point being considered and the form factors between them.
+            rlat_pts, H = self.kcentered_basis(norm(kpoint)).select(kpoint)
             
             # Calculate the diagonal elements of the Hamiltonian.
-            diag = np.eye(len(rlat_pts))*list(map(lambda x: np.dot(x,x),
-                                                  rlat_pts + kpoint))
-            
-            # For some reason the lattice points need to be double nested for
-            # numpy.tile to work.
-            nested_rlatpts = np.array([[rlp] for rlp in rlat_pts])
-            
-            # Create a matrix of reciprocal lattice points where the first lattice
-            # point is repeated acroass the first row, the second lattice point the
-            # second row, and so on.
-            rlatpt_mat = np.tile(nested_rlatpts,(len(rlat_pts),1))
-            
-            # Create a matrix of the differences of the lattice points. Each element
-            # is given by a_i - a_j.
-            rlp_diff = rlatpt_mat - np.transpose(rlatpt_mat, (1,0,2))
-            
-            # Find the norm squared of the difference.
-            r2_mat = np.apply_along_axis(norm, 2, rlp_diff)**2
-            H = np.zeros(np.shape(r2_mat))
-            for i in range(1,len(self.form_factors)):
-                if self.form_factors[i] == 0.:
-                    continue
-                else:
-                    H[np.isclose(r2_mat, self.energy_shells[i])] = self.form_factors[i]
-                
-            return np.sort(np.linalg.eigvalsh(H + diag))[:neigvals]*Ry_to_eV
+            diag = np.diag(np.sum((rlat_pts + kpoint)**2, 1))
+            eigvals, eigvecs = _lowest_eigvals(H + diag, neigvals,
+                                               self.eigensolver, guess)
+            return eigvals*Ry_to_eV, eigvecs
 
         else:
             diag = np.eye(len(self.rlat_pts))*list(map(lambda x: np.dot(x,x),
@@ -171,8 +449,74 @@ class EmpiricalPseudopotential(object):
                 # Calculate the phase portion of the Hamiltonian matrix elements.
                 phase_mat = np.dot(rlp_diff, np.sum(self.atom_positions,0))                
                 H = self.init_hamiltonian*np.exp(-1j*phase_mat) + diag*Ry_to_eV
-            return np.sort(np.linalg.eigvalsh(H))[:neigvals]
+            return _lowest_eigvals(H, neigvals, self.eigensolver, guess)
         
+    def eval_many(self, kpoints, neigvals, adjust=False, chunk_size=None):
+        """Evaluate the empirical pseudopotential eigenvalues at many k-points
+        at once. The k-independent, off-diagonal part of the Hamiltonian is
+        built a single time and the Hamiltonians are diagonalized as a stack.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+            adjust (bool): if true, the Fourier expansion will be performed about
+                each k-point. The basis then changes from one k-point to the next
+                and the k-points are evaluated one at a time. They are also
+                evaluated one at a time with the "subset" and "lobpcg"
+                eigensolvers, and LOBPCG is started from the eigenvectors of the
+                previous k-point.
+            chunk_size (int): the number of Hamiltonians diagonalized together.
+                By default it is chosen so that the stack of Hamiltonians is no
+                larger than about 64 MB.
+
+        Returns:
+            (numpy.ndarray): the lowest 'neigvals' eigenvalues at each k-point
+                with shape (N, neigvals).
+        """
+
+        kpoints = np.reshape(np.asarray(kpoints, dtype=float), (-1, 3))
+        if adjust and len(kpoints):
+            # Find the plane waves of all the k-points at once.
+            self.kcentered_basis(np.max(norm(kpoints, axis=1)))
+        if adjust or self.eigensolver == "subset" or _choose_eigensolver(
+                len(self.rlat_pts), neigvals, self.eigensolver, True) == "lobpcg":
+            return _walk_kpoints(lambda kpt, guess: self._eval(
+                kpt, neigvals, adjust, guess), kpoints)
+
+        rlat_pts = np.asarray(self.rlat_pts)
+        offdiag = self.init_hamiltonian
+        if not np.allclose(self.atom_positions, [[0.]*3]):
+            rlp_diff = rlat_pts[:, np.newaxis, :] - rlat_pts[np.newaxis, :, :]
+            phase_mat = np.dot(rlp_diff, np.sum(self.atom_positions, 0))
+            offdiag = offdiag*np.exp(-1j*phase_mat)
+        return _batched_eigvalsh(offdiag, rlat_pts, kpoints, neigvals,
+                                 Ry_to_eV, 1., chunk_size)
+
+    def kcentered_basis(self, kmax):
+        """Get the plane waves of the expansions about k-points, which are used
+        when `adjust` is true. They are only found again if a k-point is farther
+        from the origin than before, or the form factors, cutoff or lattice change.
+
+        Args:
+            kmax (float): the largest distance of a k-point from the origin.
+
+        Returns:
+            _ (KCenteredBasis): the plane waves of k-points no farther than at
+                least `kmax` from the origin.
+        """
+
+        key = (tuple(self.form_factors), self.energy_cutoff,
+               tuple(np.ravel(self.lattice.reciprocal_vectors)))
+        if key != self._kcentered_key or self._kcentered_basis.kmax < kmax:
+            # Cover at least the k-points within the length of the longest
+            # reciprocal lattice vector so most grids only need one basis.
+            kmax = max(kmax, np.max(norm(self.lattice.reciprocal_vectors, axis=0)))
+            self._kcentered_basis = KCenteredBasis(
+                self.lattice.reciprocal_vectors, self.energy_cutoff, self.form_factors,
+                self.energy_shells, kmax)
+            self._kcentered_key = key
+        return self._kcentered_basis
+
     def hamiltonian(self, kpoint):
         """Evaluate the empirical pseudopotential Hamiltonian at the provided
         k-point. This function is typically used to verify the Hamiltonian is 
@@ -226,6 +570,13 @@ class CohenEmpiricalPseudopotential(object):
             level at the correct position.
         fermi_level (float): the fermi level.
         total_energy (float): the total energy.
+        eigensolver (str): the eigensolver used to find the lowest eigenvalues.
+            The options are "dense", "subset" for a dense solver that only
+            finds the eigenvalues needed, "lobpcg" for an iterative solver
+            started from the eigenvectors of the previous k-point, and "auto",
+            which chooses from the size of the basis and number of eigenvalues.
+            With "auto", `eval` and `eval_many` may choose differently. See
+            `_choose_eigensolver`.
 
     Attributes:
         lattice (:py:obj:`BZI.symmetry.lattice`): an instance of Lattice.
@@ -248,12 +599,13 @@ class CohenEmpiricalPseudopotential(object):
             level at the correct position.
         fermi_level (float): the fermi level.
         total_energy (float): the total energy.
+        eigensolver (str): the eigensolver used to find the lowest eigenvalues.
     """
 
     def __init__(self, lattice, sym_form_factors, antisym_form_factors,
                  energy_cutoff, atom_labels, atom_positions, nvalence_electrons,
                  material, energy_shift=None, fermi_level=None,
-                 total_energy=None):
+                 total_energy=None, eigensolver="auto"):
 
         self.material = material
         self.lattice = lattice
@@ -277,6 +629,11 @@ class CohenEmpiricalPseudopotential(object):
         self.energy_shift = energy_shift or 0.
         self.fermi_level = fermi_level or 0.
         self.total_energy = total_energy or 0.
+        self.eigensolver = _check_eigensolver(eigensolver)
+        # The k-independent part of the Hamiltonian.
+        self._centrosymmetric_key = None
+        self._form_factor_key = None
+        self._form_factor_matrix()
 
     def find_energy_shells(self):
         """Find the spherical shells of constant energy on which the points in
@@ -293,32 +650,79 @@ class CohenEmpiricalPseudopotential(object):
                     
     # The version of eval that I'm fixing.
     def eval(self, kpoint, neigvals):
-        """Evaluate the empirical pseudopotential Hamiltonian at the provided
-        k-point. This function is typically used to verify the Hamiltonian is 
-        Hermitian.
+        """Evaluate the empirical pseudopotential eigenvalues at the provided
+        k-point. Only return the lowest 'neigvals' eigenvalues.
+
+        Args:
+            kpoint (numpy.ndarray): a k-point
+            neigvals (int): the number of eigenvalues to return
         """
 
-        # self.rlat_pts = sphere_pts(self.lattice.reciprocal_vectors,
-        #                            self.energy_cutoff, -np.array(kpoint))
-                
-        # Calculate the diagonal elements of the Hamiltonian.
-        diag = np.eye(len(self.rlat_pts))*np.apply_along_axis(norm, 1,
-                                                              self.rlat_pts + kpoint)**2
-        # For some reason the lattice points need to be double nested for
-        # numpy.tile to work.
-        nested_rlatpts = np.array([[rlp] for rlp in self.rlat_pts])
+        return self._eval(kpoint, neigvals)[0]
+
+    def _eval(self, kpoint, neigvals, guess=None):
+        """Evaluate the empirical pseudopotential eigenvalues at the provided
+        k-point. The eigenvectors found by LOBPCG are also returned so that
+        they can start the calculation at a neighboring k-point.
+        """
+
+        # The form factors don't depend on the k-point so only the kinetic
+        # energies along the diagonal need to be added.
+        kinetic = np.sum((np.asarray(self.rlat_pts) + kpoint)**2, 1)
+        H = self._form_factor_matrix() + np.diag(kinetic)
+        eigvals, eigvecs = _lowest_eigvals(H, neigvals, self.eigensolver, guess)
+        return eigvals*Ry_to_eV, eigvecs
+
+    def eval_many(self, kpoints, neigvals, chunk_size=None):
+        """Evaluate the empirical pseudopotential eigenvalues at many k-points
+        at once. The form factor part of the Hamiltonian is built a single time
+        and the Hamiltonians are diagonalized as a stack.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3). With
+                the "subset" and "lobpcg" eigensolvers, the k-points are
+                evaluated one at a time and LOBPCG is started from the
+                eigenvectors of the previous k-point.
+            neigvals (int): the number of eigenvalues to return at each k-point.
+            chunk_size (int): the number of Hamiltonians diagonalized together.
+                By default it is chosen so that the stack of Hamiltonians is no
+                larger than about 64 MB.
+
+        Returns:
+            (numpy.ndarray): the lowest 'neigvals' eigenvalues at each k-point
+                with shape (N, neigvals).
+        """
+
+        kpoints = np.reshape(np.asarray(kpoints, dtype=float), (-1, 3))
+        if self.eigensolver == "subset" or _choose_eigensolver(
+                len(self.rlat_pts), neigvals, self.eigensolver, True) == "lobpcg":
+            return _walk_kpoints(lambda kpt, guess: self._eval(
+                kpt, neigvals, guess), kpoints)
+        return _batched_eigvalsh(self._form_factor_matrix(),
+                                 np.asarray(self.rlat_pts), kpoints, neigvals,
+                                 1., Ry_to_eV, chunk_size)
+
+    def _form_factor_matrix(self):
+        """Get the k-independent part of the Hamiltonian, the symmetric and
+        anti-symmetric form factors with their structure factors, in Rydbergs.
+        The matrix is stored and only rebuilt after the form factors or atomic
+        positions change.
+        """
+
+        key = (tuple(self.sym_form_factors), tuple(self.antisym_form_factors),
+               tuple(np.ravel(self.atom_positions)))
+        if key == self._form_factor_key:
+            return self._form_factor_mat
+
+        rlat_pts = np.asarray(self.rlat_pts)
 
-        # Create a matrix of reciprocal lattice points where the first lattice
-        # point is repeated acroass the first row, the second lattice point the
-        # second row, and so on.
-        rlatpt_mat = np.tile(nested_rlatpts,(len(self.rlat_pts),1))
-        
         # Create a matrix of the differences of the lattice points. Each element
         # is given by a_i - a_j.
-        rlp_diff = rlatpt_mat - np.transpose(rlatpt_mat, (1,0,2))
+        rlp_diff = rlat_pts[:, np.newaxis, :] - rlat_pts[np.newaxis, :, :]
 
         # Find the norm squared of the difference.
-        r2_mat = np.apply_along_axis(norm, 2, rlp_diff)**2
+        r2_mat = np.sum(rlp_diff**2, 2)
+        phase_mat = np.dot(rlp_diff, np.sum(self.atom_positions, 0))
 
         # The symmetric part of the Hamiltonian.
         sff = np.zeros(np.shape(r2_mat))
@@ -327,64 +731,62 @@ class CohenEmpiricalPseudopotential(object):
                 continue
             else:
                 sff[np.isclose(r2_mat, self.energy_shells[i])] = self.sym_form_factors[i]
-                
-        sff *= np.cos(np.sum(rlp_diff*np.sum(self.atom_positions, 0), 2))
 
-        # The Anti-symmetric part of the Hamiltonian.
-        asff = np.zeros(np.shape(r2_mat), dtype=complex)
+        # The anti-symmetric part of the Hamiltonian.
+        asff = np.zeros(np.shape(r2_mat))
         for i in range(1,len(self.antisym_form_factors)):
             if self.antisym_form_factors[i] == 0.:
                 continue
             else:
                 asff[np.isclose(r2_mat, self.energy_shells[i])] = self.antisym_form_factors[i]
-                
-        asff *= 1j*np.sin(np.sum(rlp_diff*np.sum(self.atom_positions, 0), 2))
 
-        H = (diag + sff + asff)
-        return np.sort(np.linalg.eigvalsh(H))[:neigvals]*Ry_to_eV
-    
+        # With inversion symmetry about the origin the anti-symmetric part
+        # vanishes and the Hamiltonian is real symmetric, which is cheaper to
+        # diagonalize and takes half the memory.
+        if self.centrosymmetric():
+            self._form_factor_mat = sff*np.cos(phase_mat)
+        else:
+            self._form_factor_mat = (sff*np.cos(phase_mat) +
+                                     1j*asff*np.sin(phase_mat))
+        self._form_factor_key = key
+        return self._form_factor_mat
+
+    def centrosymmetric(self):
+        """Determine if the crystal has inversion symmetry about the origin.
+        The atoms are placed at plus and minus the sum of the atomic positions
+        and are the same species when all the anti-symmetric form factors are
+        zero. The result is stored with the form factor matrix.
+
+        Returns:
+            (bool): true if the space group contains the inversion without a
+                fractional translation.
+        """
+
+        key = (tuple(self.sym_form_factors), tuple(self.antisym_form_factors),
+               tuple(np.ravel(self.atom_positions)))
+        if key == self._centrosymmetric_key:
+            return self._centrosymmetric
+
+        tau = np.sum(self.atom_positions, 0)
+        labels = [0, 0] if np.allclose(self.antisym_form_factors, 0) else [0, 1]
+        operators, translations = get_space_group(self.lattice.vectors, labels,
+                                                  [tau, -tau], coords="Cart")
+        # The translations are only defined up to a lattice vector.
+        lat_trans = np.dot(inv(self.lattice.vectors), np.transpose(translations)).T
+        self._centrosymmetric = any(
+            np.allclose(op, -np.eye(3)) and np.allclose(tr, np.round(tr))
+            for op, tr in zip(operators, lat_trans))
+        self._centrosymmetric_key = key
+        return self._centrosymmetric
+
     def hamiltonian(self, kpoint):
         """Evaluate the empirical pseudopotential Hamiltonian at the provided
         k-point. This function is typically used to verify the Hamiltonian is 
         Hermitian.
         """
-        # Calculate the diagonal elements of the Hamiltonian.
-        diag = np.eye(len(self.rlat_pts))*np.apply_along_axis(norm, 1,
-                                                              self.rlat_pts + kpoint)**2
-        # For some reason the lattice points need to be double nested for
-        # numpy.tile to work.
-        nested_rlatpts = np.array([[rlp] for rlp in self.rlat_pts])
-        # Create a matrix of reciprocal lattice points where the first lattice
-        # point is repeated acroass the first row, the second lattice point the
-        # second row, and so on.
-        rlatpt_mat = np.tile(nested_rlatpts,(len(self.rlat_pts),1))
-        # Create a matrix of the differences of the lattice points. Each element
-        # is given by a_i - a_j.
-        rlp_diff = rlatpt_mat - np.transpose(rlatpt_mat, (1,0,2))
-        # Find the norm squared of the difference.
-        r2_mat = np.apply_along_axis(norm, 2, rlp_diff)**2
-
-        # The symmetry part of the Hamiltonian.
-        sff = np.zeros(np.shape(r2_mat))
-        for i in range(1,len(self.sym_form_factors)):
-            if self.sym_form_factors[i] == 0.:
-                continue
-            else:
-                sff[np.isclose(r2_mat, self.energy_shells[i])] = self.sym_form_factors[i]
-                
-        sff *= np.cos(np.sum(rlp_diff*np.sum(self.atom_positions, 0), 2))
 
-        # The anti-symmetry part of the Hamiltonian.
-        asff = np.zeros(np.shape(r2_mat), dtype=complex)
-        for i in range(1,len(self.antisym_form_factors)):
-            if self.antisym_form_factors[i] == 0.:
-                continue
-            else:
-                asff[np.isclose(r2_mat, self.energy_shells[i])] = self.antisym_form_factors[i]
-                
-        asff *= 1j*np.sin(np.sum(rlp_diff*np.sum(self.atom_positions, 0), 2))
-        
-        return (diag + sff + asff)*Ry_to_eV
+        kinetic = np.sum((np.asarray(self.rlat_pts) + kpoint)**2, 1)
+        return (self._form_factor_matrix() + np.diag(kinetic))*Ry_to_eV
 
 
 class FreeElectronModel():
@@ -451,6 +853,20 @@ class FreeElectronModel():
 
         return [np.linalg.norm(kpoint)**self.degree]
 
+    def eval_many(self, kpoints, neigvals):
+        """Evaluate the free electron eigenvalue at many k-points.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+
+        Returns:
+            (numpy.ndarray): the eigenvalues with shape (N,1).
+        """
+
+        return np.array([self.eval(kpt, neigvals) for kpt in
+                         np.reshape(kpoints, (-1, 3))])
+
     def set_degree(self, degree):
         self.degree = degree
         self.fermi_level_ans = (3*np.pi**2*self.nvalence_electrons)**(self.degree/3.)
@@ -522,6 +938,20 @@ class SingleFreeElectronModel():
         
         return [np.linalg.norm(kpoint)**self.degree]
 
+    def eval_many(self, kpoints, neigvals):
+        """Evaluate the free electron eigenvalue at many k-points.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+
+        Returns:
+            (numpy.ndarray): the eigenvalues with shape (N,1).
+        """
+
+        return np.array([self.eval(kpt, neigvals) for kpt in
+                         np.reshape(kpoints, (-1, 3))])
+
     def set_degree(self, degree):
         self.degree = degree
         self.fermi_level_ans = (3*np.pi**2*self.nvalence_electrons)**(self.degree/3.)
@@ -589,6 +1019,20 @@ class MultipleFreeElectronModel():
                         [0, -l1, l2], [0, -l1, -l2]])
 
         return [np.linalg.norm(kpoint - pt)**self.degree for pt in pts][:neigvals]
+
+    def eval_many(self, kpoints, neigvals):
+        """Evaluate the free electron eigenvalues at many k-points.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+
+        Returns:
+            (numpy.ndarray): the eigenvalues with shape (N, neigvals).
+        """
+
+        return np.array([self.eval(kpt, neigvals) for kpt in
+                         np.reshape(kpoints, (-1, 3))])
         
     def set_degree(self, degree):
         self.degree = degree
@@ -596,6 +1040,498 @@ class MultipleFreeElectronModel():
         self.total_energy_ans = ((4.*np.pi*(3.*np.pi**2*self.nvalence_electrons)**
                                   ((self.degree + 3.)/3.))/(self.degree + 3.))
                 
+class _ModelWrapper(object):
+    """A base class for objects that wrap a pseudopotential and replace some of its
+    methods. Attributes that aren't defined by the wrapper, such as `lattice` or
+    `fermi_level`, are read from and written to the wrapped pseudopotential, so the
+    wrapper can be passed to any function that takes a pseudopotential.
+
+    Args:
+        model (:py:obj:`EmpiricalPseudopotential`): an instance of one of the
+            pseudopotential classes.
+    """
+
+    # The attributes that belong to the wrapper rather than the wrapped model.
+    _wrapper_attributes = ("model",)
+
+    def __init__(self, model):
+        self.model = model
+
+    def __getattr__(self, name):
+        # Only called when the attribute isn't found on the wrapper. The check on
+        # "model" avoids infinite recursion before it is set, e.g. when unpickling.
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        if name in self._wrapper_attributes:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.model, name, value)
+
+
+class EigenvalueCache(_ModelWrapper):
+    """Cache the eigenvalues of a pseudopotential on a k-point grid. The cache is
+    keyed by the integer grid coordinates of the k-points, reduced to the smallest
+    coordinates in their orbit under the space group of the crystal and time
+    reversal, so symmetrically equivalent k-points share an entry. K-points that
+    aren't on the grid are evaluated without being cached.
+
+    When the grid is commensurate with the reciprocal lattice, the coordinates are
+    also brought into the cell of the grid centered on the offset, so k-points that
+    differ by a reciprocal lattice vector share an entry. In a plane-wave basis of
+    finite size the eigenvalues at these k-points differ, so the eigenvalues of an
+    entry are always those at its representative k-point, the k-point of the
+    reduced coordinates.
+
+    The cache wraps the pseudopotential and can be passed in its place to the
+    integration functions, such as `calc_fermi_level`, `calc_total_energy`,
+    `corrected_integration_weights` and `rectangular_method`, which then share the
+    eigenvalues they compute.
+
+    Args:
+        model (:py:obj:`EmpiricalPseudopotential`): an instance of one of the
+            pseudopotential classes.
+        grid_vectors (list or numpy.ndarray): the vectors that generate the k-point
+            grid as columns of a 3x3 array in Cartesian coordinates.
+        offset (list or numpy.ndarray): the offset of the grid in grid coordinates.
+        maxsize (int): the maximum number of irreducible k-points stored. The least
+            recently used k-points are removed first. If None, the cache is unbounded.
+        symmetry (bool): if False, only identical k-points share an entry.
+        periodic (bool): if True, k-points that differ by a reciprocal lattice
+            vector share an entry. By default it is True for the pseudopotentials
+            with a plane-wave basis and False for the free electron models, whose
+            eigenvalues aren't periodic.
+        eps (float): a finite precision parameter used when checking if a k-point
+            lies on the grid.
+
+    Attributes:
+        model (:py:obj:`EmpiricalPseudopotential`): the wrapped pseudopotential.
+        grid_vectors (numpy.ndarray): the grid generating vectors.
+        offset (numpy.ndarray): the offset of the grid in Cartesian coordinates.
+        maxsize (int): the maximum number of irreducible k-points stored.
+        operators (numpy.ndarray): the point group operators, in Cartesian
+            coordinates, used to reduce the k-points.
+        hits (int): the number of k-points whose eigenvalues were in the cache.
+        misses (int): the number of k-points whose eigenvalues were computed.
+
+    Example:
+        >>> EPM = EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors/10)
+        >>> fermi_level = calc_fermi_level(EPM, tetrahedra, weights, grid)
+        >>> total_energy = calc_total_energy(EPM, tetrahedra, weights, grid)
+    """
+
+    _wrapper_attributes = ("model", "grid_vectors", "offset", "maxsize", "operators",
+                           "eps", "hits", "misses", "_inv_grid_vectors", "_cache",
+                           "_grid_lattice", "_inv_grid_lattice")
+
+    def __init__(self, model, grid_vectors, offset=[0.]*3, maxsize=100000,
+                 symmetry=True, eps=1e-6, periodic=None):
+        self.model = model
+        self.grid_vectors = np.array(grid_vectors, dtype=float)
+        try:
+            self._inv_grid_vectors = inv(self.grid_vectors)
+        except np.linalg.LinAlgError:
+            msg = "The grid generating vectors are linearly dependent."
+            raise ValueError(msg.format(grid_vectors))
+        if maxsize is not None and maxsize < 1:
+            msg = "The maximum size of the cache must be a positive integer or None."
+            raise ValueError(msg.format(maxsize))
+        self.offset = np.dot(self.grid_vectors, offset)
+        self.maxsize = maxsize
+        self.eps = eps
+        if symmetry:
+            if hasattr(model, "atom_labels"):
+                operators = get_space_group(model.lattice.vectors, model.atom_labels,
+                                            model.atom_positions, coords="Cart")[0]
+            else:
+                operators = get_point_group(model.lattice.vectors)
+            # Time reversal symmetry makes the eigenvalues at k and -k equal.
+            operators = np.concatenate([operators, -np.array(operators)])
+            self.operators = np.unique(np.round(operators, 8), axis=0)
+        else:
+            self.operators = np.eye(3)[None]
+        # The reciprocal lattice vectors in grid coordinates. They are only used to
+        # bring k-points into the cell of the grid when they are integers.
+        if periodic is None:
+            periodic = hasattr(model, "rlat_pts")
+        grid_lattice = np.dot(self._inv_grid_vectors, model.lattice.reciprocal_vectors)
+        if periodic and np.allclose(grid_lattice, np.round(grid_lattice), atol=eps):
+            self._grid_lattice = np.round(grid_lattice).astype(np.int64)
+            self._inv_grid_lattice = inv(self._grid_lattice)
+        else:
+            self._grid_lattice = None
+            self._inv_grid_lattice = None
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Remove all the eigenvalues from the cache and reset the counters.
+        """
+
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, kpoints):
+        """Find the cache keys of k-points.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points in Cartesian coordinates
+                with shape (N,3).
+
+        Returns:
+            keys (list): the reduced integer grid coordinates of each k-point as a
+                tuple, or None if the k-point isn't on the grid. The coordinates
+                are in the cell of the grid centered on the offset when the cache
+                is periodic.
+        """
+
+        kpoints = np.reshape(np.asarray(kpoints, dtype=float), (-1, 3))
+
+        # The grid coordinates of the k-points under each operator with shape
+        # (noperators, N, 3).
+        coords = np.einsum("ij,ojk,nk->oni", self._inv_grid_vectors, self.operators,
+                           kpoints) - np.dot(self._inv_grid_vectors, self.offset)
+        int_coords = np.round(coords).astype(np.int64)
+        on_grid = np.all(abs(coords - int_coords) < self.eps, axis=-1)
+
+        # Bring the coordinates into the cell of the grid centered on the offset by
+        # removing reciprocal lattice vectors.
+        if self._grid_lattice is not None:
+            lat_coords = np.einsum("ij,onj->oni", self._inv_grid_lattice, int_coords)
+            shifts = np.floor(lat_coords + 0.5 + 1e-9).astype(np.int64)
+            int_coords -= np.einsum("ij,onj->oni", self._grid_lattice, shifts)
+
+        # Start from the coordinates of the k-points themselves and keep the
+        # lexicographically smallest coordinates from the operators that map each
+        # k-point onto the grid.
+        identity = np.where(np.all(np.isclose(self.operators, np.eye(3)),
+                                   axis=(1,2)))[0][0]
+        best = int_coords[identity].copy()
+        for op_coords, valid in zip(int_coords, on_grid):
+            less = ((op_coords[:,0] < best[:,0]) |
+                    ((op_coords[:,0] == best[:,0]) &
+                     ((op_coords[:,1] < best[:,1]) |
+                      ((op_coords[:,1] == best[:,1]) &
+                       (op_coords[:,2] < best[:,2])))))
+            replace = valid & less
+            best[replace] = op_coords[replace]
+
+        return [tuple(b) if g else None for b,g in zip(best.tolist(), on_grid[identity])]
+
+    def _key_points(self, keys, kpoints):
+        """Find the representative k-points of cache keys, where the eigenvalues are
+        evaluated. K-points without a key are their own representatives.
+        """
+
+        points = np.array(kpoints, dtype=float)
+        for i,key in enumerate(keys):
+            if key is not None:
+                points[i] = np.dot(self.grid_vectors, key[:3]) + self.offset
+        return points
+
+    def _lookup(self, key, neigvals):
+        """Get the eigenvalues of a k-point from the cache or None if they aren't
+        stored or fewer eigenvalues were stored than are requested.
+        """
+
+        if key is None or key not in self._cache:
+            return None
+        stored_neigvals, eigvals = self._cache[key]
+        if stored_neigvals < neigvals:
+            return None
+        self._cache.move_to_end(key)
+        return eigvals[:neigvals]
+
+    def _store(self, key, neigvals, eigvals):
+        """Store the eigenvalues of a k-point and remove the least recently used
+        k-points if the cache is full.
+        """
+
+        if key is None:
+            return
+        self._cache[key] = (neigvals, np.array(eigvals))
+        self._cache.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def eval(self, kpoint, neigvals, **kwargs):
+        """Evaluate the eigenvalues at a k-point, using the cache when possible.
+
+        Args:
+            kpoint (numpy.ndarray): a k-point in Cartesian coordinates.
+            neigvals (int): the number of eigenvalues to return.
+            kwargs (dict): additional arguments of the wrapped pseudopotential's `eval`.
+
+        Returns:
+            _ (numpy.ndarray): the eigenvalues.
+        """
+
+        key = self.keys([kpoint])[0]
+        point = self._key_points([key], [kpoint])[0]
+        if key is not None:
+            key = key + tuple(sorted(kwargs.items()))
+        eigvals = self._lookup(key, neigvals)
+        if eigvals is not None:
+            self.hits += 1
+            return eigvals.copy()
+        self.misses += 1
+        eigvals = np.array(self.model.eval(point, neigvals, **kwargs))
+        self._store(key, neigvals, eigvals)
+        return eigvals
+
+    def eval_many(self, kpoints, neigvals, **kwargs):
+        """Evaluate the eigenvalues at many k-points, using the cache when possible.
+        The k-points that aren't cached are evaluated together, once per irreducible
+        k-point.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+            kwargs (dict): additional arguments of the wrapped pseudopotential's
+                `eval_many`.
+
+        Returns:
+            eigvals (numpy.ndarray): the eigenvalues with shape (N, neigvals) or
+                (N,1) for the free electron models.
+        """
+
+        kpoints = np.reshape(np.asarray(kpoints, dtype=float), (-1, 3))
+        if not len(kpoints):
+            return np.empty((0, neigvals))
+        extra = tuple(sorted(kwargs.items()))
+        keys = [k if k is None else k + extra for k in self.keys(kpoints)]
+
+        results = [None]*len(kpoints)
+        new_keys = {}
+        new_indices = []
+        for i,key in enumerate(keys):
+            results[i] = self._lookup(key, neigvals)
+            if results[i] is not None:
+                self.hits += 1
+            elif key is not None and key in new_keys:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if key is not None:
+                    new_keys[key] = len(new_indices)
+                new_indices.append(i)
+
+        if new_indices:
+            new_eigvals = self.model.eval_many(
+                self._key_points([keys[i] for i in new_indices], kpoints[new_indices]),
+                neigvals, **kwargs)
+            for i,eigvals in zip(new_indices, new_eigvals):
+                results[i] = eigvals
+                self._store(keys[i], neigvals, eigvals)
+            for i,key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = new_eigvals[new_keys[key]]
+
+        return np.array(results)
+
+
+# The constructor arguments that don't change the eigenvalues and are left out of
+# the specifications of the pseudopotentials sent to other processes.
+_spec_excluded = ("fermi_level", "total_energy")
+
+# The environment variables that set the number of threads of the BLAS libraries
+# numpy may be linked against.
+_blas_thread_variables = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                          "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+                          "NUMEXPR_NUM_THREADS")
+
+
+def model_spec(model):
+    """Get a small specification of a pseudopotential from which it can be rebuilt,
+    its class and the arguments of its constructor. The matrices built from them,
+    such as the form factor matrix, are left out. Wrappers, such as
+    `EigenvalueCache`, are replaced by the pseudopotential they wrap.
+
+    Args:
+        model (:py:obj:`EmpiricalPseudopotential`): an instance of one of the
+            pseudopotential classes.
+
+    Returns:
+        _ (tuple): the class of the pseudopotential and a dictionary of the
+            arguments of its constructor.
+    """
+
+    while isinstance(model, _ModelWrapper):
+        model = model.model
+    parameters = list(inspect.signature(type(model).__init__).parameters)[1:]
+    return type(model), {name: getattr(model, name) for name in parameters
+                         if name not in _spec_excluded}
+
+
+def build_model(spec):
+    """Build a pseudopotential from its specification.
+
+    Args:
+        spec (tuple): the class of the pseudopotential and a dictionary of the
+            arguments of its constructor. See `model_spec`.
+
+    Returns:
+        _ (:py:obj:`EmpiricalPseudopotential`): the pseudopotential.
+    """
+
+    cls, kwargs = spec
+    return cls(**kwargs)
+
+
+@contextmanager
+def _blas_threads(nthreads):
+    """Set the number of BLAS threads of the processes started within the context.
+    The environment of the current process is restored afterwards.
+    """
+
+    saved = {name: os.environ.get(name) for name in _blas_thread_variables}
+    os.environ.update({name: str(nthreads) for name in _blas_thread_variables})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+# The pseudopotential of a worker process and the pickled specification it was
+# built from. It is only rebuilt when the specification changes.
+_worker_spec = None
+_worker_model = None
+
+
+def _eval_kpoint_chunk(spec, kpoints, neigvals, kwargs):
+    """Evaluate the eigenvalues at a chunk of k-points in a worker process.
+    """
+
+    global _worker_spec, _worker_model
+    if spec != _worker_spec:
+        _worker_model = build_model(pickle.loads(spec))
+        _worker_spec = spec
+    return np.asarray(_worker_model.eval_many(kpoints, neigvals, **kwargs))
+
+
+class ParallelEvaluator(_ModelWrapper):
+    """Evaluate the eigenvalues of a pseudopotential at many k-points in a pool of
+    processes. The k-points are split into chunks that are evaluated with the
+    pseudopotential's `eval_many`. Each worker builds the pseudopotential from its
+    specification, see `model_spec`, instead of receiving its matrices, and builds
+    it again only when the specification changes. The workers are started the first
+    time they are needed and are kept until `close` is called.
+
+    The evaluator wraps the pseudopotential and can be passed in its place to the
+    integration functions. To also cache the eigenvalues, wrap the evaluator in an
+    `EigenvalueCache`.
+
+    Args:
+        model (:py:obj:`EmpiricalPseudopotential`): an instance of one of the
+            pseudopotential classes.
+        processes (int): the number of worker processes. By default it is the number
+            of CPUs.
+        chunk_size (int): the number of k-points evaluated by a worker at once. By
+            default the k-points are split into four chunks per worker.
+        blas_threads (int): the number of BLAS threads of each worker. One thread
+            per worker avoids running more threads than there are cores.
+
+    Attributes:
+        model (:py:obj:`EmpiricalPseudopotential`): the wrapped pseudopotential.
+        processes (int): the number of worker processes.
+        chunk_size (int): the number of k-points evaluated by a worker at once.
+        blas_threads (int): the number of BLAS threads of each worker.
+
+    Example:
+        >>> with ParallelEvaluator(Si_EPM, processes=8) as EPM:
+        ...     energies = EPM.eval_many(grid, 8)
+    """
+
+    _wrapper_attributes = ("model", "processes", "chunk_size", "blas_threads",
+                           "_executor")
+
+    def __init__(self, model, processes=None, chunk_size=None, blas_threads=1):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            msg = "The number of processes must be a positive integer."
+            raise ValueError(msg.format(processes))
+        if chunk_size is not None and chunk_size < 1:
+            msg = "The chunk size must be a positive integer or None."
+            raise ValueError(msg.format(chunk_size))
+        self.model = model
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.blas_threads = blas_threads
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def eval(self, kpoint, neigvals, **kwargs):
+        """Evaluate the eigenvalues at a k-point in the current process.
+
+        Args:
+            kpoint (numpy.ndarray): a k-point in Cartesian coordinates.
+            neigvals (int): the number of eigenvalues to return.
+            kwargs (dict): additional arguments of the wrapped pseudopotential's `eval`.
+
+        Returns:
+            _ (numpy.ndarray): the eigenvalues.
+        """
+
+        return self.model.eval(kpoint, neigvals, **kwargs)
+
+    def eval_many(self, kpoints, neigvals, **kwargs):
+        """Evaluate the eigenvalues at many k-points in the worker processes.
+
+        Args:
+            kpoints (numpy.ndarray): an array of k-points with shape (N,3).
+            neigvals (int): the number of eigenvalues to return at each k-point.
+            kwargs (dict): additional arguments of the wrapped pseudopotential's
+                `eval_many`.
+
+        Returns:
+            _ (numpy.ndarray): the eigenvalues in the same order as the k-points.
+        """
+
+        kpoints = np.reshape(np.asarray(kpoints, dtype=float), (-1, 3))
+        chunk_size = self.chunk_size or -(-len(kpoints)//(4*self.processes))
+        if self.processes == 1 or len(kpoints) <= chunk_size:
+            return self.model.eval_many(kpoints, neigvals, **kwargs)
+
+        spec = pickle.dumps(model_spec(self.model))
+        chunks = [kpoints[i:i + chunk_size] for i in range(0, len(kpoints), chunk_size)]
+        # The workers are started by spawning new interpreters, rather than forking
+        # this one, so that they read the number of BLAS threads when numpy is
+        # imported. They start as the chunks are submitted.
+        with _blas_threads(self.blas_threads):
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context("spawn"))
+            results = self._executor.map(_eval_kpoint_chunk, itertools.repeat(spec),
+                                         chunks, itertools.repeat(neigvals),
+                                         itertools.repeat(kwargs))
+        return np.concatenate(list(results))
+
+
 #### W pseudopotentials ####
 def W1(spt):
     """W1 is another toy model that we often work with. It is also convenient
@@ -680,252 +1616,305 @@ Si_lat_centering = "face"
 Si_lat_const = 5.43*angstrom_to_Bohr # the lattice constant in Bohr
 Si_lat_consts = [Si_lat_const]*3
 Si_lat_angles = [np.pi/2]*3
-Si_lattice = Lattice(Si_lat_centering, Si_lat_consts, Si_lat_angles,
-                     convention="angular")
 
-# Si_energy_cutoff = (11 + 1)*(2*np.pi/Si_lat_const)**2
-Si_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Si_lattice.reciprocal_vectors.T)))*4
 Si_atom_positions = [Si_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 Si_atom_labels = np.zeros(len(Si_atom_positions))
 Si_nvalence_electrons = 4
-Si_EPM = CohenEmpiricalPseudopotential(Si_lattice, Si_spff, Si_apff, Si_energy_cutoff,
-                                       Si_atom_labels, Si_atom_positions,
-                                       Si_nvalence_electrons, material="Si")
+
+def _make_Si():
+    """Build the lattice, energy cutoff and pseudopotential of Si."""
+    Si_lattice = Lattice(Si_lat_centering, Si_lat_consts, Si_lat_angles,
+                         convention="angular")
+    # Si_energy_cutoff = (11 + 1)*(2*np.pi/Si_lat_const)**2
+    Si_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Si_lattice.reciprocal_vectors.T)))*4
+    Si_EPM = CohenEmpiricalPseudopotential(Si_lattice, Si_spff, Si_apff, Si_energy_cutoff,
+                                           Si_atom_labels, Si_atom_positions,
+                                           Si_nvalence_electrons, material="Si")
+    return Si_lattice, Si_energy_cutoff, Si_EPM
 
 #### Pseudopotential of Ge ####
 Ge_lat_centering = "face"
 Ge_lat_const = 5.66*angstrom_to_Bohr # the lattice constant in Bohr
 Ge_lat_consts = [Ge_lat_const]*3
 Ge_lat_angles = [np.pi/2]*3
-Ge_lattice = Lattice(Ge_lat_centering, Ge_lat_consts, Ge_lat_angles,
-                     convention="angular")
 
-Ge_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Ge_lattice.reciprocal_vectors.T)))*4
 Ge_atom_positions = [Ge_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 Ge_atom_labels = np.zeros(len(Ge_atom_positions))
 Ge_nvalence_electrons = 4
-Ge_EPM = CohenEmpiricalPseudopotential(Ge_lattice, Ge_spff, Ge_apff, Ge_energy_cutoff,
-                                       Ge_atom_labels, Ge_atom_positions,
-                                       Ge_nvalence_electrons, material="Ge")
+
+def _make_Ge():
+    """Build the lattice, energy cutoff and pseudopotential of Ge."""
+    Ge_lattice = Lattice(Ge_lat_centering, Ge_lat_consts, Ge_lat_angles,
+                         convention="angular")
+    Ge_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Ge_lattice.reciprocal_vectors.T)))*4
+    Ge_EPM = CohenEmpiricalPseudopotential(Ge_lattice, Ge_spff, Ge_apff, Ge_energy_cutoff,
+                                           Ge_atom_labels, Ge_atom_positions,
+                                           Ge_nvalence_electrons, material="Ge")
+    return Ge_lattice, Ge_energy_cutoff, Ge_EPM
 
 #### Pseudopotential of Sn ####
 cSn_lat_centering = "face"
 cSn_lat_const = 6.49*angstrom_to_Bohr # the lattice constant in Bohr
 cSn_lat_consts = [cSn_lat_const]*3
 cSn_lat_angles = [np.pi/2]*3
-cSn_lattice = Lattice(cSn_lat_centering, cSn_lat_consts, cSn_lat_angles,
-                      convention="angular")
 
-cSn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                 cSn_lattice.reciprocal_vectors.T)))*4
 cSn_atom_positions = [cSn_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 cSn_atom_labels = np.zeros(len(cSn_atom_positions))
 cSn_nvalence_electrons = 4
-cSn_EPM = CohenEmpiricalPseudopotential(cSn_lattice, Sn_spff, Sn_apff, cSn_energy_cutoff,
-                                        cSn_atom_labels, cSn_atom_positions,
-                                        cSn_nvalence_electrons, material="Sn")
+
+def _make_cSn():
+    """Build the lattice, energy cutoff and pseudopotential of diamond Sn."""
+    cSn_lattice = Lattice(cSn_lat_centering, cSn_lat_consts, cSn_lat_angles,
+                          convention="angular")
+    cSn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                     cSn_lattice.reciprocal_vectors.T)))*4
+    cSn_EPM = CohenEmpiricalPseudopotential(cSn_lattice, Sn_spff, Sn_apff, cSn_energy_cutoff,
+                                            cSn_atom_labels, cSn_atom_positions,
+                                            cSn_nvalence_electrons, material="Sn")
+    return cSn_lattice, cSn_energy_cutoff, cSn_EPM
 
 #### Pseudopotential of GaP ####
 GaP_lat_centering = "face"
 GaP_lat_const = 5.44*angstrom_to_Bohr # the lattice constant in Bohr
 GaP_lat_consts = [GaP_lat_const]*3
 GaP_lat_angles = [np.pi/2]*3
-GaP_lattice = Lattice(GaP_lat_centering, GaP_lat_consts, GaP_lat_angles,
-                      convention="angular")
 
-GaP_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                 GaP_lattice.reciprocal_vectors.T)))*4
 GaP_atom_positions = [GaP_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 GaP_atom_labels = np.zeros(len(GaP_atom_positions))
 GaP_nvalence_electrons = 8
-GaP_EPM = CohenEmpiricalPseudopotential(GaP_lattice, GaP_spff, GaP_apff, GaP_energy_cutoff,
-                                        GaP_atom_labels, GaP_atom_positions,
-                                        GaP_nvalence_electrons, material="GaP")
+
+def _make_GaP():
+    """Build the lattice, energy cutoff and pseudopotential of GaP."""
+    GaP_lattice = Lattice(GaP_lat_centering, GaP_lat_consts, GaP_lat_angles,
+                          convention="angular")
+    GaP_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                     GaP_lattice.reciprocal_vectors.T)))*4
+    GaP_EPM = CohenEmpiricalPseudopotential(GaP_lattice, GaP_spff, GaP_apff, GaP_energy_cutoff,
+                                            GaP_atom_labels, GaP_atom_positions,
+                                            GaP_nvalence_electrons, material="GaP")
+    return GaP_lattice, GaP_energy_cutoff, GaP_EPM
 
 #### Pseudopotential of GaAs ####
 GaAs_lat_centering = "face"
 GaAs_lat_const = 5.64*angstrom_to_Bohr # the lattice constant in Bohr
 GaAs_lat_consts = [GaAs_lat_const]*3
 GaAs_lat_angles = [np.pi/2]*3
-GaAs_lattice = Lattice(GaAs_lat_centering, GaAs_lat_consts, GaAs_lat_angles,
-                       convention="angular")
 
-GaAs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  GaAs_lattice.reciprocal_vectors.T)))*4
 GaAs_atom_positions = [GaAs_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 GaAs_atom_labels = np.zeros(len(GaAs_atom_positions))
 GaAs_nvalence_electrons = 8
-GaAs_EPM = CohenEmpiricalPseudopotential(GaAs_lattice, GaAs_spff, GaAs_apff,
-                                         GaAs_energy_cutoff, GaAs_atom_labels,
-                                         GaAs_atom_positions, GaAs_nvalence_electrons,
-                                         material="GaAs")
+
+def _make_GaAs():
+    """Build the lattice, energy cutoff and pseudopotential of GaAs."""
+    GaAs_lattice = Lattice(GaAs_lat_centering, GaAs_lat_consts, GaAs_lat_angles,
+                           convention="angular")
+    GaAs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      GaAs_lattice.reciprocal_vectors.T)))*4
+    GaAs_EPM = CohenEmpiricalPseudopotential(GaAs_lattice, GaAs_spff, GaAs_apff,
+                                             GaAs_energy_cutoff, GaAs_atom_labels,
+                                             GaAs_atom_positions, GaAs_nvalence_electrons,
+                                             material="GaAs")
+    return GaAs_lattice, GaAs_energy_cutoff, GaAs_EPM
 
 #### Pseudopotential of AlSb ####
 AlSb_lat_centering = "face"
 AlSb_lat_const = 6.13*angstrom_to_Bohr # the lattice constant in Bohr
 AlSb_lat_consts = [AlSb_lat_const]*3
 AlSb_lat_angles = [np.pi/2]*3
-AlSb_lattice = Lattice(AlSb_lat_centering, AlSb_lat_consts, AlSb_lat_angles,
-                       convention="angular")
 
-AlSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  AlSb_lattice.reciprocal_vectors.T)))*4
 AlSb_atom_positions = [AlSb_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 AlSb_atom_labels = np.zeros(len(AlSb_atom_positions))
 AlSb_nvalence_electrons = 8
-AlSb_EPM = CohenEmpiricalPseudopotential(AlSb_lattice, AlSb_spff, AlSb_apff,
-                                         AlSb_energy_cutoff, AlSb_atom_labels,
-                                         AlSb_atom_positions, AlSb_nvalence_electrons,
-                                         material="AlSb")
+
+def _make_AlSb():
+    """Build the lattice, energy cutoff and pseudopotential of AlSb."""
+    AlSb_lattice = Lattice(AlSb_lat_centering, AlSb_lat_consts, AlSb_lat_angles,
+                           convention="angular")
+    AlSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      AlSb_lattice.reciprocal_vectors.T)))*4
+    AlSb_EPM = CohenEmpiricalPseudopotential(AlSb_lattice, AlSb_spff, AlSb_apff,
+                                             AlSb_energy_cutoff, AlSb_atom_labels,
+                                             AlSb_atom_positions, AlSb_nvalence_electrons,
+                                             material="AlSb")
+    return AlSb_lattice, AlSb_energy_cutoff, AlSb_EPM
 
 #### Pseudopotential of InP ####
 InP_lat_centering = "face"
 InP_lat_const = 5.86*angstrom_to_Bohr # the lattice constant in Bohr
 InP_lat_consts = [InP_lat_const]*3
 InP_lat_angles = [np.pi/2]*3
-InP_lattice = Lattice(InP_lat_centering, InP_lat_consts, InP_lat_angles,
-                      convention="angular")
-
 
-InP_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                 InP_lattice.reciprocal_vectors.T)))*4
 InP_atom_positions = [InP_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 InP_atom_labels = np.zeros(len(InP_atom_positions))
 InP_nvalence_electrons = 8
-InP_EPM = CohenEmpiricalPseudopotential(InP_lattice, InP_spff, InP_apff,
-                                        InP_energy_cutoff, InP_atom_labels,
-                                        InP_atom_positions, InP_nvalence_electrons,
-                                        material="InP")
+
+def _make_InP():
+    """Build the lattice, energy cutoff and pseudopotential of InP."""
+    InP_lattice = Lattice(InP_lat_centering, InP_lat_consts, InP_lat_angles,
+                          convention="angular")
+    InP_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                     InP_lattice.reciprocal_vectors.T)))*4
+    InP_EPM = CohenEmpiricalPseudopotential(InP_lattice, InP_spff, InP_apff,
+                                            InP_energy_cutoff, InP_atom_labels,
+                                            InP_atom_positions, InP_nvalence_electrons,
+                                            material="InP")
+    return InP_lattice, InP_energy_cutoff, InP_EPM
 
 #### Pseudopotential of GaSb ####
 GaSb_lat_centering = "face"
 GaSb_lat_const = 6.12*angstrom_to_Bohr # the lattice constant in Bohr
 GaSb_lat_consts = [GaSb_lat_const]*3
 GaSb_lat_angles = [np.pi/2]*3
-GaSb_lattice = Lattice(GaSb_lat_centering, GaSb_lat_consts, GaSb_lat_angles,
-                       convention="angular")
 
-GaSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  GaSb_lattice.reciprocal_vectors.T)))*4
 GaSb_atom_positions = [GaSb_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 GaSb_atom_labels = np.zeros(len(GaSb_atom_positions))
 GaSb_nvalence_electrons = 8
-GaSb_EPM = CohenEmpiricalPseudopotential(GaSb_lattice, GaSb_spff, GaSb_apff,
-                                         GaSb_energy_cutoff,GaSb_atom_labels, 
-                                         GaSb_atom_positions, GaSb_nvalence_electrons,
-                                         material="GaSb")
+
+def _make_GaSb():
+    """Build the lattice, energy cutoff and pseudopotential of GaSb."""
+    GaSb_lattice = Lattice(GaSb_lat_centering, GaSb_lat_consts, GaSb_lat_angles,
+                           convention="angular")
+    GaSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      GaSb_lattice.reciprocal_vectors.T)))*4
+    GaSb_EPM = CohenEmpiricalPseudopotential(GaSb_lattice, GaSb_spff, GaSb_apff,
+                                             GaSb_energy_cutoff,GaSb_atom_labels, 
+                                             GaSb_atom_positions, GaSb_nvalence_electrons,
+                                             material="GaSb")
+    return GaSb_lattice, GaSb_energy_cutoff, GaSb_EPM
 
 #### Pseudopotential of InAs ####
 InAs_lat_centering = "face"
 InAs_lat_const = 6.04*angstrom_to_Bohr # the lattice constant in Bohr
 InAs_lat_consts = [InAs_lat_const]*3
 InAs_lat_angles = [np.pi/2]*3
-InAs_lattice = Lattice(InAs_lat_centering, InAs_lat_consts, InAs_lat_angles,
-                       convention="angular")
 
-InAs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  GaSb_lattice.reciprocal_vectors.T)))*5
 InAs_atom_positions = [InAs_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 InAs_atom_labels = np.zeros(len(InAs_atom_positions))
 InAs_nvalence_electrons = 8
-InAs_EPM = CohenEmpiricalPseudopotential(InAs_lattice, InAs_spff, InAs_apff,
-                                         InAs_energy_cutoff, InAs_atom_labels,
-                                         InAs_atom_positions, InAs_nvalence_electrons,
-                                         material="InAs")
+
+def _make_InAs():
+    """Build the lattice, energy cutoff and pseudopotential of InAs."""
+    InAs_lattice = Lattice(InAs_lat_centering, InAs_lat_consts, InAs_lat_angles,
+                           convention="angular")
+    InAs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      _material_data("GaSb")[0].reciprocal_vectors.T)))*5
+    InAs_EPM = CohenEmpiricalPseudopotential(InAs_lattice, InAs_spff, InAs_apff,
+                                             InAs_energy_cutoff, InAs_atom_labels,
+                                             InAs_atom_positions, InAs_nvalence_electrons,
+                                             material="InAs")
+    return InAs_lattice, InAs_energy_cutoff, InAs_EPM
 
 #### Pseudopotential of InSb ####
 InSb_lat_centering = "face"
 InSb_lat_const = 6.48*angstrom_to_Bohr # the lattice constant in Bohr
 InSb_lat_consts = [InSb_lat_const]*3
 InSb_lat_angles = [np.pi/2]*3
-InSb_lattice = Lattice(InSb_lat_centering, InSb_lat_consts, InSb_lat_angles,
-                       convention="angular")
 
-InSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  InSb_lattice.reciprocal_vectors.T)))*4
 InSb_atom_positions = [InSb_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 InSb_atom_labels = np.zeros(len(InSb_atom_positions))
 InSb_nvalence_electrons = 8
-InSb_EPM = CohenEmpiricalPseudopotential(InSb_lattice, InSb_spff, InSb_apff,
-                                         InSb_energy_cutoff, InSb_atom_labels,
-                                         InSb_atom_positions, InSb_nvalence_electrons,
-                                         material="InSb")
+
+def _make_InSb():
+    """Build the lattice, energy cutoff and pseudopotential of InSb."""
+    InSb_lattice = Lattice(InSb_lat_centering, InSb_lat_consts, InSb_lat_angles,
+                           convention="angular")
+    InSb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      InSb_lattice.reciprocal_vectors.T)))*4
+    InSb_EPM = CohenEmpiricalPseudopotential(InSb_lattice, InSb_spff, InSb_apff,
+                                             InSb_energy_cutoff, InSb_atom_labels,
+                                             InSb_atom_positions, InSb_nvalence_electrons,
+                                             material="InSb")
+    return InSb_lattice, InSb_energy_cutoff, InSb_EPM
 
 #### Pseudopotential of ZnS ####
 ZnS_lat_centering = "face"
 ZnS_lat_const = 5.41*angstrom_to_Bohr # the lattice constant in Bohr
 ZnS_lat_consts = [ZnS_lat_const]*3
 ZnS_lat_angles = [np.pi/2]*3
-ZnS_lattice = Lattice(ZnS_lat_centering, ZnS_lat_consts, ZnS_lat_angles,
-                      convention="angular")
 
-ZnS_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                 ZnS_lattice.reciprocal_vectors.T)))*4
 ZnS_atom_positions = [ZnS_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 ZnS_atom_labels = np.zeros(len(ZnS_atom_positions))
 ZnS_nvalence_electrons = 18
-ZnS_EPM = CohenEmpiricalPseudopotential(ZnS_lattice, ZnS_spff, ZnS_apff,
-                                        ZnS_energy_cutoff, ZnS_atom_labels,
-                                        ZnS_atom_positions, ZnS_nvalence_electrons,
-                                        material="ZnS")
+
+def _make_ZnS():
+    """Build the lattice, energy cutoff and pseudopotential of ZnS."""
+    ZnS_lattice = Lattice(ZnS_lat_centering, ZnS_lat_consts, ZnS_lat_angles,
+                          convention="angular")
+    ZnS_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                     ZnS_lattice.reciprocal_vectors.T)))*4
+    ZnS_EPM = CohenEmpiricalPseudopotential(ZnS_lattice, ZnS_spff, ZnS_apff,
+                                            ZnS_energy_cutoff, ZnS_atom_labels,
+                                            ZnS_atom_positions, ZnS_nvalence_electrons,
+                                            material="ZnS")
+    return ZnS_lattice, ZnS_energy_cutoff, ZnS_EPM
 
 #### Pseudopotential of ZnSe ####
 ZnSe_lat_centering = "face"
 ZnSe_lat_const = 5.65*angstrom_to_Bohr # the lattice constant in Bohr
 ZnSe_lat_consts = [ZnSe_lat_const]*3
 ZnSe_lat_angles = [np.pi/2]*3
-ZnSe_lattice = Lattice(ZnSe_lat_centering, ZnSe_lat_consts, ZnSe_lat_angles,
-                       convention="angular")
 
-ZnSe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  ZnSe_lattice.reciprocal_vectors.T)))*4
 ZnSe_atom_positions = [ZnSe_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 ZnSe_atom_labels = np.zeros(len(ZnSe_atom_positions))
 ZnSe_nvalence_electrons = 18
-ZnSe_EPM = CohenEmpiricalPseudopotential(ZnSe_lattice, ZnSe_spff, ZnSe_apff,
-                                         ZnSe_energy_cutoff, ZnSe_atom_labels,
-                                         ZnSe_atom_positions, ZnSe_nvalence_electrons,
-                                         material="ZnSe")
+
+def _make_ZnSe():
+    """Build the lattice, energy cutoff and pseudopotential of ZnSe."""
+    ZnSe_lattice = Lattice(ZnSe_lat_centering, ZnSe_lat_consts, ZnSe_lat_angles,
+                           convention="angular")
+    ZnSe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      ZnSe_lattice.reciprocal_vectors.T)))*4
+    ZnSe_EPM = CohenEmpiricalPseudopotential(ZnSe_lattice, ZnSe_spff, ZnSe_apff,
+                                             ZnSe_energy_cutoff, ZnSe_atom_labels,
+                                             ZnSe_atom_positions, ZnSe_nvalence_electrons,
+                                             material="ZnSe")
+    return ZnSe_lattice, ZnSe_energy_cutoff, ZnSe_EPM
 
 #### Pseudopotential of ZnTe ####
 ZnTe_lat_centering = "face"
 ZnTe_lat_const = 6.07*angstrom_to_Bohr # the lattice constant in Bohr
 ZnTe_lat_consts = [ZnTe_lat_const]*3
 ZnTe_lat_angles = [np.pi/2]*3
-ZnTe_lattice = Lattice(ZnTe_lat_centering, ZnTe_lat_consts, ZnTe_lat_angles,
-                       convention="angular")
-
 
-ZnTe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  ZnTe_lattice.reciprocal_vectors.T)))*4
 ZnTe_atom_positions = [ZnTe_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 ZnTe_atom_labels = np.zeros(len(ZnTe_atom_positions))
 ZnTe_nvalence_electrons = 18
-ZnTe_EPM = CohenEmpiricalPseudopotential(ZnTe_lattice, ZnTe_spff, ZnTe_apff,
-                                         ZnTe_energy_cutoff, ZnTe_atom_labels,
-                                         ZnTe_atom_positions, ZnTe_nvalence_electrons,
-                                         material="ZnTe")
+
+def _make_ZnTe():
+    """Build the lattice, energy cutoff and pseudopotential of ZnTe."""
+    ZnTe_lattice = Lattice(ZnTe_lat_centering, ZnTe_lat_consts, ZnTe_lat_angles,
+                           convention="angular")
+    ZnTe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      ZnTe_lattice.reciprocal_vectors.T)))*4
+    ZnTe_EPM = CohenEmpiricalPseudopotential(ZnTe_lattice, ZnTe_spff, ZnTe_apff,
+                                             ZnTe_energy_cutoff, ZnTe_atom_labels,
+                                             ZnTe_atom_positions, ZnTe_nvalence_electrons,
+                                             material="ZnTe")
+    return ZnTe_lattice, ZnTe_energy_cutoff, ZnTe_EPM
 
 #### Pseudopotential of CdTe ####
 CdTe_lat_centering = "face"
 CdTe_lat_const = 6.07*angstrom_to_Bohr # the lattice constant in Bohr
 CdTe_lat_consts = [CdTe_lat_const]*3
 CdTe_lat_angles = [np.pi/2]*3
-CdTe_lattice = Lattice(CdTe_lat_centering, CdTe_lat_consts, CdTe_lat_angles,
-                       convention="angular")
 
-
-CdTe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                  CdTe_lattice.reciprocal_vectors.T)))*4
 CdTe_atom_positions = [CdTe_lat_const/8.*np.array([1,1,1])] # one atomic basis vector
 CdTe_atom_labels = np.zeros(len(CdTe_atom_positions))
 CdTe_nvalence_electrons = 18
-CdTe_EPM = CohenEmpiricalPseudopotential(CdTe_lattice, CdTe_spff, CdTe_apff,
-                                         CdTe_energy_cutoff, CdTe_atom_labels,
-                                         CdTe_atom_positions, CdTe_nvalence_electrons,
-                                         material="CdTe")
+
+def _make_CdTe():
+    """Build the lattice, energy cutoff and pseudopotential of CdTe."""
+    CdTe_lattice = Lattice(CdTe_lat_centering, CdTe_lat_consts, CdTe_lat_angles,
+                           convention="angular")
+    CdTe_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                      CdTe_lattice.reciprocal_vectors.T)))*4
+    CdTe_EPM = CohenEmpiricalPseudopotential(CdTe_lattice, CdTe_spff, CdTe_apff,
+                                             CdTe_energy_cutoff, CdTe_atom_labels,
+                                             CdTe_atom_positions, CdTe_nvalence_electrons,
+                                             material="CdTe")
+    return CdTe_lattice, CdTe_energy_cutoff, CdTe_EPM
 
 # # The end of Cohen's 14 pseudopotentials with diamond or zinc-blende structure.
 
@@ -934,66 +1923,81 @@ Toy_lat_centering = "prim"
 Toy_lat_const = 1.
 Toy_lat_consts = [Toy_lat_const]*3
 Toy_lat_angles = [np.pi/2]*3
-Toy_lattice = Lattice(Toy_lat_centering, Toy_lat_consts, Toy_lat_angles)
 
 Toy_pff = [0.0]
-Toy_energy_cutoff = 2*(2*np.pi/Toy_lat_const)**2
 Toy_atom_positions = [[0.]*3]
 Toy_atom_labels = np.zeros(len(Toy_atom_positions))
 Toy_nvalence_electrons = 3
-Toy_EPM = EmpiricalPseudopotential(Toy_lattice, Toy_pff, Toy_energy_cutoff,
-                                   Toy_atom_labels, Toy_atom_positions,
-                                   Toy_nvalence_electrons, material="Toy")
+
+def _make_Toy():
+    """Build the lattice, energy cutoff and pseudopotential of the toy model."""
+    Toy_lattice = Lattice(Toy_lat_centering, Toy_lat_consts, Toy_lat_angles)
+    Toy_energy_cutoff = 2*(2*np.pi/Toy_lat_const)**2
+    Toy_EPM = EmpiricalPseudopotential(Toy_lattice, Toy_pff, Toy_energy_cutoff,
+                                       Toy_atom_labels, Toy_atom_positions,
+                                       Toy_nvalence_electrons, material="Toy")
+    return Toy_lattice, Toy_energy_cutoff, Toy_EPM
 
 #### Free electron Pseudopotential ####
 free_lat_centering = "prim"
 free_lat_const = 1.
 free_lat_consts = [free_lat_const]*3
 free_lat_angles = [np.pi/2]*3
-free_lattice = Lattice(free_lat_centering, free_lat_consts, free_lat_angles,
-                       convention="angular")
 
 free_pff = [0.0]
-free_energy_cutoff = 2*(2*np.pi/free_lat_const)**2
 free_atom_positions = [[0.]*3]
 free_nvalence_electrons = 1
 free_degree = 2
-free_EPM = FreeElectronModel(free_lattice, free_degree)
+
+def _make_free():
+    """Build the lattice, energy cutoff and pseudopotential of the free electron model."""
+    free_lattice = Lattice(free_lat_centering, free_lat_consts, free_lat_angles,
+                           convention="angular")
+    free_energy_cutoff = 2*(2*np.pi/free_lat_const)**2
+    free_EPM = FreeElectronModel(free_lattice, free_degree)
+    return free_lattice, free_energy_cutoff, free_EPM
 
 #### Single Free electron Pseudopotential ####
 single_free_lat_centering = "prim"
 single_free_lat_const = 1.
 single_free_lat_consts = [single_free_lat_const]*3
 single_free_lat_angles = [np.pi/2]*3
-single_free_lattice = Lattice(single_free_lat_centering,
-                              single_free_lat_consts, single_free_lat_angles,
-                              convention="angular")
 
 single_free_pff = [0.0]
-single_free_energy_cutoff = 2*(2*np.pi/single_free_lat_const)**2
 single_free_atom_positions = [[0.]*3]
 single_free_nvalence_electrons = 1
 single_free_degree = 2
-single_free_EPM = SingleFreeElectronModel(single_free_lattice, single_free_degree)
+
+def _make_single_free():
+    """Build the lattice, energy cutoff and pseudopotential of the single free electron model."""
+    single_free_lattice = Lattice(single_free_lat_centering,
+                                  single_free_lat_consts, single_free_lat_angles,
+                                  convention="angular")
+    single_free_energy_cutoff = 2*(2*np.pi/single_free_lat_const)**2
+    single_free_EPM = SingleFreeElectronModel(single_free_lattice, single_free_degree)
+    return single_free_lattice, single_free_energy_cutoff, single_free_EPM
 
 #### Multiple Free electron Pseudopotential ####
 multiple_free_lat_centering = "prim"
 multiple_free_lat_const = 1.
 multiple_free_lat_consts = [multiple_free_lat_const]*3
 multiple_free_lat_angles = [np.pi/2]*3
-multiple_free_lattice = Lattice(multiple_free_lat_centering,
-                                multiple_free_lat_consts, multiple_free_lat_angles,
-                                convention="angular")
 
 multiple_free_pff = [0.0]
-multiple_free_energy_cutoff = 2*(2*np.pi/multiple_free_lat_const)**2
 multiple_free_atom_positions = [[0.]*3]
 multiple_free_nvalence_electrons = 2
 multiple_free_degree = 2
-multiple_free_EPM = MultipleFreeElectronModel(multiple_free_lattice,
-                                             multiple_free_degree,
-                                             multiple_free_nvalence_electrons)
 
+def _make_multiple_free():
+    """Build the lattice, energy cutoff and pseudopotential of the multiple free electron model."""
+    multiple_free_lattice = Lattice(multiple_free_lat_centering,
+                                    multiple_free_lat_consts, multiple_free_lat_angles,
+                                    convention="angular")
+    multiple_free_energy_cutoff = 2*(2*np.pi/multiple_free_lat_const)**2
+    multiple_free_EPM = MultipleFreeElectronModel(multiple_free_lattice,
+                                                 multiple_free_degree,
+                                                 multiple_free_nvalence_electrons)
+    return multiple_free_lattice, multiple_free_energy_cutoff, multiple_free_EPM
 
 # # The following pseudopotentials come from: 
 # # Marvin L. Cohen and Volker Heine. "The fitting of pseudopotentials to
@@ -1005,39 +2009,47 @@ Al_centering_type = "face"
 Al_lat_const = 4.05*angstrom_to_Bohr
 Al_lat_consts = [Al_lat_const]*3
 Al_lat_angles = [np.pi/2]*3
-Al_lattice = Lattice(Al_centering_type, Al_lat_consts, Al_lat_angles,
-                     convention="angular")
 
 Al_pff = [0.0, 0.0179, 0.0562]
-# Take the energy cutof as 3x the length of the longest reciprocal lattice vector squared.
-# This value isn't very important because the energy cutoff changes in the empirical pseudopotential.
-Al_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Al_lattice.reciprocal_vectors.T)))*3
 Al_atom_positions = [[0.,0.,0.]]
 Al_atom_labels = np.zeros(len(Al_atom_positions))
 Al_nvalence_electrons = 3
-Al_EPM = EmpiricalPseudopotential(Al_lattice, Al_pff, Al_energy_cutoff, Al_atom_labels,
-                                  Al_atom_positions, Al_nvalence_electrons, material="Al")
+
+def _make_Al():
+    """Build the lattice, energy cutoff and pseudopotential of Al."""
+    Al_lattice = Lattice(Al_centering_type, Al_lat_consts, Al_lat_angles,
+                         convention="angular")
+    # Take the energy cutof as 3x the length of the longest reciprocal lattice vector squared.
+    # This value isn't very important because the energy cutoff changes in the empirical pseudopotential.
+    Al_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Al_lattice.reciprocal_vectors.T)))*3
+    Al_EPM = EmpiricalPseudopotential(Al_lattice, Al_pff, Al_energy_cutoff, Al_atom_labels,
+                                      Al_atom_positions, Al_nvalence_electrons, material="Al")
+    return Al_lattice, Al_energy_cutoff, Al_EPM
 
 #### Pseudopotential of Li ####
 Li_centering_type = "body"
 Li_lat_const = 3.51*angstrom_to_Bohr # From Materials Project
 Li_lat_consts = [Li_lat_const]*3
 Li_lat_angles = [np.pi/2]*3
-Li_lattice = Lattice(Li_centering_type, Li_lat_consts, Li_lat_angles)
 Li_lat_consts = [Li_lat_const]*3
 Li_lat_angles = [np.pi/2]*3
-Li_lattice = Lattice(Li_centering_type, Li_lat_consts, Li_lat_angles,
-                     convention="angular")
 
 Li_pff = [0.0, 0.11]
-Li_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Li_lattice.reciprocal_vectors.T)))*3
 Li_atom_positions = [[0.,0.,0.]]
 Li_atom_labels = np.zeros(len(Li_atom_positions))
 Li_nvalence_electrons = 1
-Li_EPM = EmpiricalPseudopotential(Li_lattice, Li_pff, Li_energy_cutoff, Li_atom_labels,
-                                  Li_atom_positions, Li_nvalence_electrons, material="Li")
+
+def _make_Li():
+    """Build the lattice, energy cutoff and pseudopotential of Li."""
+    Li_lattice = Lattice(Li_centering_type, Li_lat_consts, Li_lat_angles)
+    Li_lattice = Lattice(Li_centering_type, Li_lat_consts, Li_lat_angles,
+                         convention="angular")
+    Li_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Li_lattice.reciprocal_vectors.T)))*3
+    Li_EPM = EmpiricalPseudopotential(Li_lattice, Li_pff, Li_energy_cutoff, Li_atom_labels,
+                                      Li_atom_positions, Li_nvalence_electrons, material="Li")
+    return Li_lattice, Li_energy_cutoff, Li_EPM
 
 #### Pseudopotential of Na ####
 Na_centering_type = "body"
@@ -1045,25 +2057,27 @@ Na_centering_type = "body"
 Na_lat_const = 4.2906*angstrom_to_Bohr
 Na_lat_consts = [Na_lat_const]*3
 Na_lat_angles = [np.pi/2]*3
-Na_lattice = Lattice(Na_centering_type, Na_lat_consts, Na_lat_angles,
-                     convention="angular")
 
 Na_pff = [0.0, 0.0158, 0.0]
-Na_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Na_lattice.reciprocal_vectors.T)))*3
 Na_atom_positions = [[0.]*3]
 Na_atom_labels = np.zeros(len(Na_atom_positions))
 Na_nvalence_electrons = 1
-Na_EPM = EmpiricalPseudopotential(Na_lattice, Na_pff, Na_energy_cutoff, Na_atom_labels,
-                                  Na_atom_positions, Na_nvalence_electrons, material="Na")
+
+def _make_Na():
+    """Build the lattice, energy cutoff and pseudopotential of Na."""
+    Na_lattice = Lattice(Na_centering_type, Na_lat_consts, Na_lat_angles,
+                         convention="angular")
+    Na_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Na_lattice.reciprocal_vectors.T)))*3
+    Na_EPM = EmpiricalPseudopotential(Na_lattice, Na_pff, Na_energy_cutoff, Na_atom_labels,
+                                      Na_atom_positions, Na_nvalence_electrons, material="Na")
+    return Na_lattice, Na_energy_cutoff, Na_EPM
     
 #### Pseudopotential of K ####
 K_centering_type = "body"
 K_lat_const = 5.225*angstrom_to_Bohr
 K_lat_consts = [K_lat_const]*3
 K_lat_angles = [np.pi/2]*3
-K_lattice = Lattice(K_centering_type, K_lat_consts, K_lat_angles,
-                    convention="angular")
 
 # The pseudopotential parameters come from the paper by Lee and Falicov titled
 # The de Haas-van Alphen  effect  and the Fermi  surface  of potassium
@@ -1072,21 +2086,25 @@ K_lattice = Lattice(K_centering_type, K_lat_consts, K_lat_angles,
 # pseudopotential. We thought that the three parameter was good enough for our
 # purposes.
 K_pff = [0.0, 0.22/Ry_to_eV, -0.89/Ry_to_eV, 0.55/Ry_to_eV]
-K_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                               K_lattice.reciprocal_vectors.T)))*4
 K_atom_positions = [[0.]*3]
 K_atom_labels = np.zeros(len(K_atom_positions))
 K_nvalence_electrons = 1
-K_EPM = EmpiricalPseudopotential(K_lattice, K_pff, K_energy_cutoff, K_atom_labels,
-                                 K_atom_positions, K_nvalence_electrons, material="K")
+
+def _make_K():
+    """Build the lattice, energy cutoff and pseudopotential of K."""
+    K_lattice = Lattice(K_centering_type, K_lat_consts, K_lat_angles,
+                        convention="angular")
+    K_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                   K_lattice.reciprocal_vectors.T)))*4
+    K_EPM = EmpiricalPseudopotential(K_lattice, K_pff, K_energy_cutoff, K_atom_labels,
+                                     K_atom_positions, K_nvalence_electrons, material="K")
+    return K_lattice, K_energy_cutoff, K_EPM
 
 #### Pseudopotential of Rb ####
 Rb_centering_type = "body"
 Rb_lat_const = 5.585*angstrom_to_Bohr # Materials Project
 Rb_lat_consts = [Rb_lat_const]*3
 Rb_lat_angles = [np.pi/2]*3
-Rb_lattice = Lattice(Rb_centering_type, Rb_lat_consts, Rb_lat_angles,
-                     convention="angular")
 
 # Again, Rb is a very rough estimate. Values are taken from the original paper
 # by Lee titled The de Haas-van Alphen effect and the Fermi surface of sodium.
@@ -1097,100 +2115,126 @@ Rb_lattice = Lattice(Rb_centering_type, Rb_lat_consts, Rb_lat_angles,
 # V200 = -0.3 is within the error bounds they gave and also made the band
 # structure look more accurate.
 Rb_pff = [0.0, 0.225/Ry_to_eV, -0.3/Ry_to_eV, 0.4/Ry_to_eV]
-Rb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Rb_lattice.reciprocal_vectors.T)))*4
 Rb_atom_positions = [[0.]*3]
 Rb_atom_labels = np.zeros(len(Rb_atom_positions))
 Rb_nvalence_electrons = 1
-Rb_EPM = EmpiricalPseudopotential(Rb_lattice, Rb_pff, Rb_energy_cutoff, Rb_atom_labels,
-                                  Rb_atom_positions, Rb_nvalence_electrons, material="Rb")
+
+def _make_Rb():
+    """Build the lattice, energy cutoff and pseudopotential of Rb."""
+    Rb_lattice = Lattice(Rb_centering_type, Rb_lat_consts, Rb_lat_angles,
+                         convention="angular")
+    Rb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Rb_lattice.reciprocal_vectors.T)))*4
+    Rb_EPM = EmpiricalPseudopotential(Rb_lattice, Rb_pff, Rb_energy_cutoff, Rb_atom_labels,
+                                      Rb_atom_positions, Rb_nvalence_electrons, material="Rb")
+    return Rb_lattice, Rb_energy_cutoff, Rb_EPM
 
 #### Pseudopotential of Cs ####
 Cs_centering_type = "body"
 Cs_lat_const = 6.141*angstrom_to_Bohr
 Cs_lat_consts = [Cs_lat_const]*3
 Cs_lat_angles = [np.pi/2]*3
-Cs_lattice = Lattice(Cs_centering_type, Cs_lat_consts, Cs_lat_angles,
-                     convention="angular")
 
 Cs_pff = [0.0, -0.03]
-Cs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Cs_lattice.reciprocal_vectors.T)))*4
 Cs_atom_positions = [[0.]*3]
 Cs_atom_labels = np.zeros(len(Cs_atom_positions))
 Cs_nvalence_electrons = 1
-Cs_EPM = EmpiricalPseudopotential(Cs_lattice, Cs_pff, Cs_energy_cutoff, Cs_atom_labels,
-                                  Cs_atom_positions, Cs_nvalence_electrons, material="Cs")
+
+def _make_Cs():
+    """Build the lattice, energy cutoff and pseudopotential of Cs."""
+    Cs_lattice = Lattice(Cs_centering_type, Cs_lat_consts, Cs_lat_angles,
+                         convention="angular")
+    Cs_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Cs_lattice.reciprocal_vectors.T)))*4
+    Cs_EPM = EmpiricalPseudopotential(Cs_lattice, Cs_pff, Cs_energy_cutoff, Cs_atom_labels,
+                                      Cs_atom_positions, Cs_nvalence_electrons, material="Cs")
+    return Cs_lattice, Cs_energy_cutoff, Cs_EPM
     
 #### Pseudopotential of Cu ####
 Cu_centering_type = "face"
 Cu_lat_const = 3.615*angstrom_to_Bohr
 Cu_lat_consts = [Cu_lat_const]*3
 Cu_lat_angles = [np.pi/2]*3
-Cu_lattice = Lattice(Cu_centering_type, Cu_lat_consts, Cu_lat_angles,
-                     convention="angular")
 
 Cu_pff = [0.0, 0.264, 0.246]
-Cu_energy_cutoff = (4+1)*(2*np.pi/Cu_lat_const)**2
-Cu_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Cu_lattice.reciprocal_vectors.T)))*4
 Cu_atom_positions = [[0.]*3]
 Cu_atom_labels = np.zeros(len(Cu_atom_positions))
 Cu_nvalence_electrons = 11
-Cu_EPM = EmpiricalPseudopotential(Cu_lattice, Cu_pff, Cu_energy_cutoff, Cu_atom_labels,
-                                  Cu_atom_positions, Cu_nvalence_electrons, material="Cu")
+
+def _make_Cu():
+    """Build the lattice, energy cutoff and pseudopotential of Cu."""
+    Cu_lattice = Lattice(Cu_centering_type, Cu_lat_consts, Cu_lat_angles,
+                         convention="angular")
+    Cu_energy_cutoff = (4+1)*(2*np.pi/Cu_lat_const)**2
+    Cu_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Cu_lattice.reciprocal_vectors.T)))*4
+    Cu_EPM = EmpiricalPseudopotential(Cu_lattice, Cu_pff, Cu_energy_cutoff, Cu_atom_labels,
+                                      Cu_atom_positions, Cu_nvalence_electrons, material="Cu")
+    return Cu_lattice, Cu_energy_cutoff, Cu_EPM
 
 #### Pseudopotential of Ag ####
 Ag_centering_type = "face"
 Ag_lat_const = 4.0853*angstrom_to_Bohr
 Ag_lat_consts = [Ag_lat_const]*3
 Ag_lat_angles = [np.pi/2]*3
-Ag_lattice = Lattice(Ag_centering_type, Ag_lat_consts, Ag_lat_angles,
-                     convention="angular")
 
 Ag_pff = [0.0, 0.204, 0.220]
-Ag_energy_cutoff = (4+1)*(2*np.pi/Ag_lat_const)**2
-Ag_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Ag_lattice.reciprocal_vectors.T)))*4
 Ag_atom_positions = [[0.]*3]
 Ag_atom_labels = np.zeros(len(Ag_atom_positions))
 Ag_nvalence_electrons = 11
-Ag_EPM = EmpiricalPseudopotential(Ag_lattice, Ag_pff, Ag_energy_cutoff, Ag_atom_labels,
-                                  Ag_atom_positions, Ag_nvalence_electrons, material="Ag")
+
+def _make_Ag():
+    """Build the lattice, energy cutoff and pseudopotential of Ag."""
+    Ag_lattice = Lattice(Ag_centering_type, Ag_lat_consts, Ag_lat_angles,
+                         convention="angular")
+    Ag_energy_cutoff = (4+1)*(2*np.pi/Ag_lat_const)**2
+    Ag_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Ag_lattice.reciprocal_vectors.T)))*4
+    Ag_EPM = EmpiricalPseudopotential(Ag_lattice, Ag_pff, Ag_energy_cutoff, Ag_atom_labels,
+                                      Ag_atom_positions, Ag_nvalence_electrons, material="Ag")
+    return Ag_lattice, Ag_energy_cutoff, Ag_EPM
 
 #### Pseudopotential of Au ####
 Au_centering_type = "face"
 Au_lat_const = 4.0782*angstrom_to_Bohr
 Au_lat_consts = [Au_lat_const]*3
 Au_lat_angles = [np.pi/2]*3
-Au_lattice = Lattice(Au_centering_type, Au_lat_consts, Au_lat_angles,
-                     convention="angular")
 
 Au_pff = [0.0, 0.252, 0.152]
-Au_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Au_lattice.reciprocal_vectors.T)))*4
 Au_atom_positions = [[0.]*3]
 Au_atom_labels = np.zeros(len(Au_atom_positions))
 Au_nvalence_electrons = 11
-Au_EPM = EmpiricalPseudopotential(Au_lattice, Au_pff, Au_energy_cutoff, Au_atom_labels,
-                                  Au_atom_positions, Au_nvalence_electrons, material="Au")
+
+def _make_Au():
+    """Build the lattice, energy cutoff and pseudopotential of Au."""
+    Au_lattice = Lattice(Au_centering_type, Au_lat_consts, Au_lat_angles,
+                         convention="angular")
+    Au_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Au_lattice.reciprocal_vectors.T)))*4
+    Au_EPM = EmpiricalPseudopotential(Au_lattice, Au_pff, Au_energy_cutoff, Au_atom_labels,
+                                      Au_atom_positions, Au_nvalence_electrons, material="Au")
+    return Au_lattice, Au_energy_cutoff, Au_EPM
 
 #### Pseudopotential of Pb ####
 Pb_centering_type = "face"
 Pb_lat_const = 4.9508*angstrom_to_Bohr
 Pb_lat_consts = [Pb_lat_const]*3
 Pb_lat_angles = [np.pi/2]*3
-Pb_lattice = Lattice(Pb_centering_type, Pb_lat_consts, Pb_lat_angles,
-                     convention="angular")
 
 Pb_pff = [0.0, -0.084, -0.039]
-Pb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Pb_lattice.reciprocal_vectors.T)))*4
 Pb_atom_positions = [[0.]*3]
 Pb_atom_labels = np.zeros(len(Pb_atom_positions))
 Pb_nvalence_electrons = 4
-Pb_EPM = EmpiricalPseudopotential(Pb_lattice, Pb_pff, Pb_energy_cutoff, Pb_atom_labels,
-                                  Pb_atom_positions, Pb_nvalence_electrons, material="Pb")
+
+def _make_Pb():
+    """Build the lattice, energy cutoff and pseudopotential of Pb."""
+    Pb_lattice = Lattice(Pb_centering_type, Pb_lat_consts, Pb_lat_angles,
+                         convention="angular")
+    Pb_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Pb_lattice.reciprocal_vectors.T)))*4
+    Pb_EPM = EmpiricalPseudopotential(Pb_lattice, Pb_pff, Pb_energy_cutoff, Pb_atom_labels,
+                                      Pb_atom_positions, Pb_nvalence_electrons, material="Pb")
+    return Pb_lattice, Pb_energy_cutoff, Pb_EPM
 
 #### Pseudopotential of Mg ####
 Mg_centering_type = "prim"
@@ -1199,17 +2243,21 @@ Mg_lat_const_c = 5.249
 Mg_lat_consts = np.array([Mg_lat_const_a, Mg_lat_const_a,
                           Mg_lat_const_c])*angstrom_to_Bohr
 Mg_lat_angles = [np.pi/2, np.pi/2, 2*np.pi/3]
-Mg_lattice = Lattice(Mg_centering_type, Mg_lat_consts, Mg_lat_angles,
-                     convention="angular")
 
 Mg_pff = [0., 0., .026, 0., 0., 0., .014, .036, 0., 0., .058]
-Mg_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Mg_lattice.reciprocal_vectors.T)))*5
 Mg_atom_positions = [[0.]*3]
 Mg_atom_labels = np.zeros(len(Mg_atom_positions))
 Mg_nvalence_electrons = 2
-Mg_EPM = EmpiricalPseudopotential(Mg_lattice, Mg_pff, Mg_energy_cutoff, Mg_atom_labels,
-                                  Mg_atom_positions, Mg_nvalence_electrons, material="Mg")
+
+def _make_Mg():
+    """Build the lattice, energy cutoff and pseudopotential of Mg."""
+    Mg_lattice = Lattice(Mg_centering_type, Mg_lat_consts, Mg_lat_angles,
+                         convention="angular")
+    Mg_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Mg_lattice.reciprocal_vectors.T)))*5
+    Mg_EPM = EmpiricalPseudopotential(Mg_lattice, Mg_pff, Mg_energy_cutoff, Mg_atom_labels,
+                                      Mg_atom_positions, Mg_nvalence_electrons, material="Mg")
+    return Mg_lattice, Mg_energy_cutoff, Mg_EPM
 
 #### Pseudopotential of Zn ####
 Zn_centering_type = "prim"
@@ -1218,17 +2266,21 @@ Zn_lat_const_c = 5.207
 Zn_lat_consts = np.array([Zn_lat_const_a, Zn_lat_const_a,
                           Zn_lat_const_c])*angstrom_to_Bohr
 Zn_lat_angles = [np.pi/2, np.pi/2, 2*np.pi/3]
-Zn_lattice = Lattice(Zn_centering_type, Zn_lat_consts, Zn_lat_angles,
-                     convention="angular")
 
 Zn_pff = [0., -0.022, 0.02, 0.063, 0.0, 0.0, 0.0, 0.0, 0.0]
-Zn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Zn_lattice.reciprocal_vectors.T)))*4
 Zn_atom_positions = [[0.]*3]
 Zn_atom_labels = np.zeros(len(Zn_atom_positions))
 Zn_nvalence_electrons = 12
-Zn_EPM = EmpiricalPseudopotential(Zn_lattice, Zn_pff, Zn_energy_cutoff, Zn_atom_labels,
-                                  Zn_atom_positions, Zn_nvalence_electrons, material="Zn")
+
+def _make_Zn():
+    """Build the lattice, energy cutoff and pseudopotential of Zn."""
+    Zn_lattice = Lattice(Zn_centering_type, Zn_lat_consts, Zn_lat_angles,
+                         convention="angular")
+    Zn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Zn_lattice.reciprocal_vectors.T)))*4
+    Zn_EPM = EmpiricalPseudopotential(Zn_lattice, Zn_pff, Zn_energy_cutoff, Zn_atom_labels,
+                                      Zn_atom_positions, Zn_nvalence_electrons, material="Zn")
+    return Zn_lattice, Zn_energy_cutoff, Zn_EPM
 
 # See Band structure and Fermi surface of Zinc and Cadmium by Stark and
 # Falicov for Cd form factors.
@@ -1239,34 +2291,42 @@ Cd_lat_const_c = 5.5261
 Cd_lat_consts = np.array([Cd_lat_const_a, Cd_lat_const_a,
                           Cd_lat_const_c])*angstrom_to_Bohr
 Cd_lat_angles = [np.pi/2, np.pi/2, 2*np.pi/3]
-Cd_lattice = Lattice(Cd_centering_type, Cd_lat_consts, Cd_lat_angles,
-                     convention="angular")
 
 Cd_pff = [0., -0.017, 0., 0., 0., 0., 0., 0.0235, 0.029, 0., 0.03]
-Cd_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Cd_lattice.reciprocal_vectors.T)))*4
 Cd_atom_positions = [[0.]*3]
 Cd_atom_labels = np.zeros(len(Cd_atom_positions))
 Cd_nvalence_electrons = 12
-Cd_EPM = EmpiricalPseudopotential(Cd_lattice, Cd_pff, Cd_energy_cutoff, Cd_atom_labels,
-                                  Cd_atom_positions, Cd_nvalence_electrons, material="Cd")
+
+def _make_Cd():
+    """Build the lattice, energy cutoff and pseudopotential of Cd."""
+    Cd_lattice = Lattice(Cd_centering_type, Cd_lat_consts, Cd_lat_angles,
+                         convention="angular")
+    Cd_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Cd_lattice.reciprocal_vectors.T)))*4
+    Cd_EPM = EmpiricalPseudopotential(Cd_lattice, Cd_pff, Cd_energy_cutoff, Cd_atom_labels,
+                                      Cd_atom_positions, Cd_nvalence_electrons, material="Cd")
+    return Cd_lattice, Cd_energy_cutoff, Cd_EPM
 
 #### Pseudopotential of Hg ####
 Hg_centering_type = "prim"
 Hg_lat_const = 2.9863*angstrom_to_Bohr
 Hg_lat_consts = [Hg_lat_const]*3
 Hg_lat_angles = [70.446*np.pi/180]*3
-Hg_lattice = Lattice(Hg_centering_type, Hg_lat_consts, Hg_lat_angles,
-                     convention="angular")
 
 Hg_pff = [-0.018, 0.028, 0.028]
-Hg_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Hg_lattice.reciprocal_vectors.T)))*4
 Hg_atom_positions = [[0.]*3]
 Hg_atom_labels = np.zeros(len(Hg_atom_positions))
 Hg_nvalence_electrons = 12
-Hg_EPM = EmpiricalPseudopotential(Hg_lattice, Hg_pff, Hg_energy_cutoff, Hg_atom_labels,
-                                  Hg_atom_positions, Hg_nvalence_electrons, material="Hg")
+
+def _make_Hg():
+    """Build the lattice, energy cutoff and pseudopotential of Hg."""
+    Hg_lattice = Lattice(Hg_centering_type, Hg_lat_consts, Hg_lat_angles,
+                         convention="angular")
+    Hg_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Hg_lattice.reciprocal_vectors.T)))*4
+    Hg_EPM = EmpiricalPseudopotential(Hg_lattice, Hg_pff, Hg_energy_cutoff, Hg_atom_labels,
+                                      Hg_atom_positions, Hg_nvalence_electrons, material="Hg")
+    return Hg_lattice, Hg_energy_cutoff, Hg_EPM
 
 #### Pseudopotential of In ####
 In_centering_type = "body"
@@ -1274,17 +2334,21 @@ In_lat_const_a = 3.2992*angstrom_to_Bohr
 In_lat_const_c = 4.9049*angstrom_to_Bohr
 In_lat_consts = [In_lat_const_a, In_lat_const_a, In_lat_const_c]
 In_lat_angles = [np.pi/2]*3
-In_lattice = Lattice(In_centering_type, In_lat_consts, In_lat_angles,
-                     convention="angular")
 
 In_pff = [0., 0., 0., 0., 0., 0., 0., -0.020, 0., 0., 0., -0.047]
-In_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                In_lattice.reciprocal_vectors.T)))*5
 In_atom_positions = [[0.]*3]
 In_atom_labels = np.zeros(len(In_atom_positions))
 In_nvalence_electrons = 3
-In_EPM = EmpiricalPseudopotential(In_lattice, In_pff, In_energy_cutoff, In_atom_labels,
-                                  In_atom_positions, In_nvalence_electrons, material="In")
+
+def _make_In():
+    """Build the lattice, energy cutoff and pseudopotential of In."""
+    In_lattice = Lattice(In_centering_type, In_lat_consts, In_lat_angles,
+                         convention="angular")
+    In_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    In_lattice.reciprocal_vectors.T)))*5
+    In_EPM = EmpiricalPseudopotential(In_lattice, In_pff, In_energy_cutoff, In_atom_labels,
+                                      In_atom_positions, In_nvalence_electrons, material="In")
+    return In_lattice, In_energy_cutoff, In_EPM
 
 #### Pseudopotential of Sn ####
 Sn_centering_type = "body"
@@ -1292,14 +2356,103 @@ Sn_lat_const_a = 3.47*angstrom_to_Bohr
 Sn_lat_const_c = 4.87*angstrom_to_Bohr
 Sn_lat_consts = [Sn_lat_const_a, Sn_lat_const_a, Sn_lat_const_c]
 Sn_lat_angles = [np.pi/2]*3
-Sn_lattice = Lattice(Sn_centering_type, Sn_lat_consts, Sn_lat_angles,
-                     convention="angular")
 
 Sn_pff = [0.]*5 + [-0.056, 0., -0.069] + [0.]*13 + [0.033, 0., 0.051]
-Sn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
-                                Sn_lattice.reciprocal_vectors.T)))*9
 Sn_atom_positions = [[0.]*3]
 Sn_atom_labels = np.zeros(len(Sn_atom_positions))
 Sn_nvalence_electrons = 4
-Sn_EPM = EmpiricalPseudopotential(Sn_lattice, Sn_pff, Sn_energy_cutoff, Sn_atom_labels,
-                                  Sn_atom_positions, Sn_nvalence_electrons, material="Sn")
+
+def _make_Sn():
+    """Build the lattice, energy cutoff and pseudopotential of body-centered tetragonal Sn."""
+    Sn_lattice = Lattice(Sn_centering_type, Sn_lat_consts, Sn_lat_angles,
+                         convention="angular")
+    Sn_energy_cutoff = max(list(map(lambda x: np.dot(x,x),
+                                    Sn_lattice.reciprocal_vectors.T)))*9
+    Sn_EPM = EmpiricalPseudopotential(Sn_lattice, Sn_pff, Sn_energy_cutoff, Sn_atom_labels,
+                                      Sn_atom_positions, Sn_nvalence_electrons, material="Sn")
+    return Sn_lattice, Sn_energy_cutoff, Sn_EPM
+
+#### Lazy construction of the materials ####
+# Building a lattice and a pseudopotential takes a noticeable fraction of a second,
+# so the materials above are only built the first time they are requested, either
+# through get_material or by accessing a module attribute such as Si_EPM.
+_material_makers = {"Si": _make_Si, "Ge": _make_Ge, "cSn": _make_cSn, "GaP": _make_GaP,
+                    "GaAs": _make_GaAs, "AlSb": _make_AlSb, "InP": _make_InP,
+                    "GaSb": _make_GaSb, "InAs": _make_InAs, "InSb": _make_InSb,
+                    "ZnS": _make_ZnS, "ZnSe": _make_ZnSe, "ZnTe": _make_ZnTe,
+                    "CdTe": _make_CdTe, "Toy": _make_Toy, "free": _make_free,
+                    "single_free": _make_single_free, "multiple_free": _make_multiple_free,
+                    "Al": _make_Al, "Li": _make_Li, "Na": _make_Na, "K": _make_K,
+                    "Rb": _make_Rb, "Cs": _make_Cs, "Cu": _make_Cu, "Ag": _make_Ag,
+                    "Au": _make_Au, "Pb": _make_Pb, "Mg": _make_Mg, "Zn": _make_Zn,
+                    "Cd": _make_Cd, "Hg": _make_Hg, "In": _make_In, "Sn": _make_Sn}
+materials = list(_material_makers.keys())
+_materials = {}
+_material_attributes = ["lattice", "energy_cutoff", "EPM"]
+
+
+def _material_data(name):
+    """Build the lattice, energy cutoff and pseudopotential of a material once and
+    memoize them.
+
+    Args:
+        name (str): the name of the material, one of `materials`.
+
+    Returns:
+        _ (tuple): the lattice, energy cutoff and pseudopotential of the material.
+    """
+
+    if name not in _material_makers:
+        msg = "Unknown material '{}'. The available materials are {}."
+        raise ValueError(msg.format(name, materials))
+    if name not in _materials:
+        _materials[name] = _material_makers[name]()
+    return _materials[name]
+
+
+def get_material(name):
+    """Get the empirical pseudopotential of a material. The pseudopotential is built
+    the first time it is requested and the same object is returned afterwards.
+
+    Args:
+        name (str): the name of the material, one of `materials`, such as "Si" or "Al".
+
+    Returns:
+        _ (:py:obj:`EmpiricalPseudopotential`): the pseudopotential of the material.
+
+    Example:
+        >>> from bzi_3D.pseudopots import get_material
+        >>> Si_EPM = get_material("Si")
+    """
+
+    return _material_data(name)[2]
+
+
+def __getattr__(name):
+    """Build the lattices, energy cutoffs and pseudopotentials of the materials, such as
+    `Si_EPM`, when they are first accessed as module attributes.
+    """
+
+    for i, attribute in enumerate(_material_attributes):
+        suffix = "_" + attribute
+        if name.endswith(suffix) and name[:-len(suffix)] in _material_makers:
+            return _material_data(name[:-len(suffix)])[i]
+    msg = "module '{}' has no attribute '{}'"
+    raise AttributeError(msg.format(__name__, name))
+
+
+def __dir__():
+    """List the lazily built materials alongside the names defined in the module, so
+    they can be discovered without being built.
+    """
+
+    return sorted(list(globals()) +
+                  [m + "_" + a for m in materials for a in _material_attributes])
+
+
+# Star imports only see names in the module namespace, so the lazily built materials
+# are listed here explicitly alongside the public names defined above. A star import
+# builds all of them; import them by name or use `get_material` to only build those
+# that are used.
+__all__ = ([n for n in list(globals()) if not n.startswith("_")] +
+           [m + "_" + a for m in materials for a in _material_attributes])
@@ -6,13 +6,16 @@ from numpy.linalg import inv, norm
 from copy import deepcopy
 import itertools as it
 from math import ceil
-import os, pickle
+from collections import OrderedDict
+import os, json
 
 from bzi_3D.symmetry import (make_ptvecs, UpperHermiteNormalForm, HermiteNormalForm,
-                          just_map_to_bz, bring_into_cell, check_commensurate)
+                          just_map_to_bz, bring_into_cell, check_commensurate,
+                          Lattice)
 
 # make_grid has a bug for some triclinic lattices. Fix then uncomment.
-def make_grid(rlat_vecs, grid_vecs, offset, coords="Cart", rtol=1e-5, atol=1e-8):
+def make_grid(rlat_vecs, grid_vecs, offset, coords="Cart", rtol=1e-5, atol=1e-8,
+              dtype=float):
     """Create a regular grid within a parallelepiped.
 
     Args:
@@ -28,9 +31,13 @@ def make_grid(rlat_vecs, grid_vecs, offset, coords="Cart", rtol=1e-5, atol=1e-8)
             are commensurate and for bringing points into the first unit cell.
         atol (float): an absolute tolerance for checking if the grid and lattice vectors
             are commensurate and for bringing points into the first unit cell.
+        dtype (numpy.dtype): the type of the coordinates returned, such as
+            numpy.float32 for large grids. The points are always found in double
+            precision.
 
     Returns:
-        grid (numpy.ndarray): an array of point coordinates in 3-space.
+        grid (numpy.ndarray): an array of point coordinates in 3-space with shape
+            (number of points, 3).
 
     Examples:
         >>> cell_centering = "face"
@@ -66,42 +73,28 @@ def make_grid(rlat_vecs, grid_vecs, offset, coords="Cart", rtol=1e-5, atol=1e-8)
     e = H[1,2]
     f = H[2,2]
 
-    grid = []
-    
-    # Lower and upper limits for first loop of integers
-    z3pl = 0 
-    z3pu = int(f)
-    
-    # for z3p in range(z3pl + 1, z3pu + 1):
-    for z3p in range(z3pl, z3pu):
-        # Lower and upper limits
-        z2pl = int(e*z3p/f) 
-        z2pu = int(z2pl + d)
-        
-        # for z2p in range(z2pl + 1, z2pu + 1):
-        for z2p in range(z2pl, z2pu):
-            # Lower and upper limits
-            z1pl = int((c - b*e/d)*z3p/f + b/d*z2p)
-            z1pu = int(z1pl + a)
-            
-            # for z1p in range(z1pl + 1, z1pu + 1):
-            for z1p in range(z1pl, z1pu):
-                
-                z = np.dot(inv(U), [z1p,z2p,z3p])
-                pt = bring_into_cell(np.dot(grid_vecs, z), rlat_vecs,
-                                     rtol=rtol, atol=atol) + offset_lat
-                grid.append(pt)
+    # The integer coordinates of the points in the basis of the HNF, ordered with the
+    # first coordinate changing fastest. The bounds of the second and first
+    # coordinates depend on the third and second.
+    z3p = np.arange(int(f))[:, None, None]
+    z2p = np.trunc(e*z3p/f).astype(int) + np.arange(int(d))[None, :, None]
+    z1p = (np.trunc((c - b*e/d)*z3p/f + b/d*z2p).astype(int) +
+           np.arange(int(a))[None, None, :])
+    ints = np.stack(np.broadcast_arrays(z1p, z2p, z3p), axis=-1).reshape(-1, 3)
 
-    grid = np.array(grid)
+    # Transform the integers to Cartesian coordinates all at once and move the points
+    # into the first unit cell.
+    grid = bring_into_cell(np.dot(ints, np.dot(grid_vecs, inv(U)).T), rlat_vecs,
+                           rtol=rtol, atol=atol) + offset_lat
 
     if coords == "Cart":
-        return grid
+        return grid.astype(dtype)
     elif coords == "lat":
         grid = np.dot(inv(rlat_vecs), grid.T).T
     else:
         raise ValueError("Coordinate options include 'Cart' and 'lat'.")
 
-    return grid
+    return grid.astype(dtype)
                     
 def make_large_grid(cell_vectors, grid_vectors, offset, cart=True):
     """This function is similar to make_grid except it samples a volume
@@ -192,7 +185,11 @@ def large_sphere_pts(A, r2, offset=[0.,0.,0.], eps=1e-12):
     norms = np.array([np.dot(p,p) for p in grid])
     return grid[np.where(norms < (r2 + eps))] + offset
 
-def sphere_pts(A, r2, offset=[0.,0.,0.], eps=1e-12):
+# The points found by `sphere_pts`, with the least recently used first.
+_sphere_pts_cache = OrderedDict()
+_sphere_pts_cache_size = 256
+
+def sphere_pts(A, r2, offset=[0.,0.,0.], eps=1e-12, cache=True):
     """ Calculate all the points within a sphere that are
     given by an integer linear combination of the columns of 
     A.
@@ -202,30 +199,47 @@ def sphere_pts(A, r2, offset=[0.,0.,0.], eps=1e-12):
         r2 (float): the squared radius of the sphere.
         offset(list or numpy.ndarray): a vector that points to the center
             of the sphere in Cartesian coordinates.
-        offset (numpy.ndarray): the center of the sphere.
+        eps (float): a tolerance added to `r2` so that points on the sphere are
+            included.
+        cache (bool): if true, the points are stored and returned again when the
+            basis, radius and offset rounded to 12 decimals are the same. The
+            points returned are then read-only.
+
     Returns:
-        grid (list): an array of grid coordinates in cartesian
+        grid (numpy.ndarray): an array of grid coordinates in cartesian
             coordinates.
     """
-    
-    offset = np.asarray(offset)
-    
-    # Put the offset in cell coordinates and find a cell point close to the
-    # offset.
-    oi= np.round(np.dot(inv(A),offset)).astype(int)
-    r = np.sqrt(r2)
-    V = np.linalg.det(A)
-    n = [int(np.ceil(norm(np.cross(A[:,(i+1)%3],A[:,(i+2)%3]))*r/V) + 10)
-         for i in range(3)]
 
-    ints = np.array(list(it.product(range(-n[0] + oi[0], n[0] + oi[0] + 1),
-                   range(-n[1] + oi[1], n[1] + oi[1] + 1),
-                   range(-n[2] + oi[2], n[2] + oi[2] + 1))))
-    
-    grid = np.dot(A, ints.T).T - offset
-    norms = np.array([np.dot(p,p) for p in grid])
-    
-    return grid[np.where(norms < (r2 + eps))] + offset
+    A = np.asarray(A, dtype=float)
+    offset = np.asarray(offset, dtype=float)
+    if cache:
+        key = (np.round(A, 12).tobytes(), float(r2),
+               np.round(offset, 12).tobytes(), float(eps))
+        if key in _sphere_pts_cache:
+            _sphere_pts_cache.move_to_end(key)
+            return _sphere_pts_cache[key]
+
+    # The lattice coordinates of the points in the sphere differ from those of its
+    # center by at most the radius times the norm of the rows of the inverse of A,
+    # which are the spacings of the lattice planes.
+    inv_A = inv(A)
+    center = np.dot(inv_A, offset)
+    widths = np.sqrt(r2 + eps)*norm(inv_A, axis=1)
+    lower = np.floor(center - widths).astype(int)
+    upper = np.ceil(center + widths).astype(int)
+    ints = np.reshape(np.mgrid[lower[0]:upper[0] + 1, lower[1]:upper[1] + 1,
+                               lower[2]:upper[2] + 1], (3, -1))
+
+    grid = np.dot(A, ints).T - offset
+    norms = np.sum(grid**2, axis=1)
+    grid = grid[norms < (r2 + eps)] + offset
+
+    if cache:
+        grid.setflags(write=False)
+        _sphere_pts_cache[key] = grid
+        while len(_sphere_pts_cache) > _sphere_pts_cache_size:
+            _sphere_pts_cache.popitem(last=False)
+    return grid
 
 def make_cell_points(lat_vecs, grid_vecs, offset=[0,0,0], cart=True, rtol=1e-5, atol=1e-8):
     """Sample within a parallelepiped using any regular grid. If the offset is such that
@@ -292,7 +306,7 @@ def make_cell_points(lat_vecs, grid_vecs, offset=[0,0,0], cart=True, rtol=1e-5,
         grid.append(pt)
     return grid
 
-def get_EPM_grid_energies(EPM, ndivs, neigvals, save_dir=None):
+def get_EPM_grid_energies(EPM, ndivs, neigvals, save_dir=None, processes=None):
     """Create a grid in the Brillouin zone and get a list of 
     eigenvalue energies at the points on the grid.
     
@@ -302,13 +316,19 @@ def get_EPM_grid_energies(EPM, ndivs, neigvals, save_dir=None):
             The size of the grid is ndivs**3.
         neigvals (int): the number of eigenvalues to save for each sampling
             point.
-        file_name (str): if a string is provided, save the grid and energies
-            at the location provided.
+        save_dir (str): if provided, the grid and energies are stored in a
+            folder named after the material and number of divisions in this
+            directory with `store_grid_energies`. An interrupted calculation
+            continues where it stopped and a finished one is read from the
+            folder.
+        processes (int): if provided, the eigenvalues are evaluated in this many
+            processes with a `ParallelEvaluator`.
             
     Returns:
         grid (list): an approximately uniformly spaced grid in the BZ.
         all_energies (numpy.ndarray): a list of the eigenenergies at the
-            positions in grid in the same order.
+            positions in grid in the same order. They are memory-mapped
+            read-only when they are stored.
     """
 
     lat_vecs = EPM.lattice.vectors
@@ -330,14 +350,169 @@ def get_EPM_grid_energies(EPM, ndivs, neigvals, save_dir=None):
         
     # Plot the grid in the Brilloun zone.
     # plot_all_bz(lat_vecs, grid=bz_grid, convention="angular")
-    
-    # Put all the energy eigenvalues in a list.
-    all_energies = np.array([EPM.eval(pt, neigvals) for pt in bz_grid])
 
     if save_dir is not None:
-        data = [bz_grid, all_energies]
-        file_name = os.path.join(save_dir, EPM.material + ".p")
-        with open(file_name, "wb") as file:
-            pickle.dump(data, file)
+        directory = os.path.join(save_dir, "{}_{}".format(EPM.material, ndivs))
+        all_energies = store_grid_energies(EPM, bz_grid, neigvals, directory,
+                                           grid_vecs, offset, processes=processes)
+        return load_grid_energies(directory)[0], all_energies
+    
+    # Put all the energy eigenvalues in a list.
+    if processes is None:
+        all_energies = EPM.eval_many(bz_grid, neigvals)
+    else:
+        # The pseudopotentials import this module, so the evaluator is imported
+        # here.
+        from bzi_3D.pseudopots import ParallelEvaluator
+        with ParallelEvaluator(EPM, processes) as evaluator:
+            all_energies = evaluator.eval_many(bz_grid, neigvals)
     
     return bz_grid, all_energies
+
+
+# The files of a folder of stored grid energies.
+_manifest_file = "manifest.json"
+_grid_file = "grid.npy"
+_energies_file = "energies.npy"
+
+
+def _json_value(value):
+    """Convert the argument of a pseudopotential's constructor to a value that can
+    be written to JSON. Lattices are replaced by their lattice vectors.
+    """
+
+    if isinstance(value, Lattice):
+        value = value.vectors
+    if isinstance(value, (list, tuple, np.ndarray, np.generic)):
+        return np.asarray(value).tolist()
+    return value
+
+
+def _write_manifest(directory, manifest):
+    """Write the manifest of a folder of stored grid energies. It is written to a
+    temporary file first so that an interrupted write leaves the old manifest.
+    """
+
+    file_name = os.path.join(directory, _manifest_file)
+    with open(file_name + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(file_name + ".tmp", file_name)
+
+
+def load_grid_energies(directory):
+    """Open the grid and energies stored by `store_grid_energies`. The arrays are
+    memory-mapped read-only, so they aren't read into memory until they are used.
+
+    Args:
+        directory (str): the folder where the grid and energies are stored.
+
+    Returns:
+        grid (numpy.ndarray): the grid points with shape (N,3).
+        energies (numpy.ndarray): the energies at the grid points. The energies at
+            points that haven't been evaluated are nan.
+        manifest (dict): the class and constructor arguments of the
+            pseudopotential, the number of eigenvalues, the grid vectors and
+            offset, the number of points, and the number of points evaluated,
+            under "completed".
+    """
+
+    with open(os.path.join(directory, _manifest_file)) as file:
+        manifest = json.load(file)
+    grid = np.load(os.path.join(directory, _grid_file), mmap_mode="r")
+    energies = np.load(os.path.join(directory, _energies_file), mmap_mode="r")
+    return grid, energies, manifest
+
+
+def store_grid_energies(EPM, grid, neigvals, directory, grid_vectors=None,
+                        offset=None, chunk_size=4096, processes=None):
+    """Evaluate the energies at the points of a grid and store them in a folder as
+    .npy files, with a manifest of the parameters of the pseudopotential and grid.
+    The energies are evaluated in chunks and each is written as it finishes, so an
+    interrupted calculation continues from the last chunk. If the folder already
+    has the energies of the same pseudopotential and grid, only the missing ones are
+    evaluated. Otherwise it is overwritten.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential
+            object.
+        grid (numpy.ndarray): the grid points with shape (N,3).
+        neigvals (int): the number of eigenvalues to store at each point.
+        directory (str): the folder where the grid and energies are stored. It is
+            created if it doesn't exist.
+        grid_vectors (numpy.ndarray): the grid generating vectors as columns of a
+            3x3 array, recorded in the manifest.
+        offset (numpy.ndarray): the offset of the grid, recorded in the manifest.
+        chunk_size (int): the number of points evaluated before they are written.
+        processes (int): if provided, the eigenvalues are evaluated in this many
+            processes with a `ParallelEvaluator`.
+
+    Returns:
+        energies (numpy.ndarray): the energies at the grid points, memory-mapped
+            read-only. They can be passed to the integration functions without
+            being read into memory.
+
+    Example:
+        >>> grid, tetrahedra = grid_and_tetrahedra(Si_EPM, 20)
+        >>> energies = store_grid_energies(Si_EPM, grid, 8, "Si_20")
+        >>> calc_total_energy(Si_EPM, tetrahedra, weights, grid, energies=energies)
+    """
+
+    # The pseudopotentials import this module, so they are imported here.
+    from bzi_3D.pseudopots import model_spec, ParallelEvaluator
+
+    if chunk_size < 1:
+        msg = "The chunk size must be a positive integer."
+        raise ValueError(msg.format(chunk_size))
+    grid = np.reshape(np.asarray(grid, dtype=float), (-1, 3))
+    if not len(grid):
+        msg = "The grid must have at least one point."
+        raise ValueError(msg.format(grid))
+    cls, kwargs = model_spec(EPM)
+    parameters = {"model": cls.__name__,
+                  "arguments": {k: _json_value(v) for k,v in kwargs.items()},
+                  "neigvals": int(neigvals),
+                  "grid_vectors": _json_value(grid_vectors),
+                  "offset": _json_value(offset),
+                  "npoints": len(grid)}
+    # Compare the parameters as they are read from the manifest.
+    parameters = json.loads(json.dumps(parameters))
+    grid_file = os.path.join(directory, _grid_file)
+    energies_file = os.path.join(directory, _energies_file)
+
+    completed = 0
+    energies = None
+    try:
+        old_grid, old_energies, manifest = load_grid_energies(directory)
+        if ({k: manifest.get(k) for k in parameters} == parameters and
+            np.array_equal(old_grid, grid) and len(old_energies) == len(grid)):
+            completed = manifest["completed"]
+            energies = np.load(energies_file, mmap_mode="r+")
+    except (OSError, ValueError, KeyError):
+        pass
+    if completed == len(grid):
+        return np.load(energies_file, mmap_mode="r")
+    os.makedirs(directory, exist_ok=True)
+
+    evaluator = EPM if processes is None else ParallelEvaluator(EPM, processes)
+    try:
+        for start in range(completed, len(grid), chunk_size):
+            chunk_energies = np.asarray(evaluator.eval_many(
+                grid[start:start + chunk_size], neigvals))
+            if energies is None:
+                # The number of energies at each point is known once the first chunk
+                # is evaluated.
+                np.save(grid_file, grid)
+                energies = np.lib.format.open_memmap(
+                    energies_file, mode="w+", dtype=float,
+                    shape=(len(grid), np.shape(chunk_energies)[1]))
+                energies[:] = np.nan
+            energies[start:start + chunk_size] = chunk_energies
+            energies.flush()
+            # The manifest is only updated after the energies are on disk.
+            _write_manifest(directory, dict(parameters,
+                                            completed=start + len(chunk_energies)))
+    finally:
+        if processes is not None:
+            evaluator.close()
+    del energies
+    return np.load(energies_file, mmap_mode="r")
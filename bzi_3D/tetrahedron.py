@@ -1,12 +1,13 @@
 """Module related to Blochl's improved linear tetrahedron method."""
 
 import numpy as np
-from numpy.linalg import norm
+from numpy.linalg import norm, inv
 from itertools import product
 from copy import deepcopy
 import math
+from multiprocessing import Pool, shared_memory
 
-from bzi_3D.symmetry import get_orbits, bring_into_cell
+from bzi_3D.symmetry import get_orbits, bring_into_cell, get_space_group
 
 
 def find_tetrahedra(vertices):
@@ -117,7 +118,36 @@ def number_of_states(VG, VT, energies, e):
         return 2.*(VT/VG)
 
 
-def find_adjacent_tetrahedra(tetrahedra_list, k):
+def vertex_tetrahedra(tetrahedra_list, npts=None):
+    """Build an index of the tetrahedra that contain each vertex. The index is stored
+    in compressed sparse row form, so the tetrahedra that contain the vertex `k` are
+    `tet_indices[indptr[k]:indptr[k+1]]`, in the order they appear in
+    `tetrahedra_list`.
+
+    Args:
+        tetrahedra_list (list or numpy.ndarray): a list of quadruples of grid point
+            indices at the corners of the tetrahedra.
+        npts (int): the number of grid points. If None, it is one more than the largest
+            index in `tetrahedra_list`.
+
+    Returns:
+        indptr (numpy.ndarray): the start of the tetrahedra of each vertex in
+            `tet_indices` with length npts + 1.
+        tet_indices (numpy.ndarray): the indices of the tetrahedra that contain each
+            vertex, grouped by vertex.
+    """
+
+    vertices = np.asarray(tetrahedra_list).flatten()
+    if npts is None:
+        npts = vertices.max() + 1 if len(vertices) else 0
+    order = np.argsort(vertices, kind="stable")
+    tet_indices = order//4
+    indptr = np.zeros(npts + 1, dtype=int)
+    np.cumsum(np.bincount(vertices, minlength=npts), out=indptr[1:])
+    return indptr, tet_indices
+
+
+def find_adjacent_tetrahedra(tetrahedra_list, k, vertex_index=None):
     """For each k point in the grid, this function generates a list of
     tetrahedra indices for each tetrahedron containing the k point.
 
@@ -127,18 +157,21 @@ def find_adjacent_tetrahedra(tetrahedra_list, k):
             quadruple is a list of the grid_point indices at the corners of
             the tetrahedron.
         k (int): the k-point index.
+        vertex_index (tuple): the index from `vertex_tetrahedra`. If None, the
+            tetrahedra are searched.
 
     Returns:
         adjacent_tetrahedra (list): a list of tetrahedra containing the
         k-point index.
     """
 
-    adjacent_tetrahedra = []
-    for tet in tetrahedra_list:
-        for ki in tet:
-            if ki == k:
-                adjacent_tetrahedra.append(tet)
-    adjacent_tetrahedra = [t.tolist() for t in adjacent_tetrahedra]
+    tetrahedra_list = np.asarray(tetrahedra_list)
+    if vertex_index is None:
+        tet_indices = np.nonzero(tetrahedra_list == k)[0]
+    else:
+        indptr, tet_indices = vertex_index
+        tet_indices = tet_indices[indptr[k]:indptr[k+1]]
+    adjacent_tetrahedra = tetrahedra_list[tet_indices].tolist()
 
     return adjacent_tetrahedra
 
@@ -148,45 +181,49 @@ def convert_tet_index(tetind, ndiv0):
     all the k-points in the grid. Only applicable to Blochl's tetrahedron method.
 
     Args:
-        tetind (int): the index of the tetrahedron
+        tetind (int or numpy.ndarray): the index of the tetrahedron, or an array of
+            indices.
         ndivs (list or numpy.ndarray): a array of the number of divisions made creating
             the grid.
     Return:
-        tetind (int): the position of the k-point in the grid.
+        tetind (int or numpy.ndarray): the position of the k-point in the grid.
     """
 
     ndiv0 = np.array(ndiv0)
     ndiv1 = ndiv0 + 1
     npts = np.prod(ndiv1)
-    ndiv2 = ndiv0 + 2
     ndiv3 = ndiv0 + 3
-    if tetind < npts:
-        page = 1
-        column = 1
-        while tetind >= ndiv1[0]*ndiv1[1]:
-            page += 1
-            tetind -= (ndiv1[0]*ndiv1[1])
-        while tetind >= ndiv1[0]:
-            column += 1
-            tetind -= ndiv1[0]
-        return page*ndiv3[0]*ndiv3[1] + column*ndiv3[0] + 1 + tetind
-    else:
-        return tetind - npts
+
+    # The indices of the points of the grid count along rows and pages of the grid.
+    # The other indices count the points around the grid after them.
+    page, rest = np.divmod(tetind, ndiv1[0]*ndiv1[1])
+    column, rest = np.divmod(rest, ndiv1[0])
+    tetind = np.where(np.less(tetind, npts),
+                      (page + 1)*ndiv3[0]*ndiv3[1] + (column + 1)*ndiv3[0] + 1 + rest,
+                      np.subtract(tetind, npts))
+    return tetind if np.ndim(tetind) else int(tetind)
 
 
 def corrected_integration_weights(EPM, grid, tetrahedra_list, tetrahedron,
-                                  iband, ndiv0):
+                                  iband, ndiv0, vertex_index=None, energies=None):
     """Determine the corrected integration weights of a single tetrahedron and
     band.
 
     Args:
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
             tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
         grid (numpy.ndarray): a Monkhorst-Pack grid.
         tetrahedra_list (list): a list of tetrahedra where each tetrahedra is a
             quadruple of integers.
         tetrahedron (list): the tetrahedron being considered.
         iband (int): the index of the band being considered.
+        vertex_index (tuple): the index of the tetrahedra that contain each vertex
+            from `vertex_tetrahedra(tetrahedra_list)`. If None, it is built.
+        energies (numpy.ndarray): the band energies at the points of `grid` from
+            `calc_grid_energies`. If None, the energies at the vertices of the
+            tetrahedron and its adjacent tetrahedra are evaluated.
 
     Returns:
         energies (list): the energies at the vertices of the provided
@@ -195,13 +232,19 @@ def corrected_integration_weights(EPM, grid, tetrahedra_list, tetrahedron,
             tetrahedron.
     """
 
+    tetrahedra_list = np.asarray(tetrahedra_list)
     tetrahedron = np.array(tetrahedron)
+    if vertex_index is None:
+        vertex_index = vertex_tetrahedra(tetrahedra_list)
+    indptr, tet_indices = vertex_index
+
+    # The tetrahedra adjacent to each vertex of the tetrahedron.
+    adjacent_tetrahedra = [tetrahedra_list[tet_indices[indptr[ki]:indptr[ki+1]]]
+                           for ki in tetrahedron]
 
     # Convert the indices of the tetrahedron from 0-npts to the index of the
     # k-point in the extended grid.
-    tet_grid_indices = np.array([0]*4)
-    for i,ki in enumerate(tetrahedron):
-        tet_grid_indices[i] = convert_tet_index(ki, ndiv0)
+    tet_grid_indices = convert_tet_index(tetrahedron, ndiv0)
 
     npts = np.prod(ndiv0)
     ntets = npts*6
@@ -210,36 +253,123 @@ def corrected_integration_weights(EPM, grid, tetrahedra_list, tetrahedron,
     VG = EPM.lattice.reciprocal_volume
     neigvals = int(np.ceil(EPM.nvalence_electrons/2)+1)
 
+    if energies is None:
+        # Only evaluate the points that are needed, each one once.
+        points = np.unique(np.concatenate(
+            [tet_grid_indices] + [convert_tet_index(adj.flatten(), ndiv0)
+                                  for adj in adjacent_tetrahedra]))
+        point_energies = np.asarray(EPM.eval_many(np.asarray(grid)[points], neigvals))
+        energies = np.full((len(grid), np.shape(point_energies)[1]), np.nan)
+        energies[points] = point_energies
+
     # Find the correction to the integration weights. This is done according to
     # Eq. 22 in Blochl's improved tetrahedron paper.
 
     # We're going to calculate the weight correction for the k-points of
     # the tetrahedron being considered.
-    corrections = [0.]*4
-    energies = [EPM.eval(grid[ki], iband+1)[iband] for ki in tet_grid_indices]
-    tet_grid_indices = tet_grid_indices[np.argsort(energies)]
-    tetrahedron = tetrahedron[np.argsort(energies)]
-    energies = np.sort(energies)
-
-    for i,ki in enumerate(tetrahedron):
-        en = energies[i]
-        adjacent_tetrahedra = find_adjacent_tetrahedra(tetrahedra_list, ki)
-        for tet in adjacent_tetrahedra:
-            adj_tet_energies = []
-            t_correction = 0
-            for kj in tet:
-                kindex = convert_tet_index(kj, ndiv0)
-                enj = EPM.eval(grid[kindex], neigvals)[iband]
-                adj_tet_energies.append(enj)
-                t_correction += enj - en
-            adj_tet_energies = np.sort(adj_tet_energies)
-            t_correction *= density_of_states(VG, VT, adj_tet_energies, EPM.fermi_level)
-            corrections[i] += t_correction
-
-    corrections = np.array(corrections)/40
-    uncorrected_weights = np.array(integration_weights(VT, energies, EPM.fermi_level))
-
-    return energies, uncorrected_weights + corrections
+    tet_energies = energies[tet_grid_indices, iband]
+    order = np.argsort(tet_energies)
+    adjacent_tetrahedra = [adjacent_tetrahedra[i] for i in order]
+    tet_energies = tet_energies[order]
+
+    corrections = np.zeros(4)
+    for i,en in enumerate(tet_energies):
+        adj_tet_energies = energies[convert_tet_index(adjacent_tetrahedra[i], ndiv0),
+                                    iband]
+        t_corrections = np.sum(adj_tet_energies - en, axis=-1)
+        t_corrections *= density_of_states_array(VG, VT, np.sort(adj_tet_energies),
+                                                 EPM.fermi_level)
+        corrections[i] = np.sum(t_corrections)
+
+    corrections = corrections/40
+    uncorrected_weights = np.array(integration_weights(VT, tet_energies,
+                                                       EPM.fermi_level))
+
+    return tet_energies, uncorrected_weights + corrections
+
+
+def corrected_integration_weights_array(EPM, tetrahedra_list, extended_tetrahedra_list,
+                                        energies, ndiv0, fermi_level=None,
+                                        periodic=False):
+    """Determine the corrected integration weights of all the tetrahedra and bands
+    at once. This is an array version of `corrected_integration_weights`.
+
+    The correction to the weight of a vertex in Eq. 22 of Blochl's improved
+    tetrahedron paper only depends on the vertex, so it is found once for each vertex
+    from the density of states at the Fermi level of every extended tetrahedron.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        tetrahedra_list (numpy.ndarray): the tetrahedra of the grid from
+            `grid_and_tetrahedra`.
+        extended_tetrahedra_list (numpy.ndarray): the tetrahedra of the extended grid
+            from `get_extended_tetrahedra`.
+        energies (numpy.ndarray): the band energies at the points of the extended grid
+            with shape (number of points, number of bands).
+        ndiv0 (list or numpy.ndarray): the number of divisions made creating the grid.
+        fermi_level (float): the Fermi level. If None, `EPM.fermi_level` is used.
+        periodic (bool): if true, the tetrahedra and extended tetrahedra are those of
+            `get_extended_tetrahedra` with `periodic`, and the energies are at the
+            points of the periodic grid.
+
+    Returns:
+        tet_energies (numpy.ndarray): the energies at the vertices of the tetrahedra
+            with shape (number of tetrahedra, number of bands, 4), ordered from least
+            to greatest for each band.
+        weights (numpy.ndarray): the corrected integration weights of the vertices in
+            the same order as `tet_energies`.
+    """
+
+    if fermi_level is None:
+        fermi_level = EPM.fermi_level
+    energies = np.asarray(energies, dtype=float)
+    extended_tetrahedra_list = np.asarray(extended_tetrahedra_list)
+
+    ntets = np.prod(ndiv0)*6
+    VG = EPM.lattice.reciprocal_volume
+    VT = VG/ntets
+
+    # The density of states at the Fermi level and the sum of the energies of each
+    # extended tetrahedron and band.
+    if periodic:
+        ext_points = extended_tetrahedra_list
+        tet_points = np.asarray(tetrahedra_list)
+    else:
+        ext_points = convert_tet_index(extended_tetrahedra_list, ndiv0)
+        tet_points = convert_tet_index(tetrahedra_list, ndiv0)
+    ext_energies = np.swapaxes(energies[ext_points], 1, 2)
+    ext_dos = density_of_states_array(VG, VT, np.sort(ext_energies, axis=-1),
+                                      fermi_level)
+    ext_sums = np.sum(ext_energies, axis=-1)
+
+    # The sums over the tetrahedra adjacent to each vertex. The correction to the
+    # weight of vertex j is sum_T D_T*(sum_{k in T} e_k - 4*e_j)/40.
+    tetrahedra_list = np.asarray(tetrahedra_list)
+    vertices = extended_tetrahedra_list.flatten()
+    tet_of_vertex = np.arange(len(vertices))//4
+    nvertices = max(vertices.max(), tetrahedra_list.max()) + 1
+    nbands = np.shape(energies)[1]
+    vertex_dos = np.zeros((nvertices, nbands))
+    vertex_dos_sums = np.zeros((nvertices, nbands))
+    for band in range(nbands):
+        vertex_dos[:, band] = np.bincount(vertices, ext_dos[tet_of_vertex, band],
+                                          nvertices)
+        vertex_dos_sums[:, band] = np.bincount(
+            vertices, (ext_dos*ext_sums)[tet_of_vertex, band], nvertices)
+
+    # The energies and corrections at the vertices of the tetrahedra, sorted by
+    # energy for each band.
+    tet_energies = np.swapaxes(energies[tet_points], 1, 2)
+    corrections = (np.swapaxes(vertex_dos_sums[tetrahedra_list], 1, 2) -
+                   4*tet_energies*np.swapaxes(vertex_dos[tetrahedra_list], 1, 2))/40
+    order = np.argsort(tet_energies, axis=-1)
+    tet_energies = np.take_along_axis(tet_energies, order, axis=-1)
+    corrections = np.take_along_axis(corrections, order, axis=-1)
+
+    weights = integration_weights_array(VT, tet_energies, fermi_level) + corrections
+    return tet_energies, weights
 
 
 def integration_weights(VT, energies, eF):
@@ -360,6 +490,420 @@ def density_of_states(VG, VT, energies, e):
         return 3*(VT/VG)*(e4 - e)**2/(e41*e42*e43)*2.
 
 
+def _broadcast_energies(energies, e):
+    """Broadcast the sorted energies at the corners of tetrahedra against one or more
+    energies.
+
+    Args:
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis.
+        e (float or numpy.ndarray): an energy or an array of energies.
+
+    Returns:
+        _ (list): the energies at the first, second, third, and fourth corners and
+            `e`, each with shape `energies.shape[:-1] + numpy.shape(e)`.
+    """
+
+    energies = np.asarray(energies, dtype=float)
+    e = np.asarray(e, dtype=float)
+    shape = np.shape(energies)[:-1] + (1,)*e.ndim
+    corners = [np.reshape(energies[...,i], shape) for i in range(4)]
+    return [np.array(a) for a in np.broadcast_arrays(*corners, e)]
+
+
+def number_of_states_array(VG, VT, energies, e):
+    """Calculate the contributions of many tetrahedra and bands to the total number
+    of states at once. This is an array version of `number_of_states`.
+
+    Args:
+        VG (float): the volume of the unit cell.
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis, with a shape such
+            as (number of tetrahedra, number of bands, 4).
+        e (float or numpy.ndarray): the energy, or an array of energies, at which the
+            total number of states is being calculated.
+
+    Returns:
+        nos (numpy.ndarray): the number of states from each tetrahedron and band
+            with shape `energies.shape[:-1] + numpy.shape(e)`.
+    """
+
+    e1, e2, e3, e4, e = _broadcast_energies(energies, e)
+    return 2.*(float(VT)/float(VG))*_number_of_states_cases(e1, e2, e3, e4, e)
+
+
+def _number_of_states_cases(e1, e2, e3, e4, e):
+    """Evaluate the fraction of a tetrahedron below an energy for arrays of corner
+    energies and energies that have the same shape.
+
+    Args:
+        e1, e2, e3, e4 (numpy.ndarray): the sorted energies at the corners.
+        e (numpy.ndarray): the energies.
+
+    Returns:
+        nos (numpy.ndarray): the fraction of each tetrahedron below `e`.
+    """
+
+    nos = np.zeros(np.shape(e))
+
+    # Each case only divides by differences of energies that are nonzero within it.
+    case = (e1 <= e) & (e < e2)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    nos[case] = (e_ - e1_)**3/((e2_ - e1_)*(e3_ - e1_)*(e4_ - e1_))
+
+    case = (e2 <= e) & (e < e3)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    e21 = e2_ - e1_
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    e32 = e3_ - e2_
+    e42 = e4_ - e2_
+    de = e_ - e2_
+    nos[case] = 1/(e31*e41)*(e21**2 + 3*e21*de + 3*de**2 - (e31 + e42)/(e32*e42)*de**3)
+
+    case = (e3 <= e) & (e < e4)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    nos[case] = 1 - (e4_ - e_)**3/((e4_ - e1_)*(e4_ - e2_)*(e4_ - e3_))
+
+    nos[e4 <= e] = 1.
+    return nos
+
+
+def density_of_states_array(VG, VT, energies, e):
+    """Calculate the contributions of many tetrahedra and bands to the density of
+    states at once. This is an array version of `density_of_states`.
+
+    Args:
+        VG (float): the volume of the unit cell.
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis, with a shape such
+            as (number of tetrahedra, number of bands, 4).
+        e (float or numpy.ndarray): the energy, or an array of energies, at which the
+            density of states is being calculated.
+
+    Returns:
+        dos (numpy.ndarray): the density of states from each tetrahedron and band
+            with shape `energies.shape[:-1] + numpy.shape(e)`.
+    """
+
+    e1, e2, e3, e4, e = _broadcast_energies(energies, e)
+    return 2.*(float(VT)/float(VG))*_density_of_states_cases(e1, e2, e3, e4, e)
+
+
+def _density_of_states_cases(e1, e2, e3, e4, e):
+    """Evaluate the density of states of a tetrahedron, in units of its volume, for
+    arrays of corner energies and energies that have the same shape.
+
+    Args:
+        e1, e2, e3, e4 (numpy.ndarray): the sorted energies at the corners.
+        e (numpy.ndarray): the energies.
+
+    Returns:
+        dos (numpy.ndarray): the density of states of each tetrahedron at `e`.
+    """
+
+    dos = np.zeros(np.shape(e))
+
+    case = (e1 <= e) & (e < e2)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    dos[case] = 3./((e2_ - e1_)*(e3_ - e1_)*(e4_ - e1_))*(e_ - e1_)**2
+
+    case = (e2 <= e) & (e < e3)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    e21 = e2_ - e1_
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    e32 = e3_ - e2_
+    e42 = e4_ - e2_
+    de = e_ - e2_
+    dos[case] = 1/(e31*e41)*(3*e21 + 6*de - 3*(e31 + e42)*de**2/(e32*e42))
+
+    case = (e3 <= e) & (e < e4)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    dos[case] = 3*(e4_ - e_)**2/((e4_ - e1_)*(e4_ - e2_)*(e4_ - e3_))
+
+    return dos
+
+
+def dos_nos_array(VG, VT, energies, weights, energy_list, max_pairs=2**22):
+    """Calculate the density of states and number of states on a mesh of energies
+    in a single sweep over the tetrahedra.
+
+    Each tetrahedron and band only contributes to the number of states at energies
+    above its highest corner, which is accumulated for all of them at once, and to
+    both quantities at the mesh energies between its lowest and highest corners. Only
+    these pairs of tetrahedra and mesh energies are evaluated.
+
+    Args:
+        VG (float): the volume of the unit cell.
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis, with shape
+            (number of tetrahedra, number of bands, 4).
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        energy_list (list or numpy.ndarray): the energies at which the density of
+            states and number of states are calculated.
+        max_pairs (int): the largest number of pairs of tetrahedra and mesh
+            energies evaluated together. It bounds the memory used.
+
+    Returns:
+        dos (numpy.ndarray): the density of states at each energy.
+        nos (numpy.ndarray): the number of states at each energy.
+    """
+
+    energies = np.asarray(energies, dtype=float)
+    nbands = np.shape(energies)[1]
+    tet_weights = np.repeat(np.asarray(weights, dtype=float)[:len(energies)], nbands)
+    energies = np.reshape(energies, (-1, 4))
+
+    energy_list = np.asarray(energy_list, dtype=float)
+    order = np.argsort(energy_list)
+    mesh = energy_list[order]
+    dos = np.zeros(len(mesh))
+    nos = np.zeros(len(mesh))
+
+    # The tetrahedra that lie entirely below an energy are filled.
+    top = np.argsort(energies[:,3])
+    filled = np.append(0., np.cumsum(tet_weights[top]))
+    nos += filled[np.searchsorted(energies[top,3], mesh, side="right")]
+
+    # The mesh energies within each tetrahedron are a contiguous range of the
+    # sorted mesh.
+    lo = np.searchsorted(mesh, energies[:,0], side="left")
+    hi = np.searchsorted(mesh, energies[:,3], side="left")
+    counts = hi - lo
+    active = np.nonzero(counts)[0]
+    bounds = np.searchsorted(np.cumsum(counts[active]),
+                             np.arange(max_pairs, np.sum(counts), max_pairs))
+    for chunk in np.split(active, bounds + 1):
+        if len(chunk) == 0:
+            continue
+        # Pair each tetrahedron with the mesh energies in its range.
+        npairs = counts[chunk]
+        tet = np.repeat(chunk, npairs)
+        starts = np.repeat(np.cumsum(npairs) - npairs, npairs)
+        mesh_index = np.repeat(lo[chunk], npairs) + np.arange(len(tet)) - starts
+        e1, e2, e3, e4 = energies[tet].T
+        e = mesh[mesh_index]
+
+        dos += np.bincount(mesh_index, weights=tet_weights[tet]*_density_of_states_cases(
+            e1, e2, e3, e4, e), minlength=len(mesh))
+        nos += np.bincount(mesh_index, weights=tet_weights[tet]*_number_of_states_cases(
+            e1, e2, e3, e4, e), minlength=len(mesh))
+
+    # Return the curves in the order of the energies given.
+    scale = 2.*(float(VT)/float(VG))
+    result_dos = np.empty(len(mesh))
+    result_nos = np.empty(len(mesh))
+    result_dos[order] = scale*dos
+    result_nos[order] = scale*nos
+    return result_dos, result_nos
+
+
+def integration_weights_array(VT, energies, eF):
+    """Determine the integration weights of many tetrahedra and bands at once. This
+    is an array version of `integration_weights`.
+
+    Args:
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis, with a shape such
+            as (number of tetrahedra, number of bands, 4).
+        eF (float or numpy.ndarray): the Fermi level, or an array of energies.
+
+    Returns:
+        weights (numpy.ndarray): the integration weights of the corners of the
+            tetrahedra with shape `energies.shape[:-1] + numpy.shape(eF) + (4,)`.
+    """
+
+    e1, e2, e3, e4, eF = _broadcast_energies(energies, eF)
+    VT = float(VT)
+    weights = np.zeros(np.shape(eF) + (4,))
+
+    case = (e1 <= eF) & (eF < e2)
+    e1_, e2_, e3_, e4_, eF_ = e1[case], e2[case], e3[case], e4[case], eF[case]
+    e21 = e2_ - e1_
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    C = VT/4.*(eF_ - e1_)**3/(e21*e31*e41)
+    weights[case] = np.transpose([C*(4 - (eF_ - e1_)*(1./e21 + 1./e31 + 1/e41)),
+                                  C*(eF_ - e1_)/e21,
+                                  C*(eF_ - e1_)/e31,
+                                  C*(eF_ - e1_)/e41])
+
+    case = (e2 <= eF) & (eF < e3)
+    e1_, e2_, e3_, e4_, eF_ = e1[case], e2[case], e3[case], e4[case], eF[case]
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    e32 = e3_ - e2_
+    e42 = e4_ - e2_
+    C1 = VT/4.*(eF_ - e1_)**2/(e41*e31)
+    C2 = VT/4.*((eF_ - e1_)*(eF_ - e2_)*(e3_ - eF_))/(e41*e32*e31)
+    C3 = VT/4.*(eF_ - e2_)**2*(e4_ - eF_)/(e42*e32*e41)
+    weights[case] = np.transpose([
+        C1 + (C1 + C2)*(e3_ - eF_)/e31 + (C1 + C2 + C3)*(e4_ - eF_)/e41,
+        C1 + C2 + C3 + (C2 + C3)*(e3_ - eF_)/e32 + C3*(e4_ - eF_)/e42,
+        (C1 + C2)*(eF_ - e1_)/e31 + (C2 + C3)*(eF_ - e2_)/e32,
+        (C1 + C2 + C3)*(eF_ - e1_)/e41 + C3*(eF_ - e2_)/e42])
+
+    case = (e3 <= eF) & (eF < e4)
+    e1_, e2_, e3_, e4_, eF_ = e1[case], e2[case], e3[case], e4[case], eF[case]
+    e41 = e4_ - e1_
+    e42 = e4_ - e2_
+    e43 = e4_ - e3_
+    C = VT/4.*(e4_ - eF_)**3/(e41*e42*e43)
+    weights[case] = np.transpose([VT/4. - C*(e4_ - eF_)/e41,
+                                  VT/4. - C*(e4_ - eF_)/e42,
+                                  VT/4. - C*(e4_ - eF_)/e43,
+                                  VT/4. - C*(4 - (1/e41 + 1/e42 + 1/e43)*(e4_ - eF_))])
+
+    weights[e4 <= eF] = VT/4.
+    return weights
+
+
+def delta_weights_array(VT, energies, e):
+    """Determine the weights of the corners of many tetrahedra and bands for
+    integrals over the surface of constant energy `e`. They are the derivatives of
+    the integration weights with respect to the Fermi level, and they add up to the
+    volume of the tetrahedron times its density of states.
+
+    Args:
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the corners of the tetrahedra
+            ordered from least to greatest along the last axis, with a shape such
+            as (number of tetrahedra, number of bands, 4).
+        e (float or numpy.ndarray): the energy, or an array of energies.
+
+    Returns:
+        weights (numpy.ndarray): the weights of the corners of the tetrahedra with
+            shape `energies.shape[:-1] + numpy.shape(e) + (4,)`.
+    """
+
+    e1, e2, e3, e4, e = _broadcast_energies(energies, e)
+    VT = float(VT)
+    weights = np.zeros(np.shape(e) + (4,))
+
+    case = (e1 <= e) & (e < e2)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    e21 = e2_ - e1_
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    de = e_ - e1_
+    C = VT/4.*de**2/(e21*e31*e41)
+    weights[case] = np.transpose([C*(12 - 4*de*(1./e21 + 1./e31 + 1./e41)),
+                                  4*C*de/e21,
+                                  4*C*de/e31,
+                                  4*C*de/e41])
+
+    case = (e2 <= e) & (e < e3)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    e31 = e3_ - e1_
+    e41 = e4_ - e1_
+    e32 = e3_ - e2_
+    e42 = e4_ - e2_
+    de1 = e_ - e1_
+    de2 = e_ - e2_
+    de3 = e3_ - e_
+    de4 = e4_ - e_
+    # The coefficients of the integration weights and their derivatives.
+    C1 = VT/4.*de1**2/(e41*e31)
+    C2 = VT/4.*de1*de2*de3/(e41*e32*e31)
+    C3 = VT/4.*de2**2*de4/(e42*e32*e41)
+    dC1 = VT/2.*de1/(e41*e31)
+    dC2 = VT/4.*(de2*de3 + de1*de3 - de1*de2)/(e41*e32*e31)
+    dC3 = VT/4.*(2*de2*de4 - de2**2)/(e42*e32*e41)
+    weights[case] = np.transpose([
+        dC1 + (dC1 + dC2)*de3/e31 - (C1 + C2)/e31 + (dC1 + dC2 + dC3)*de4/e41 -
+        (C1 + C2 + C3)/e41,
+        dC1 + dC2 + dC3 + (dC2 + dC3)*de3/e32 - (C2 + C3)/e32 + dC3*de4/e42 - C3/e42,
+        (dC1 + dC2)*de1/e31 + (C1 + C2)/e31 + (dC2 + dC3)*de2/e32 + (C2 + C3)/e32,
+        (dC1 + dC2 + dC3)*de1/e41 + (C1 + C2 + C3)/e41 + dC3*de2/e42 + C3/e42])
+
+    case = (e3 <= e) & (e < e4)
+    e1_, e2_, e3_, e4_, e_ = e1[case], e2[case], e3[case], e4[case], e[case]
+    e41 = e4_ - e1_
+    e42 = e4_ - e2_
+    e43 = e4_ - e3_
+    de = e4_ - e_
+    C = VT/4.*de**2/(e41*e42*e43)
+    weights[case] = np.transpose([4*C*de/e41,
+                                  4*C*de/e42,
+                                  4*C*de/e43,
+                                  C*(12 - 4*de*(1./e41 + 1./e42 + 1./e43))])
+    return weights
+
+
+def _grid_offset(EPM, ndivisions, lat_shift, grid_shift):
+    """Find the offset of the grids made for the tetrahedron method.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object
+        ndivisions (list): a list of integers that represent the number of
+            divisions along each basis vector to take when creating the grid.
+        lat_shift (list or numpy.ndarray): a vector that shifts the grid in
+            fractions of the reciprocal lattice vectors.
+        grid_shift (list of numpy.ndarray): the offset of the lattice in
+            fractions of the submesh translations.
+
+    Returns:
+        _ (numpy.ndarray): the offset in Cartesian coordinates.
+    """
+
+    return np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
+        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
+
+
+def _grid_points(EPM, ndiv0, shape, offset):
+    """Make the points of a grid for the tetrahedron method. The point with indices
+    [k,j,i] is at the reciprocal lattice coordinates [i,j,k]/ndiv0.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object
+        ndiv0 (numpy.ndarray): the number of divisions along each reciprocal lattice
+            vector.
+        shape (list or numpy.ndarray): the number of points along each axis of the grid.
+        offset (numpy.ndarray): the offset of the grid in Cartesian coordinates.
+
+    Returns:
+        _ (numpy.ndarray): the grid points in Cartesian coordinates, ordered with the
+            last index changing fastest.
+    """
+
+    k, j, i = np.indices(shape)
+    coords = np.reshape(np.stack([i, j, k], axis=-1), (-1, 3))/ndiv0
+    return np.dot(coords, np.transpose(EPM.lattice.reciprocal_vectors)) + offset
+
+
+def _cell_tetrahedra(indices, cell_vertices):
+    """Split every cell of a regular grid into six tetrahedra that share the cell's
+    shortest diagonal. Every cell of a regular grid has the same shortest diagonal, so
+    it is only found once.
+
+    Args:
+        indices (numpy.ndarray): the indices of the points of the grid in a 3D array.
+        cell_vertices (numpy.ndarray): the vertices of the first cell of the grid in
+            the order used by `find_tetrahedra`.
+
+    Returns:
+        tetrahedra (numpy.ndarray): the point indices at the vertices of the
+            tetrahedra with six tetrahedra for each cell, ordered as the cells with the
+            last index changing fastest.
+    """
+
+    # The positions of the corners of the tetrahedra within a cell (0-7).
+    sub_tetrahedra = np.array(find_tetrahedra(np.asarray(cell_vertices))) - 1
+
+    # The indices at each corner of every cell with shape (number of cells, 8). The
+    # corner ki + 2*(kj + 2*kk) is displaced by [kk,kj,ki] from the cell's origin.
+    ncells = np.array(np.shape(indices)) - 1
+    corners = np.stack([indices[kk:kk + ncells[0], kj:kj + ncells[1], ki:ki + ncells[2]]
+                        for kk,kj,ki in product(range(2), repeat=3)], axis=-1)
+    corners = np.reshape(corners, (-1, 8))
+    return np.reshape(corners[:, sub_tetrahedra], (-1, 4)).astype(np.int32)
+
+
 def make_extended_grid_indices(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0]):
     """Find the extended grid and indices for the non-extended grid for
     the improved tetrahedron method.
@@ -382,31 +926,14 @@ def make_extended_grid_indices(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0
         ndivisions = [ndivisions, ndivisions, ndivisions]
     ndiv0 = np.array(ndivisions)
     ndiv1 = ndiv0+1
-    offset = np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
-        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
-    npts = np.prod(ndiv1)
-    grid = np.empty(ndiv1, dtype=list)
-
-    indices = np.empty(ndiv0, dtype=int)
-
-    for k,j,i in product(range(ndiv1[0]), range(ndiv1[1]), range(ndiv1[2])):
-        grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                             np.array([i,j,k], dtype=float)/ndiv0) + offset
-
-    for k,j,i in product(range(ndiv0[0]), range(ndiv0[1]), range(ndiv0[2])):
-        indices[k,j,i] = int(i + ndiv0[2]*(j + ndiv0[1]*k))
-
-    # It goes z, y, x
-    new_indices = np.zeros(np.array(ndiv1), dtype=int)
-    new_indices[0:ndiv0[0], 0:ndiv0[1], 0:ndiv0[2]] = indices
-    new_indices[:,:,ndiv0[2]] = new_indices[:,:,0]
-    new_indices[:,ndiv0[1],:] = new_indices[:,0,:]
-    new_indices[ndiv0[0],:,:] = new_indices[0,:,:]
-
-    indices = np.array([i for i in new_indices.flatten()])
-    grid = np.array([g for g in grid.flatten()])
-    return grid, indices
+    offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+    grid = _grid_points(EPM, ndiv0, ndiv1, offset)
 
+    # The indices of the points of the periodic grid. It goes z, y, x and the points
+    # on the far faces are the same as those on the near faces.
+    indices = np.arange(np.prod(ndiv0)).reshape(ndiv0)
+    indices = np.pad(indices, [(0,1)]*3, mode="wrap")
+    return grid, indices.flatten()
 
 def grid_and_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0]):
     """Find the grid and tetrahedra for the improved tetrahedron method.
@@ -430,43 +957,13 @@ def grid_and_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0]):
         ndivisions = [ndivisions, ndivisions, ndivisions]
     ndiv0 = np.array(ndivisions)
     ndiv1 = ndiv0+1
-    offset = np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
-        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
-    npts = np.prod(ndiv1)
-    grid = np.empty(ndiv1, dtype=list)
-    indices = np.empty(ndiv1, dtype=int)
-
-    for k,j,i in product(range(ndiv1[0]), range(ndiv1[1]), range(ndiv1[2])):
-        index = int(i + ndiv1[2]*(j + ndiv1[1]*k))
-        grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                             np.array([i,j,k], dtype=float)/ndiv0) + offset
-        indices[k,j,i] = index
-
-    tetrahedra = np.empty(np.prod(ndiv0)*6,dtype=list)
-
-    for k,j,i in product(range(ndiv0[0]), range(ndiv0[1]), range(ndiv0[2])):
-        submesh = np.empty([8], dtype=list)
-        submesh_indices = np.empty([8], dtype=int)
-        for kk,kj,ki in product(range(2),repeat=3):
-            submesh[ki + 2*(kj + 2*kk)] = grid[k + kk, j + kj, i + ki]
-            submesh_indices[ki + 2*(kj + 2*kk)] = indices[k + kk, j + kj, i + ki]
-        # Find the tetrahedra with indexing 1-8.
-        sub_tetrahedra = find_tetrahedra(submesh)
-
-        # Replace 1-8 indices with sub_mesh indices.
-        for m in range(6):
-            # The index of the submeshcell
-            ti = m + 6*(i + ndiv0[2]*(j + ndiv0[1]*k))
-            tetrahedra[ti] = [0]*4
-
-            for n in range(4):
-                tetrahedra[ti][n] = submesh_indices[sub_tetrahedra[m][n]-1]
-
-    tetrahedra = np.array([t for t in tetrahedra])
-    grid = np.array([g.tolist() for g in grid.flatten()])
+    offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+    grid = _grid_points(EPM, ndiv0, ndiv1, offset)
+    indices = np.arange(np.prod(ndiv1)).reshape(ndiv1)
+    cell_vertices = grid[[indices[kk,kj,ki] for kk,kj,ki in product(range(2), repeat=3)]]
+    tetrahedra = _cell_tetrahedra(indices, cell_vertices)
     return grid, tetrahedra
 
-
 def get_grid_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0]):
     """Find the grid and tetrahedra for the improved tetrahedron method.
 
@@ -489,68 +986,578 @@ def get_grid_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0]):
         ndivisions = [ndivisions, ndivisions, ndivisions]
     ndiv0 = np.array(ndivisions)
     ndiv1 = ndiv0+1
-    offset = np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
-        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
-    npts = np.prod(ndiv0)
-    grid = np.empty(ndiv0, dtype=list)
-    indices = np.empty(ndiv0, dtype=int)
-
-    for k,j,i in product(range(ndiv0[0]), range(ndiv0[1]), range(ndiv0[2])):
-        index = int(i + ndiv0[2]*(j + ndiv0[1]*k))
-        grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                             np.array([i,j,k], dtype=float)/ndiv0) + offset
-        indices[k,j,i] = index
-
-
-    extended_grid = np.empty(ndiv1, dtype=list)
-    for k,j,i in product(range(ndiv1[0]), range(ndiv1[1]), range(ndiv1[2])):
-        extended_grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                                      np.array([i,j,k], dtype=float)/ndiv0) + offset
-
-    # It goes z, y, x
-    new_indices = np.zeros(np.array(ndiv0) + 1, dtype=int)
-    new_indices[0:ndiv0[0], 0:ndiv0[1], 0:ndiv0[2]] = indices
-    new_indices[:,:,ndiv0[2]] = new_indices[:,:,0]
-    new_indices[:,ndiv0[1],:] = new_indices[:,0,:]
-    new_indices[ndiv0[0],:,:] = new_indices[0,:,:]
-    indices = new_indices
-
-    tetrahedra = np.empty(np.prod(ndiv0)*6,dtype=list)
-    for k,j,i in product(range(ndiv0[0]), range(ndiv0[1]), range(ndiv0[2])):
-        submesh = np.empty([8], dtype=list)
-        submesh_indices = np.empty([8], dtype=int)
-        for kk,kj,ki in product(range(2),repeat=3):
-            submesh[ki + 2*(kj + 2*kk)] = extended_grid[k + kk, j + kj, i + ki]
-            submesh_indices[ki + 2*(kj + 2*kk)] = indices[k + kk, j + kj, i + ki]
-        # Find the tetrahedra with indexing 1-8.
-        sub_tetrahedra = find_tetrahedra(submesh)
-
-        # Replace 1-8 indices with sub_mesh indices.
-        for m in range(6):
-            # The index of the submeshcell
-            ti = m + 6*(i + ndiv0[2]*(j + ndiv0[1]*k))
-            tetrahedra[ti] = [0]*4
-
-            for n in range(4):
-                tetrahedra[ti][n] = submesh_indices[sub_tetrahedra[m][n]-1]
-
-    tetrahedra = np.array([t for t in tetrahedra])
-    grid = np.array([g.tolist() for g in grid.flatten()])
-
+    offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+    grid = _grid_points(EPM, ndiv0, ndiv0, offset)
+    extended_grid = _grid_points(EPM, ndiv0, ndiv1, offset)
+
+    # The indices of the points of the periodic grid. It goes z, y, x and the points
+    # on the far faces are the same as those on the near faces.
+    indices = np.arange(np.prod(ndiv0)).reshape(ndiv0)
+    indices = np.pad(indices, [(0,1)]*3, mode="wrap")
+    cell_vertices = extended_grid[[np.ravel_multi_index([kk,kj,ki], ndiv1)
+                                   for kk,kj,ki in product(range(2), repeat=3)]]
+    tetrahedra = _cell_tetrahedra(indices, cell_vertices)
     return grid, tetrahedra
 
+class ImplicitTetrahedra(object):
+    """The tetrahedra of a regular grid, found from the cell indices when they are
+    needed instead of being stored. Every cell is split into six tetrahedra that
+    share the cell's shortest diagonal, in the same order as `grid_and_tetrahedra`
+    and `get_grid_tetrahedra`.
+
+    Args:
+        ndivisions (list): a list of integers that represent the number of
+            divisions along each basis vector.
+        cell_vertices (numpy.ndarray): the vertices of the first cell of the grid in
+            the order used by `find_tetrahedra`.
+        periodic (bool): if true, the points on the far faces of the grid are the
+            same as those on the near faces, as in `get_grid_tetrahedra`. Otherwise
+            the grid has an extra layer of points, as in `grid_and_tetrahedra`.
+
+    Attributes:
+        ndivisions (numpy.ndarray): the number of cells along each axis.
+        npoints (numpy.ndarray): the number of grid points along each axis.
+        periodic (bool): whether the indices wrap around the grid.
+        sub_tetrahedra (numpy.ndarray): the corners of the six tetrahedra within a
+            cell, from 0 to 7.
+        shape (tuple): the shape of the array of tetrahedra.
+        dtype (numpy.dtype): the type of the vertex indices.
+    """
+
+    def __init__(self, ndivisions, cell_vertices, periodic=False):
+        if type(ndivisions) == int:
+            ndivisions = [ndivisions, ndivisions, ndivisions]
+        self.ndivisions = np.array(ndivisions)
+        self.periodic = periodic
+        if periodic:
+            self.npoints = self.ndivisions
+        else:
+            self.npoints = self.ndivisions + 1
+        self.sub_tetrahedra = np.array(find_tetrahedra(np.asarray(cell_vertices))) - 1
+        self.shape = (6*int(np.prod(self.ndivisions)), 4)
+        self.dtype = np.dtype(np.int32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        tetrahedra = self[:]
+        if dtype is not None:
+            tetrahedra = tetrahedra.astype(dtype)
+        return tetrahedra
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            for tetrahedron in chunk:
+                yield tetrahedron
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                # Find the tetrahedra of whole cells and trim the ends.
+                first_cell = start//6
+                last_cell = max(first_cell, -(-stop//6))
+                tetrahedra = self._cell_range(first_cell, last_cell)
+                return tetrahedra[start - 6*first_cell:stop - 6*first_cell]
+            index = np.arange(start, stop, step)
+        elif isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                msg = "Tetrahedron index {} is out of range for {} tetrahedra."
+                raise IndexError(msg.format(index, len(self)))
+            return self[index:index + 1][0]
+
+        index = np.asarray(index)
+        index = np.where(index < 0, index + len(self), index)
+        if np.any((index < 0) | (index >= len(self))):
+            msg = "Tetrahedron indices are out of range for {} tetrahedra."
+            raise IndexError(msg.format(len(self)))
+        corners = self._corners(index//6)
+        sub = self.sub_tetrahedra[index % 6]
+        return np.take_along_axis(corners, sub, axis=-1).astype(np.int32)
+
+    def _corners(self, cells):
+        """Find the indices of the points at the corners of cells.
+
+        Args:
+            cells (numpy.ndarray): the cell indices, ordered with the last axis
+                changing fastest.
+
+        Returns:
+            corners (numpy.ndarray): the point indices with shape
+                `cells.shape + (8,)`. The corner ki + 2*(kj + 2*kk) is displaced by
+                [kk,kj,ki] from the cell's origin.
+        """
+
+        position = np.unravel_index(cells, self.ndivisions)
+        corners = []
+        for displacement in product(range(2), repeat=3):
+            corner = [p + d for p,d in zip(position, displacement)]
+            if self.periodic:
+                corner = [c % n for c,n in zip(corner, self.ndivisions)]
+            corners.append(np.ravel_multi_index(corner, self.npoints))
+        return np.stack(corners, axis=-1)
+
+    def _cell_range(self, first_cell, last_cell):
+        """Find the tetrahedra of a contiguous range of cells.
+
+        Args:
+            first_cell (int): the first cell.
+            last_cell (int): one past the last cell.
+
+        Returns:
+            tetrahedra (numpy.ndarray): the tetrahedra of the cells.
+        """
+
+        corners = self._corners(np.arange(first_cell, last_cell))
+        return np.reshape(corners[:, self.sub_tetrahedra], (-1, 4)).astype(np.int32)
+
+    def chunks(self, chunk_size=2**16):
+        """Iterate over the tetrahedra in contiguous blocks.
+
+        Args:
+            chunk_size (int): the number of tetrahedra in each block.
+
+        Returns:
+            _ (generator): arrays of at most `chunk_size` tetrahedra.
+        """
+
+        for start in range(0, len(self), chunk_size):
+            yield self[start:start + chunk_size]
+
+
+def implicit_grid_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0],
+                             periodic=False):
+    """Find the grid and the implicit tetrahedra for the improved tetrahedron method.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object
+        ndivisions (list): a list of integers that represent the number of
+            divisions along each basis vector to take when creating the grid.
+        lat_shift (list or numpy.ndarray): a vector that shifts the grid in
+            fractions of the reciprocal lattice vectors.
+        grid_shift (list of numpy.ndarray): the offset of the lattice in
+            fractions of the submesh translations.
+        periodic (bool): if true, the grid and tetrahedra are those of
+            `get_grid_tetrahedra`. Otherwise they are those of `grid_and_tetrahedra`.
+
+    Returns:
+        grid (numpy.ndarray): the grid in Cartesian coordinates.
+        tetrahedra (ImplicitTetrahedra): the tetrahedra, which find their vertices
+            when they are indexed.
+    """
 
-def calc_total_states(EPM, tetrahedra, weights, grid, energy, nbands):
+    if type(ndivisions) == int:
+        ndivisions = [ndivisions, ndivisions, ndivisions]
+    ndiv0 = np.array(ndivisions)
+    ndiv1 = ndiv0+1
+    offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+    if periodic:
+        grid = _grid_points(EPM, ndiv0, ndiv0, offset)
+    else:
+        grid = _grid_points(EPM, ndiv0, ndiv1, offset)
+    cell_vertices = _grid_points(EPM, ndiv0, [2, 2, 2], offset)
+    return grid, ImplicitTetrahedra(ndivisions, cell_vertices, periodic=periodic)
+
+
+def tetrahedron_chunks(tetrahedra, weights, chunk_size=None):
+    """Iterate over blocks of tetrahedra and their weights.
+
+    Args:
+        tetrahedra (numpy.ndarray or ImplicitTetrahedra or generator): lists of
+            tetrahedra vertices. Arrays, including memory-mapped arrays, and
+            `ImplicitTetrahedra` are split into blocks of `chunk_size` tetrahedra. A
+            generator should yield arrays of tetrahedra, which are used as they are.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        chunk_size (int): the number of tetrahedra in each block. If None, arrays are
+            taken in a single block and `ImplicitTetrahedra` in blocks of its default
+            size.
+
+    Returns:
+        _ (generator): pairs of an array of tetrahedra and an array of their weights.
+    """
+
+    if isinstance(tetrahedra, ImplicitTetrahedra):
+        if chunk_size is None:
+            blocks = tetrahedra.chunks()
+        else:
+            blocks = tetrahedra.chunks(chunk_size)
+    elif hasattr(tetrahedra, "__len__"):
+        if chunk_size is None:
+            chunk_size = max(len(tetrahedra), 1)
+        blocks = (tetrahedra[i:i + chunk_size]
+                  for i in range(0, len(tetrahedra), chunk_size))
+    else:
+        blocks = tetrahedra
+
+    start = 0
+    for block in blocks:
+        block = np.asarray(block, dtype=int)
+        yield block, np.asarray(weights[start:start + len(block)], dtype=float)
+        start += len(block)
+
+
+def _tetrahedra_energies(energies, tetrahedra, nbands):
+    """Find the energies at the vertices of tetrahedra.
+
+    Args:
+        energies (numpy.ndarray): the band energies at the grid points. It may be
+            memory-mapped, in which case only the rows of the vertices are read.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
+        nbands (int): the number of bands to include.
+
+    Returns:
+        _ (numpy.ndarray): the energies with shape (number of tetrahedra, number of
+            bands, 4), sorted for each band.
+    """
+
+    return np.sort(np.swapaxes(np.asarray(energies[tetrahedra])[..., :nbands], 1, 2),
+                   axis=-1)
+
+
+def _compensated_add(total, compensation, values):
+    """Add to a running sum with Neumaier's compensated summation.
+
+    Args:
+        total (float or numpy.ndarray): the running sum.
+        compensation (float or numpy.ndarray): the accumulated rounding error.
+        values (float or numpy.ndarray): the values being added.
+
+    Returns:
+        total (float or numpy.ndarray): the new running sum.
+        compensation (float or numpy.ndarray): the new accumulated rounding error.
+    """
+
+    new_total = total + values
+    compensation = compensation + np.where(np.abs(total) >= np.abs(values),
+                                           (total - new_total) + values,
+                                           (values - new_total) + total)
+    return new_total, compensation
+
+
+def _tetrahedron_sums(block_sums, energies, blocks, nbands, args):
+    """Add up a quantity over blocks of tetrahedra with compensated summation.
+
+    Args:
+        block_sums (function): a function of the sorted energies at the corners of a
+            block of tetrahedra, their weights, and `args` that gives the sum of the
+            quantity over the block.
+        energies (numpy.ndarray): the band energies at the grid points.
+        blocks (generator): pairs of arrays of tetrahedra and weights from
+            `tetrahedron_chunks`.
+        nbands (int): the number of bands to include.
+        args (tuple): the other arguments of `block_sums`.
+
+    Returns:
+        _ (float or numpy.ndarray): the sum of the quantity over all the blocks.
+    """
+
+    total, compensation = 0., 0.
+    for tet_block, weight_block in blocks:
+        tet_energies = _tetrahedra_energies(energies, tet_block, nbands)
+        total, compensation = _compensated_add(
+            total, compensation, block_sums(tet_energies, weight_block, *args))
+    return total + compensation
+
+
+def _share_array(array):
+    """Copy an array into shared memory.
+
+    Args:
+        array (numpy.ndarray): the array, which may be memory-mapped.
+
+    Returns:
+        shm (multiprocessing.shared_memory.SharedMemory): the shared memory block.
+            It must be closed and unlinked once it is no longer needed.
+        spec (tuple): the name, shape and type of the array, from which
+            `_attach_array` finds it again in another process.
+    """
+
+    array = np.asarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_array(spec):
+    """Attach to an array made by `_share_array`.
+
+    Args:
+        spec (tuple): the name, shape and type of the array.
+
+    Returns:
+        shm (multiprocessing.shared_memory.SharedMemory): the shared memory block,
+            which must be closed when the array is no longer needed.
+        array (numpy.ndarray): the array, without a copy.
+    """
+
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+
+def _tetrahedron_worker(task):
+    """Add up a quantity over a contiguous range of tetrahedra in a worker process.
+
+    Args:
+        task (tuple): the function that sums each block, the specifications of the
+            shared energies, tetrahedra and weights, the first and one past the last
+            tetrahedron of the range, the number of bands, the other arguments of the
+            function, and the number of tetrahedra in each block. Implicit tetrahedra
+            are passed as they are instead of a specification.
+
+    Returns:
+        _ (float or numpy.ndarray): the sum over the range.
+    """
+
+    (block_sums, energies_spec, tetrahedra_spec, weights_spec, start, stop, nbands,
+     args, chunk_size) = task
+
+    shms = []
+    try:
+        shm, energies = _attach_array(energies_spec)
+        shms.append(shm)
+        shm, weights = _attach_array(weights_spec)
+        shms.append(shm)
+        if isinstance(tetrahedra_spec, ImplicitTetrahedra):
+            tetrahedra = tetrahedra_spec
+            chunk_size = chunk_size or 2**16
+        else:
+            shm, tetrahedra = _attach_array(tetrahedra_spec)
+            shms.append(shm)
+            chunk_size = chunk_size or max(stop - start, 1)
+
+        blocks = (tetrahedra[i:min(i + chunk_size, stop)]
+                  for i in range(start, stop, chunk_size))
+        total = _tetrahedron_sums(block_sums, energies,
+                                  tetrahedron_chunks(blocks, weights[start:stop]),
+                                  nbands, args)
+
+        # Copy the result so nothing refers to the shared memory once it is closed.
+        return np.array(total)
+    finally:
+        # The shared memory can only be closed once no arrays refer to it.
+        energies = weights = tetrahedra = blocks = None
+        for shm in shms:
+            shm.close()
+
+
+class _TetrahedronPool(object):
+    """A pool of processes that add up quantities over tetrahedra. The energies,
+    tetrahedra and weights are placed in shared memory once, so they and the
+    processes are reused by every sum, such as the passes of `find_fermi_level`.
+    Each process is given a contiguous range of tetrahedra. The sums of the ranges
+    are added in order, so the result doesn't depend on how the processes are
+    scheduled. It should be closed, or used in a `with` statement, to stop the
+    processes and free the shared memory.
+
+    Args:
+        energies (numpy.ndarray): the band energies at the grid points.
+        tetrahedra (numpy.ndarray or ImplicitTetrahedra): lists of tetrahedra vertices.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        nbands (int): the number of bands to include.
+        processes (int): the number of processes.
+        chunk_size (int): the number of tetrahedra each process handles at once.
+
+    Attributes:
+        nbands (int): the number of bands included.
+        chunk_size (int): the number of tetrahedra each process handles at once.
+        bounds (numpy.ndarray): the first tetrahedron of each range, followed by the
+            number of tetrahedra.
+        specs (tuple): the specifications of the shared energies, tetrahedra and
+            weights from `_share_array`. Implicit tetrahedra are kept as they are.
+        shms (list): the shared memory blocks.
+        pool (multiprocessing.pool.Pool): the pool of processes.
+    """
+
+    def __init__(self, energies, tetrahedra, weights, nbands, processes,
+                 chunk_size=None):
+        if not hasattr(tetrahedra, "__len__"):
+            msg = ("The tetrahedra must be an array or ImplicitTetrahedra to be split "
+                   "among processes.")
+            raise ValueError(msg)
+
+        self.nbands = nbands
+        self.chunk_size = chunk_size
+        self.bounds = np.linspace(0, len(tetrahedra), processes + 1).astype(int)
+        self.shms = []
+        self.pool = None
+        try:
+            shm, energies_spec = _share_array(np.asarray(energies)[:, :nbands])
+            self.shms.append(shm)
+            shm, weights_spec = _share_array(np.asarray(weights, dtype=float))
+            self.shms.append(shm)
+            if isinstance(tetrahedra, ImplicitTetrahedra):
+                tetrahedra_spec = tetrahedra
+            else:
+                shm, tetrahedra_spec = _share_array(tetrahedra)
+                self.shms.append(shm)
+            self.specs = (energies_spec, tetrahedra_spec, weights_spec)
+            self.pool = Pool(processes)
+        except BaseException:
+            self.close()
+            raise
+
+    def sums(self, block_sums, args):
+        """Add up a quantity over all the tetrahedra.
+
+        Args:
+            block_sums (function): the function that sums the quantity over a block of
+                tetrahedra, as in `_tetrahedron_sums`. It must be defined at the top
+                level of a module.
+            args (tuple): the other arguments of `block_sums`.
+
+        Returns:
+            _ (float or numpy.ndarray): the sum of the quantity over all the
+                tetrahedra.
+        """
+
+        energies_spec, tetrahedra_spec, weights_spec = self.specs
+        tasks = [(block_sums, energies_spec, tetrahedra_spec, weights_spec, start, stop,
+                  self.nbands, args, self.chunk_size)
+                 for start, stop in zip(self.bounds[:-1], self.bounds[1:])
+                 if stop > start]
+        partial_sums = self.pool.map(_tetrahedron_worker, tasks)
+
+        total, compensation = 0., 0.
+        for partial_sum in partial_sums:
+            total, compensation = _compensated_add(total, compensation, partial_sum)
+        return total + compensation
+
+    def close(self):
+        """Stop the processes and free the shared memory."""
+
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.shms = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parallel_tetrahedron_sums(block_sums, energies, tetrahedra, weights, nbands, args,
+                               processes, chunk_size=None):
+    """Add up a quantity over tetrahedra once with a `_TetrahedronPool`.
+
+    Args:
+        block_sums (function): the function that sums the quantity over a block of
+            tetrahedra, as in `_tetrahedron_sums`. It must be defined at the top level
+            of a module.
+        energies (numpy.ndarray): the band energies at the grid points.
+        tetrahedra (numpy.ndarray or ImplicitTetrahedra): lists of tetrahedra vertices.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        nbands (int): the number of bands to include.
+        args (tuple): the other arguments of `block_sums`.
+        processes (int): the number of processes.
+        chunk_size (int): the number of tetrahedra each process handles at once.
+
+    Returns:
+        _ (float or numpy.ndarray): the sum of the quantity over all the tetrahedra.
+    """
+
+    with _TetrahedronPool(energies, tetrahedra, weights, nbands, processes,
+                          chunk_size) as pool:
+        return pool.sums(block_sums, args)
+
+
+def _block_total_states(tet_energies, weights, VG, VT, energy):
+    """Find the number of states of a block of tetrahedra for `calc_total_states`."""
+
+    nos = number_of_states_array(VG, VT, tet_energies, energy)
+    return np.sum(weights[:, None]*nos)
+
+
+def _block_total_energy(tet_energies, weights, VT, fermi_level):
+    """Find the total energy of a block of tetrahedra for `calc_total_energy`. The
+    contributions of the block are added all at once to avoid numerical errors.
+    """
+
+    int_weights = integration_weights_array(VT, tet_energies, fermi_level)
+    block_energy = weights[:, None]*np.sum(int_weights*tet_energies, axis=-1)
+    return math.fsum(block_energy.flatten())
+
+
+def _block_dos_nos(tet_energies, weights, VG, VT, energy_list):
+    """Find the density of states and number of states of a block of tetrahedra for
+    `tet_dos_nos`, stacked in an array with shape (2, number of energies).
+    """
+
+    return np.array(dos_nos_array(VG, VT, tet_energies, weights, energy_list))
+
+
+def _block_states_dos(tet_energies, weights, VG, VT, energy):
+    """Find the number of states and density of states of a block of tetrahedra at
+    an energy for `find_fermi_level`, stacked in an array.
+    """
+
+    nos = number_of_states_array(VG, VT, tet_energies, energy)
+    dos = density_of_states_array(VG, VT, tet_energies, energy)
+    return np.array([np.sum(weights[:, None]*nos), np.sum(weights[:, None]*dos)])
+
+
+def calc_grid_energies(EPM, grid, nbands, tetrahedra=None):
+    """Evaluate the band energies at the points of a grid once, in a single batch.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+        grid (numpy.ndarray): a grid of points in 3D.
+        nbands (int): the number of bands to include in calculation.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices. If provided, only the
+            grid points that are vertices of the tetrahedra are evaluated.
+
+    Returns:
+        energies (numpy.ndarray): the band energies at the grid points with shape
+            (number of grid points, number of bands). The energies at grid points that
+            aren't evaluated are nan.
+    """
+
+    grid = np.reshape(np.asarray(grid, dtype=float), (-1, 3))
+
+    # Every point of the grid is a vertex of the implicit tetrahedra. The vertices of
+    # tetrahedra from a generator aren't known ahead of time.
+    if (tetrahedra is None or isinstance(tetrahedra, ImplicitTetrahedra) or
+        not hasattr(tetrahedra, "__len__")):
+        return np.asarray(EPM.eval_many(grid, nbands))
+
+    vertex_indices = np.unique(tetrahedra)
+    vertex_energies = np.asarray(EPM.eval_many(grid[vertex_indices], nbands))
+    energies = np.full((len(grid), np.shape(vertex_energies)[1]), np.nan)
+    energies[vertex_indices] = vertex_energies
+    return energies
+
+
+def calc_total_states(EPM, tetrahedra, weights, grid, energy, nbands, energies=None,
+                      chunk_size=None, processes=None):
     """Calculate the total number of filled states.
 
     Args:
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
-        tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices. See
+            `tetrahedron_chunks` for the other types accepted.
         grid (numpy.ndarray): a grid of points in 3D.
         weights (list or numpy.ndarray): a list of tetrahedron weights.
         energy (float): the energy at which the total number of states is being
             calculated.
         nbands (int): the number of bands to include in calculation.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`, which may be memory-mapped. If None, they are
+            evaluated.
+        chunk_size (int): the number of tetrahedra processed together. If None,
+            arrays of tetrahedra are processed all at once.
+        processes (int): the number of processes the tetrahedra are split among. If
+            None, they are processed in this process.
 
     Returns:
         total_states (float): the number of filled states.
@@ -559,198 +1566,445 @@ def calc_total_states(EPM, tetrahedra, weights, grid, energy, nbands):
     Vg = EPM.lattice.reciprocal_volume
     Vt = Vg/np.sum(weights)
 
-    total_states = 0.
-    for i,tet in enumerate(tetrahedra):
-        energies = []
-        for ind in tet:
-            energies.append(EPM.eval(grid[ind], nbands))
-        # Reshape energies so that the energies of each band are grouped
-        # together.
-        energies = np.transpose(energies)
-        for eband in energies:
-            total_states += (weights[i]*
-                             number_of_states(Vg, Vt, np.sort(eband), energy))
-    return total_states
-
-
-def calc_fermi_level(EPM, tetrahedra, weights, grid, tol=1e-6):
-    """Determine the Fermi level for a given pseudopotential using the
-    improved tetrahedron method.
+    if energies is None:
+        energies = calc_grid_energies(EPM, grid, nbands, tetrahedra)
+
+    args = (Vg, Vt, energy)
+    if processes is not None and processes > 1:
+        return float(_parallel_tetrahedron_sums(_block_total_states, energies,
+                                                tetrahedra, weights, nbands, args,
+                                                processes, chunk_size))
+    return float(_tetrahedron_sums(_block_total_states, energies,
+                                   tetrahedron_chunks(tetrahedra, weights, chunk_size),
+                                   nbands, args))
+
+
+def _point_weights(corner_weights, EPM, tetrahedra, weights, energies, e, nbands,
+                   chunk_size):
+    """Add the weights of the corners of the tetrahedra to the grid points at the
+    corners.
 
     Args:
+        corner_weights (function): `integration_weights_array` or
+            `delta_weights_array`.
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
         tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        energies (numpy.ndarray): the band energies at the grid points.
+        e (float or numpy.ndarray): the energy or energies passed to `corner_weights`.
+        nbands (int): the number of bands to include.
+        chunk_size (int): the number of tetrahedra processed together.
+
+    Returns:
+        point_weights (numpy.ndarray): the weights of the grid points with shape
+            (number of grid points, nbands) + numpy.shape(e).
+    """
+
+    VT = EPM.lattice.reciprocal_volume/np.sum(weights)
+    npts = len(energies)
+    if nbands is None:
+        nbands = np.shape(energies)[1]
+    nenergies = int(np.prod(np.shape(e)))
+    point_weights = np.zeros(npts*nbands*nenergies)
+
+    bands = np.arange(nbands)[:, None]
+    for tet_block, weight_block in tetrahedron_chunks(tetrahedra, weights, chunk_size):
+        # The energies at the corners with shape (number of tetrahedra, nbands, 4)
+        # and the grid points at the sorted corners.
+        tet_energies = np.swapaxes(np.asarray(energies[tet_block])[..., :nbands], 1, 2)
+        order = np.argsort(tet_energies, axis=-1)
+        tet_energies = np.take_along_axis(tet_energies, order, axis=-1)
+        corners = np.take_along_axis(
+            np.broadcast_to(tet_block[:, None, :], np.shape(order)), order, axis=-1)
+
+        block_weights = np.reshape(corner_weights(VT, tet_energies, e),
+                                   (len(tet_block), nbands, nenergies, 4))
+        block_weights = block_weights*weight_block[:, None, None, None]
+        index = ((corners[:, :, None, :]*nbands + bands[None, :, None])*nenergies +
+                 np.arange(nenergies)[None, None, :, None])
+        # Only the entries of the grid points of the block are added to, so the
+        # cost of a block doesn't grow with the grid.
+        np.add.at(point_weights, index.ravel(), block_weights.ravel())
+
+    return np.reshape(point_weights, (npts, nbands) + np.shape(e))
+
+
+def occupation_point_weights(EPM, tetrahedra, weights, energies, fermi_level=None,
+                             nbands=None, chunk_size=None):
+    """Find the weights of the grid points for integrals over the occupied states,
+    the integral of f(k) theta(E_F - E(k)). Once found, they can integrate any
+    quantity known at the grid points with `integrate_point_weights`.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices. See
+            `tetrahedron_chunks` for the other types accepted.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`.
+        fermi_level (float): the Fermi level. If None, the Fermi level of the
+            pseudopotential is used.
+        nbands (int): the number of bands to include. If None, all the bands of
+            `energies` are included.
+        chunk_size (int): the number of tetrahedra processed together.
+
+    Returns:
+        point_weights (numpy.ndarray): the weights with shape (number of grid points,
+            number of bands). They are normalized like `calc_total_energy`, which is
+            the integral of the band energies.
+    """
+
+    if fermi_level is None:
+        fermi_level = EPM.fermi_level
+    return _point_weights(integration_weights_array, EPM, tetrahedra, weights, energies,
+                          fermi_level, nbands, chunk_size)
+
+
+def delta_point_weights(EPM, tetrahedra, weights, energies, energy_list, nbands=None,
+                        chunk_size=None):
+    """Find the weights of the grid points for integrals over surfaces of constant
+    energy, the integral of f(k) delta(E - E(k)). They are the derivatives of the
+    weights from `occupation_point_weights` with respect to the Fermi level.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices. See
+            `tetrahedron_chunks` for the other types accepted.
+        weights (list or numpy.ndarray): a list of tetrahedron weights.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`.
+        energy_list (float or numpy.ndarray): the energy or energies E.
+        nbands (int): the number of bands to include. If None, all the bands of
+            `energies` are included.
+        chunk_size (int): the number of tetrahedra processed together.
+
+    Returns:
+        point_weights (numpy.ndarray): the weights with shape (number of grid points,
+            number of bands) + numpy.shape(energy_list).
+    """
+
+    return _point_weights(delta_weights_array, EPM, tetrahedra, weights, energies,
+                          energy_list, nbands, chunk_size)
+
+
+def integrate_point_weights(point_weights, values):
+    """Integrate a quantity with the weights of the grid points.
+
+    Args:
+        point_weights (numpy.ndarray): the weights from `occupation_point_weights` or
+            `delta_point_weights`.
+        values (numpy.ndarray): the values of the quantity at the grid points for
+            each band, with shape (number of grid points, number of bands) followed by
+            the shape of the quantity, such as (3,) for a velocity.
+
+    Returns:
+        _ (float or numpy.ndarray): the integral. Its shape is the shape of the
+            energies of `delta_point_weights`, if any, followed by the shape of the
+            quantity.
+    """
+
+    values = np.asarray(values)
+    nbands = np.shape(point_weights)[1]
+    return np.tensordot(point_weights, values[:, :nbands], axes=([0, 1], [0, 1]))
+
+
+def calc_fermi_level(EPM, tetrahedra, weights, grid, tol=1e-6, energies=None,
+                     chunk_size=None, processes=None):
+    """Determine the Fermi level for a given pseudopotential using the
+    improved tetrahedron method. The Fermi level is found with the safeguarded
+    Newton's method of `find_fermi_level`.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices, or
+            `ImplicitTetrahedra`.
         weights (list or numpy.ndarray): a list of tetrahedron weights. These
             should all be one if the tetrahedra are not symmetry reduced.
         grid (numpy.ndarray): an array of grid of points in 3D.
         tol (float): the tolerance on the error of the total number of states
             calculation.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`, which may be memory-mapped. If None, they are
+            evaluated.
+        chunk_size (int): the number of tetrahedra processed together. If None,
+            arrays of tetrahedra are processed all at once.
+        processes (int): the number of processes the tetrahedra are split among. If
+            None, they are processed in this process.
 
     Returns:
         fermi_level (float): the calculated fermi level to within the provided tolerance
             on the total number of states.
     """
 
-    # Gives the sign of a number (+/-) unless it is zero, in which case it
-    # returns zero.
-    #sign = lambda x: x and (1, -1)[x<0]
-    sign = np.sign
+    return find_fermi_level(EPM, tetrahedra, weights, grid, tol, energies,
+                            chunk_size=chunk_size, processes=processes)[0]
 
-    # number of filled states
-    nfs = EPM.nvalence_electrons# /2.
-    # highest filled band
-    hfb = int(np.ceil(nfs))
 
+def find_fermi_level(EPM, tetrahedra, weights, grid, tol=1e-6, energies=None,
+                     maxiter=100, chunk_size=None, processes=None):
+    """Determine the Fermi level with the improved tetrahedron method by finding the
+    root of the number of states with a safeguarded Newton's method. The density of
+    states of the tetrahedra is the exact derivative of their number of states, so
+    the Fermi level is usually found in a handful of passes over the tetrahedra.
+    Each pass streams over the tetrahedra like `calc_total_states`.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices, or
+            `ImplicitTetrahedra`. A generator of tetrahedra can only be passed over
+            once, so it isn't accepted.
+        weights (list or numpy.ndarray): a list of tetrahedron weights. These
+            should all be one if the tetrahedra are not symmetry reduced.
+        grid (numpy.ndarray): an array of grid of points in 3D.
+        tol (float): the tolerance on the error of the total number of states
+            calculation.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`, which may be memory-mapped. If None, they are
+            evaluated.
+        maxiter (int): the maximum number of passes over the tetrahedra.
+        chunk_size (int): the number of tetrahedra processed together. If None,
+            arrays of tetrahedra are processed all at once.
+        processes (int): the number of processes the tetrahedra are split among. If
+            None, they are processed in this process.
+
+    Returns:
+        fermi_level (float): the calculated fermi level to within the provided tolerance
+            on the total number of states.
+        npasses (int): the number of times the number of states and density of
+            states of all the tetrahedra were calculated.
+    """
+
+    # number of filled states
+    nfs = EPM.nvalence_electrons
     # number of bands included in the calculation
-    nbands = hfb + 1
+    nbands = int(np.ceil(nfs)) + 1
 
-    # Make a guess at where the Fermi level could be.
-    if hfb <= 2:
-        # If there is only one filled band, have the guess be the energy value
-        # at the origin of the highest filled band.
-        fermi_level = EPM.eval([0.]*3, nbands)[hfb-1]
-    else:
-        # If there are many occupied bands, take an average of the energies
-        # of the band above and the band below.
-        fermi_level = (EPM.eval([0.]*3, nbands)[hfb] -
-                             EPM.eval([0.]*3, nbands)[hfb-2])/2
-
-    # Calculate the number of occupied states at the estimated Fermi level.
-    total_states = calc_total_states(EPM, tetrahedra, weights, grid,
-                                     fermi_level, nbands)
-
-    # Determine whether the initial guess overestimated (+) or underestimated
-    # the Fermi level.
-    initial_sign = sign(total_states - nfs)
-
-    # We first need to find a window in which the Fermi level resides.
-    # We know the upper/lower bound. Now we need to find the lower/upper bound
-    # on the Fermi level. After this is obtained, we can perform a binary search
-    # for the Fermi level on the obtained energy interval.
-    # We do this by increasing or decreasing the estimated fermi level by the relatively
-    # large energy step of 8 eV until we have too many or not enough filled states.
-
-    # We know that we have a range of energies between in which the Fermi level is
-    # located once we go from overestimating to underestimating the Fermi level.
-    while sign(total_states - nfs) == initial_sign:
-        fermi_level = fermi_level + (
-                            sign(EPM.nvalence_electrons - total_states))*8
-        total_states = calc_total_states(EPM, tetrahedra, weights, grid,
-                                         fermi_level, nbands)
-
-    # Adjust the bounds correctly. If overestimating, decrease the lower bound. If
-    # underestimating, increase the upperbound. The Fermi level guess is the midpoint of
-    # the upper and lower bound.
-    if total_states > nfs:
-        lower_bound = fermi_level - 8
-        upper_bound = fermi_level
-        fermi_level -= (upper_bound - lower_bound)/2
+    fraction = nfs/(2.*nbands)
+    if fraction > 1:
+        msg = "The bands included can't hold {} electrons."
+        raise ValueError(msg.format(nfs))
+
+    if not hasattr(tetrahedra, "__len__"):
+        msg = ("The tetrahedra must be an array or ImplicitTetrahedra since they are "
+               "passed over more than once.")
+        raise ValueError(msg)
+
+    if energies is None:
+        energies = calc_grid_energies(EPM, grid, nbands, tetrahedra)
+
+    Vg = EPM.lattice.reciprocal_volume
+    Vt = Vg/np.sum(weights)
+
+    # The Fermi level is between the lowest and highest energies. Start from the
+    # energy below which the fraction of the band energies is the fraction of the
+    # states that are filled. Grid points that aren't vertices have nan energies.
+    band_energies = np.asarray(energies)[:, :nbands]
+    lower_bound = np.nanmin(band_energies)
+    upper_bound = np.nanmax(band_energies)
+    fermi_level = np.nanquantile(band_energies, fraction)
+    band_energies = None
+
+    # The processes and the shared energies are made once and used by every pass.
+    if processes is not None and processes > 1:
+        pool = _TetrahedronPool(energies, tetrahedra, weights, nbands, processes,
+                                chunk_size)
     else:
-        lower_bound = fermi_level
-        upper_bound = fermi_level + 8
-        fermi_level += (upper_bound - lower_bound)/2
-
-    # Now that we have an energy interval that contains the Fermi level, we can perform
-    # a binary search within this interval until the Fermi level provides the correct
-    # number of occupied states to within the provided tolerance.
-    while abs(total_states - nfs) > tol:
-        total_states = calc_total_states(EPM, tetrahedra, weights, grid,
-                                         fermi_level, nbands)
-        if total_states > nfs:
-            upper_bound = fermi_level
-            fermi_level -= (upper_bound - lower_bound)/2.
+        pool = None
+
+    def states(energy):
+        """The error in the total number of states and its derivative."""
+        args = (Vg, Vt, energy)
+        if pool is not None:
+            nos, dos = pool.sums(_block_states_dos, args)
         else:
-            lower_bound = fermi_level
-            fermi_level += (upper_bound - lower_bound)/2.
+            nos, dos = _tetrahedron_sums(_block_states_dos, energies,
+                                         tetrahedron_chunks(tetrahedra, weights,
+                                                            chunk_size),
+                                         nbands, args)
+        return nos - nfs, dos
+
+    try:
+        for npasses in range(1, maxiter + 1):
+            error, dos = states(fermi_level)
+            if abs(error) <= tol:
+                return float(fermi_level), npasses
+            if error > 0:
+                upper_bound = fermi_level
+            else:
+                lower_bound = fermi_level
+
+            # Take a Newton step when it stays within the bounds and bisect otherwise.
+            if dos > 0:
+                step = fermi_level - error/dos
+            else:
+                step = np.nan
+            if lower_bound < step < upper_bound:
+                fermi_level = step
+            else:
+                fermi_level = (lower_bound + upper_bound)/2.
+
+            if abs((upper_bound - lower_bound)/2.) < 1e-15:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+
+    msg = ("Unable to determine Fermi level. Suggest using more k-points.")
+    raise ValueError(msg.format(tol))
+
+
+def _snap_coordinates(values, centers, tol):
+    """Find the index of the cluster center each coordinate lies on.
 
-        if abs((upper_bound-lower_bound)/2.) < 1e-15:
-            msg = ("Unable to determine Fermi level. Suggest using more k-points.")
-            raise ValueError(msg.format(tol))
+    Args:
+        values (numpy.ndarray): coordinates along one axis.
+        centers (numpy.ndarray): the sorted cluster centers along the same axis.
+        tol (float): the largest allowed distance between a coordinate and its center.
+
+    Returns:
+        indices (numpy.ndarray): the index of the nearest center, or -1 if no center
+            lies within the tolerance.
+    """
+
+    right = np.clip(np.searchsorted(centers, values), 1, len(centers) - 1)
+    left = right - 1
+    if len(centers) == 1:
+        right = left = np.zeros(np.shape(values), dtype=int)
+    nearest = np.where(np.abs(values - centers[left]) <= np.abs(centers[right] - values),
+                       left, right)
+    return np.where(np.abs(values - centers[nearest]) <= tol, nearest, -1)
 
-    return fermi_level
+
+def grid_orbit_representatives(EPM, grid, duplicates=True, rtol=1e-5, atol=1e-8):
+    """Find the grid point that represents the symmetry orbit of each grid point.
+
+    The grid is brought into the first unit cell and labeled with integer coordinates
+    along each reciprocal lattice vector. The space group operators, converted to
+    reciprocal lattice coordinates, are applied to every point at once and the images
+    are looked up through the integer labels. Images that don't land on the grid are
+    ignored.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+        grid (numpy.ndarray): a grid of points in Cartesian coordinates.
+        duplicates (bool): if true, each orbit is represented by the point with the
+            smallest index. Otherwise it is represented by the point that appears last
+            in the grid.
+        rtol (float): relative tolerance for comparing points.
+        atol (float): absolute tolerance for comparing points.
+
+    Returns:
+        representatives (numpy.ndarray): the index of the representative grid point of
+            each grid point.
+    """
+
+    rlat_vecs = EPM.lattice.reciprocal_vectors
+    tol = atol + rtol
+    grid_lat = bring_into_cell(grid, rlat_vecs, rtol=rtol, atol=atol, coords="lat")
+    npts = len(grid_lat)
+
+    # Label the points with integer coordinates.
+    centers = []
+    labels = np.empty((npts, 3), dtype=int)
+    for i in range(3):
+        values = np.sort(grid_lat[:, i])
+        centers.append(values[np.append(True, np.diff(values) > tol)])
+        labels[:, i] = _snap_coordinates(grid_lat[:, i], centers[i], tol)
+    shape = tuple(len(c) for c in centers)
+    keys = np.ravel_multi_index(labels.T, shape)
+
+    # For each label find the first and last grid point that has it.
+    first = np.full(np.prod(shape), -1, dtype=int)
+    first[keys[::-1]] = np.arange(npts)[::-1]
+    last = np.full(np.prod(shape), -1, dtype=int)
+    last[keys] = np.arange(npts)
+
+    # The space group operators in reciprocal lattice coordinates.
+    pointgroup, translations = get_space_group(EPM.lattice.vectors, EPM.atom_labels,
+                                               EPM.atom_positions, coords="Cart")
+    pointgroup = np.unique(np.round(pointgroup, 12), axis=0)
+    pointgroup = np.round(np.matmul(np.matmul(inv(rlat_vecs), pointgroup), rlat_vecs))
+
+    # Each grid point belongs to the orbit of its images that lie on the grid. The
+    # orbit is represented by the point with the smallest index, or the point that
+    # appears last in the grid when duplicates are not included.
+    if duplicates:
+        best = first[keys].copy()
+    else:
+        best = last[keys].copy()
+    for op in pointgroup:
+        images = np.dot(grid_lat, op.T) % 1
+        images[np.isclose(images, 1, rtol=rtol, atol=atol)] = 0
+        image_labels = np.array([_snap_coordinates(images[:, i], centers[i], tol)
+                                 for i in range(3)])
+        on_grid = np.all(image_labels >= 0, axis=0)
+        image_keys = np.ravel_multi_index(np.where(on_grid, image_labels, 0), shape)
+        if duplicates:
+            candidates = np.where(on_grid, first[image_keys], npts)
+            candidates[candidates < 0] = npts
+            best = np.minimum(best, candidates)
+        else:
+            best = np.maximum(best, np.where(on_grid, last[image_keys], -1))
+
+    # Points with the same coordinates are represented by the first of them.
+    return first[keys[best]]
 
 
 def find_irreducible_tetrahedra(EPM, tetrahedra, grid, duplicates=True, rtol=1e-5,
                                 atol=1e-8):
     """Find the irreducible tetrahedra and their weights.
 
+    Each vertex is replaced by the representative of its orbit and the vertices of
+    each tetrahedron are sorted so that equivalent tetrahedra have identical rows.
+
     Args:
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
         tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
         grid (numpy.ndarray): a grid of points in Cartesian coordinates.
+        duplicates (bool): see :py:func:`grid_orbit_representatives`.
+        rtol (float): relative tolerance for comparing points.
+        atol (float): absolute tolerance for comparing points.
+
     Returns:
-        irreducible_tetrahedra (list): a list of irreducible tetrahedra vertices.
-        weights (list): a list of tetrahedron weights.
+        irreducible_tetrahedra (numpy.ndarray): the irreducible tetrahedra vertices in
+            the order they first appear.
+        weights (numpy.ndarray): the number of tetrahedra equivalent to each irreducible
+            tetrahedron.
     """
 
-    if duplicates:
-        orbits, weights = get_orbits(grid, EPM.lattice.vectors,
-                                     EPM.lattice.reciprocal_vectors,
-                                     EPM.atom_labels, EPM.atom_positions, duplicates=True)
-    else:
-        orbits, weights = get_orbits(grid, EPM.lattice.vectors,
-                                     EPM.lattice.reciprocal_vectors,
-                                     EPM.atom_labels, EPM.atom_positions)
-
-    # Move all grid points into the first unit cell
-    grid = bring_into_cell(grid, EPM.lattice.reciprocal_vectors, rtol=rtol, atol=atol)
-    # grid = [bring_into_cell(pt, EPM.lattice.reciprocal_vectors) for pt in grid]
-
-    # Each point in the grid is part of an orbit. The first point in each orbit
-    # represents the orbit. The dictionary new_dict is a dictionary with keys as
-    # the indices of all the grid points and values the index of the point that
-    # represents its orbit.
-    new_dict = {}
-    for i,pt in enumerate(grid):
-        # pt = bring_into_cell(pt, EPM.lattice.reciprocal_vectors)
-        new_dict[i] = None
-        # for k in orbits.keys():
-        for k in range(len(orbits)):
-            # Represntative k-point
-            rpt = orbits[k][0]
-            index = np.where([np.allclose(p, rpt, rtol=rtol, atol=atol)
-                              for p in grid])[0][0]
-            for v in orbits[k]:
-                if np.allclose(v,pt):
-                    # index = np.where([np.allclose(p,v) for p in grid])[0][0]
-                    new_dict[i] = index
-
-    tetrahedra_copy = deepcopy(tetrahedra)
-    weights = []
-    irreducible_tetrahedra = []
-    for i,tet in enumerate(tetrahedra_copy):
-        for j,ind in enumerate(tet):
-            # Replace each index in tetrahedra with the one that represents its orbit.
-            tetrahedra_copy[i][j] = new_dict[ind]
-
-        # Sort the indices so they can be easily compared.
-        tetrahedra_copy[i] = np.sort(tetrahedra_copy[i])
-        # If the tetrahedra being considered is already apart of the list of
-        # irreducible tetrahedra, add 1 to its weight.
-        if any([np.allclose(tetrahedra_copy[i],tet) for tet in
-                irreducible_tetrahedra]):
-            loc = np.where([np.allclose(tetrahedra_copy[i],tet) for tet in
-                            irreducible_tetrahedra])[0][0]
-            weights[loc] += 1.
-            continue
-        # If not add it to the list and give it weight 1.
-        else:
-            irreducible_tetrahedra.append(tetrahedra_copy[i])
-            weights.append(1.)
+    representatives = grid_orbit_representatives(EPM, grid, duplicates=duplicates,
+                                                 rtol=rtol, atol=atol)
+    reduced = np.sort(representatives[np.asarray(tetrahedra, dtype=int)], axis=1)
+    irreducible_tetrahedra, first, weights = np.unique(reduced, axis=0, return_index=True,
+                                                       return_counts=True)
+    order = np.argsort(first)
 
-    return irreducible_tetrahedra, weights
+    return irreducible_tetrahedra[order], weights[order].astype(float)
 
 
-def calc_total_energy(EPM, tetrahedra, weights, grid):
+def calc_total_energy(EPM, tetrahedra, weights, grid, energies=None, chunk_size=None,
+                      processes=None):
     """Calculate the total energy.
 
     Args:
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
-        tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        tetrahedra (numpy.ndarray): lists of tetrahedra vertices. See
+            `tetrahedron_chunks` for the other types accepted.
         weights (list or numpy.ndarray): a list of tetrahedron weights.
         grid (numpy.ndarray): a grid of points in 3D.
-        fermi_level (float): the energy at which the total energy is being
-            calculated.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`, which may be memory-mapped. If None, they are
+            evaluated.
+        chunk_size (int): the number of tetrahedra processed together. If None,
+            arrays of tetrahedra are processed all at once.
+        processes (int): the number of processes the tetrahedra are split among. If
+            None, they are processed in this process.
 
     Returns:
         total_states (float): the number of filled states.
@@ -763,28 +2017,49 @@ def calc_total_energy(EPM, tetrahedra, weights, grid):
     # The number of bands included in the calculation of the total energy.
     nbands = int(np.ceil(EPM.nvalence_electrons/2))
 
-    # Each contribution to the total energy will be stored in a list. The sum of these
-    # contributions will be taken all at once to avoid numerical errors.
-    total_energy = []
-    for i,irr_tet in enumerate(tetrahedra):
-        # Store the energies at the vertices of a tetrahedra in energies. Since the
-        # function can be multivalued, this is a list of lists.
-        energies = []
-        for ind in irr_tet:
-            energies.append(EPM.eval(grid[ind], nbands))
+    if energies is None:
+        energies = calc_grid_energies(EPM, grid, nbands, tetrahedra)
+
+    # The sum of the contributions to the total energy of each block is taken all at
+    # once to avoid numerical errors, and the blocks are added with compensation.
+    args = (VT, EPM.fermi_level)
+    if processes is not None and processes > 1:
+        return float(_parallel_tetrahedron_sums(_block_total_energy, energies,
+                                                tetrahedra, weights, nbands, args,
+                                                processes, chunk_size))
+    return float(_tetrahedron_sums(_block_total_energy, energies,
+                                   tetrahedron_chunks(tetrahedra, weights, chunk_size),
+                                   nbands, args))
+
+
+def _extended_indices(ndiv0):
+    """Number the points of the extended grid of `get_extended_tetrahedra`.
+
+    Args:
+        ndiv0 (numpy.ndarray): the number of divisions along each reciprocal lattice
+            vector.
+
+    Returns:
+        extended_indices (numpy.ndarray): the indices of the points of the extended
+            grid in a 3D array. The points inside the extended grid are numbered as
+            the points of the grid and those on the boundary are numbered after them.
+    """
 
-        # Transpose the energies so that the energies of each band are group together.
-        energies = np.transpose(energies)
-        for eband in energies:
-            eband = np.sort(eband)
-            int_weights = integration_weights(VT, eband, EPM.fermi_level)
-            total_energy.append(weights[i]*np.dot(int_weights, eband))
+    ndiv1 = ndiv0 + 1
+    ndiv2 = ndiv0 + 2
+    ndiv3 = ndiv0 + 3
+    npts = np.prod(ndiv1)
 
-    return math.fsum(total_energy)
+    k, j, i = np.indices(ndiv3)
+    inside = ((i > 0) & (i < ndiv2[0]) & (j > 0) & (j < ndiv2[1]) &
+              (k > 0) & (k < ndiv2[2]))
+    return np.where(inside,
+                    (i-1) + (j-1)*ndiv1[1] + (k-1)*ndiv1[0]*ndiv1[1],
+                    i + j*ndiv3[1] + k*ndiv3[0]*ndiv3[1] + npts)
 
 
 def get_extended_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0],
-                            grid_shift=[0,0,0]):
+                            grid_shift=[0,0,0], periodic=False):
     """Generate the grid and tetrahedra required in calculating Blochl's
     corrections.
 
@@ -796,110 +2071,247 @@ def get_extended_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0],
             fractions of the reciprocal lattice vectors.
         grid_shift (list of numpy.ndarray): the offset of the lattice in
             fractions of the submesh translations.
+        periodic (bool): if true, the indices wrap around the grid, so the points
+            around it aren't added and the energy at each point is only evaluated
+            once. The band energies must be periodic in the reciprocal lattice.
 
     Returns:
-        grid (numpy.ndarray): the extended grid in Cartesian coordinates.
+        grid (numpy.ndarray): the extended grid in Cartesian coordinates. If
+            `periodic`, it is the grid of `get_grid_tetrahedra`.
         tetrahedra (numpy.ndarray): lists of grid point indices that indicate
-            the vertices of the extended tetrahedra.
+            the vertices of the extended tetrahedra. If `periodic`, they are the
+            tetrahedra of `get_grid_tetrahedra`, which surround every point once the
+            indices wrap around the grid.
     """
 
+    if periodic:
+        return get_grid_tetrahedra(EPM, ndivisions, lat_shift, grid_shift)
+
     grid_shift = np.array(grid_shift)
 
     if type(ndivisions) == int:
         ndivisions = [ndivisions, ndivisions, ndivisions]
     ndiv0 = np.array(ndivisions)
-    ndiv1 = ndiv0 + 1
-    ndiv2 = ndiv0 + 2
     ndiv3 = ndiv0 + 3
-    npts = np.prod(ndiv1)
-    offset = np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
-        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
-    grid = np.empty(ndiv1, dtype=list)
-    indices = np.empty(ndiv1, dtype=int)
-
-    for k,j,i in product(range(ndiv1[0]), range(ndiv1[1]), range(ndiv1[2])):
-        index = int(i + ndiv1[2]*(j + ndiv1[1]*k))
-        grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                             np.array([i,j,k], dtype=float)/ndiv0) + offset
-        indices[k,j,i] = index
-
-
-    extended_indices = np.empty(np.array(ndiv3), dtype=int)
-    for k,j,i in product(range(ndiv3[0]), range(ndiv3[1]), range(ndiv3[2])):
-        if ((i > 0 and i < ndiv2[0]) and (j > 0 and j < ndiv2[1]) and
-            (k > 0 and k < ndiv2[2])):
-            extended_indices[k,j,i] = (i-1) + (j-1)*ndiv1[1] + (k-1)*ndiv1[0]*ndiv1[1]
-        else:
-            extended_indices[k,j,i] = i + j*ndiv3[1] + k*ndiv3[0]*ndiv3[1] + npts
-
-    grid_shift += 1
-    offset = np.dot(EPM.lattice.reciprocal_vectors, lat_shift) - (
-        np.dot(EPM.lattice.reciprocal_vectors, grid_shift)/ndivisions)
-
-    extended_grid = np.empty(ndiv3, dtype=list)
-    for k,j,i in product(range(ndiv3[0]), range(ndiv3[1]), range(ndiv3[2])):
-        extended_grid[k,j,i] = np.dot(EPM.lattice.reciprocal_vectors,
-                                      np.array([i,j,k], dtype=float)/ndiv0) + offset
-
-    extended_tetrahedra = np.empty(np.prod(ndiv2)*6,dtype=list)
-    # for k,j,i in product(range(ndiv1[0]), range(ndiv1[1]), range(ndiv1[2])):
-    for k,j,i in product(range(ndiv2[0]), range(ndiv2[1]), range(ndiv2[2])):
-        submesh = np.empty([8], dtype=list)
-        submesh_indices = np.empty([8], dtype=int)
-        for kk,kj,ki in product(range(2),repeat=3):
-            submesh[ki + 2*(kj + 2*kk)] = extended_grid[k + kk, j + kj, i + ki]
-            submesh_indices[ki + 2*(kj + 2*kk)] = extended_indices[k + kk, j + kj, i + ki]
-        # Find the tetrahedra with indexing 1-8.
-        sub_tetrahedra = find_tetrahedra(submesh)
-
-        # Replace 1-8 indices with sub_mesh indices.
-        for m in range(6):
-            # The index of the submeshcell
-            # ti = m + 6*(i + ndiv1[2]*(j + ndiv1[1]*k))
-            ti = m + 6*(i + ndiv2[2]*(j + ndiv2[1]*k))
-            extended_tetrahedra[ti] = [0]*4
-
-            for n in range(4):
-                extended_tetrahedra[ti][n] = submesh_indices[sub_tetrahedra[m][n]-1]
-
-    extended_tetrahedra = np.array([t for t in extended_tetrahedra])
-    extended_grid = np.array([g.tolist() for g in extended_grid.flatten()])
-
+    extended_indices = _extended_indices(ndiv0)
+
+    grid_shift = grid_shift + 1
+    offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+    extended_grid = _grid_points(EPM, ndiv0, ndiv3, offset)
+    cell_vertices = extended_grid[[np.ravel_multi_index([kk,kj,ki], ndiv3)
+                                   for kk,kj,ki in product(range(2), repeat=3)]]
+    extended_tetrahedra = _cell_tetrahedra(extended_indices, cell_vertices)
     return extended_grid, extended_tetrahedra
 
-
 def get_corrected_total_energy(EPM, tetrahedra_list, extended_tetrahedra_list, grid,
-                               extended_grid, ndiv0):
+                               extended_grid, ndiv0, periodic=False):
     """Calculate the corrected integration weights used in calculating the
     total energy.
 
     Args:
         EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
             tetrahedra (numpy.ndarray): lists of tetrahedra vertices.
         tetrahedra (list): a list of tetrahedra where each tetrahedra is a
             quadruple of integers.
         extended_tetrahedra_list (list): a list of tetrahedra that includes those
             that surround the
         grid (numpy.ndarray): a grid of points in 3D.
+        periodic (bool): if true, the tetrahedra and extended tetrahedra are those of
+            `get_extended_tetrahedra` with `periodic`, which both index the points of
+            `extended_grid`.
 
     Returns:
         total_states (float): the number of filled states.
     """
 
-    npts = len(grid)
     neigvals = int(np.ceil(EPM.nvalence_electrons/2.))
-    total_energy = 0.
-    for iband in range(neigvals):
-        for tet in tetrahedra_list:
-            energies, tweights = corrected_integration_weights(EPM,
-                                                extended_grid,
-                                                extended_tetrahedra_list,
-                                                tet, iband, ndiv0)
-            total_energy += np.dot(tweights, energies)
-    return total_energy
-
-
-def tet_dos_nos(EPM, nbands, grid, energy_list, tetrahedra, weights):
+
+    # Evaluate the energies on the extended grid once and find the corrected weights
+    # of all the tetrahedra and bands together.
+    energies = calc_grid_energies(EPM, extended_grid, neigvals)
+    tet_energies, weights = corrected_integration_weights_array(
+        EPM, tetrahedra_list, extended_tetrahedra_list, energies, ndiv0,
+        periodic=periodic)
+    return np.sum(weights*tet_energies)
+
+
+# The weights of the optimized tetrahedron method of Kawamura, Gohda and Tsuneyuki,
+# Phys. Rev. B 89, 094515 (2014). Row i gives the energy at corner i of a
+# tetrahedron fitted to the energies at the 20 points of its neighborhood, ordered as
+# in `get_optimized_tetrahedra`.
+OPTIMIZED_WEIGHTS = np.array(
+    [[1440, 0, 30, 0, -38, 7, 17, -28, -56, 9, -46, 9, -38, -28, 17, 7, -18, -18, 12,
+      -18],
+     [0, 1440, 0, 30, -28, -38, 7, 17, 9, -56, 9, -46, 7, -38, -28, 17, -18, -18, -18,
+      12],
+     [30, 0, 1440, 0, 17, -28, -38, 7, -46, 9, -56, 9, 17, 7, -38, -28, 12, -18, -18,
+      -18],
+     [0, 30, 0, 1440, 7, 17, -28, -38, 9, -46, 9, -56, -28, 17, 7, -38, -18, 12, -18,
+      -18]])/1260.
+
+
+def _optimized_offsets(cell_vertices):
+    """Find the points around the tetrahedra of a cell that are used to fit the band
+    energies in the optimized tetrahedron method.
+
+    The corners of each tetrahedron are ordered k1, k2, k3, k4 along a path from one
+    end of the shortest diagonal to the other. The other 16 points are 2k1 - k2,
+    2k2 - k3, 2k3 - k4, 2k4 - k1, 2k1 - k3, 2k2 - k4, 2k3 - k1, 2k4 - k2, 2k1 - k4,
+    2k2 - k1, 2k3 - k2, 2k4 - k3, k4 - k1 + k2, k1 - k2 + k3, k2 - k3 + k4 and
+    k3 - k4 + k1.
+
+    Args:
+        cell_vertices (numpy.ndarray): the vertices of the first cell of the grid in
+            the order used by `find_tetrahedra`.
+
+    Returns:
+        offsets (numpy.ndarray): the displacements of the 20 points from the origin
+            of the cell in grid coordinates [kk,kj,ki], with shape (6, 20, 3) and the
+            tetrahedra ordered as in `_cell_tetrahedra`.
+    """
+
+    # The corner ki + 2*(kj + 2*kk) of a cell is displaced by [kk,kj,ki].
+    corners = np.array(list(product(range(2), repeat=3)))
+    sub_tetrahedra = np.array(find_tetrahedra(np.asarray(cell_vertices))) - 1
+
+    # The shortest diagonal is shared by all the tetrahedra. The corners are ordered
+    # by the number of steps along the edges from its first end.
+    start = min(set.intersection(*[set(tet) for tet in sub_tetrahedra.tolist()]))
+    steps = np.sum(corners[sub_tetrahedra] != corners[start], axis=-1)
+    path = np.take_along_axis(sub_tetrahedra, np.argsort(steps, axis=-1), axis=-1)
+    k1, k2, k3, k4 = np.moveaxis(corners[path], 1, 0)
+    return np.stack([k1, k2, k3, k4,
+                     2*k1 - k2, 2*k2 - k3, 2*k3 - k4, 2*k4 - k1,
+                     2*k1 - k3, 2*k2 - k4, 2*k3 - k1, 2*k4 - k2,
+                     2*k1 - k4, 2*k2 - k1, 2*k3 - k2, 2*k4 - k3,
+                     k4 - k1 + k2, k1 - k2 + k3, k2 - k3 + k4, k3 - k4 + k1], axis=1)
+
+
+def get_optimized_tetrahedra(EPM, ndivisions, lat_shift=[0,0,0], grid_shift=[0,0,0],
+                             periodic=False):
+    """Generate the extended grid and the neighborhoods of the tetrahedra for the
+    optimized tetrahedron method. The extended grid and its numbering are the same as
+    those of `get_extended_tetrahedra`.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object
+        ndivisions (list): a list of integers that represent the number of
+            divisions along each basis vector to take when creating the grid.
+        lat_shift (list or numpy.ndarray): a vector that shifts the grid in
+            fractions of the reciprocal lattice vectors.
+        grid_shift (list of numpy.ndarray): the offset of the lattice in
+            fractions of the submesh translations.
+        periodic (bool): if true, the indices wrap around the grid as in
+            `get_extended_tetrahedra` with `periodic`.
+
+    Returns:
+        grid (numpy.ndarray): the extended grid in Cartesian coordinates, or the
+            periodic grid if `periodic`.
+        neighborhoods (numpy.ndarray): the indices of the 20 points used to fit the
+            energies of each tetrahedron, ordered as described in
+            `_optimized_offsets`. The first four are the corners of the tetrahedra of
+            `grid_and_tetrahedra`, or `get_grid_tetrahedra` if `periodic`, in the
+            same order of tetrahedra.
+    """
+
+    if type(ndivisions) == int:
+        ndivisions = [ndivisions, ndivisions, ndivisions]
+    ndiv0 = np.array(ndivisions)
+    ndiv3 = ndiv0 + 3
+    extended_grid, _ = get_extended_tetrahedra(EPM, ndivisions, lat_shift, grid_shift,
+                                               periodic)
+    cells = np.reshape(np.stack(np.indices(ndiv0), axis=-1), (-1, 1, 1, 3))
+    if periodic:
+        offset = _grid_offset(EPM, ndivisions, lat_shift, grid_shift)
+        cell_vertices = _grid_points(EPM, ndiv0, [2, 2, 2], offset)
+    else:
+        cell_vertices = extended_grid[[np.ravel_multi_index([kk,kj,ki], ndiv3)
+                                       for kk,kj,ki in product(range(2), repeat=3)]]
+        # The cells of the grid start one point inside the extended grid.
+        cells = cells + 1
+    offsets = _optimized_offsets(cell_vertices)
+
+    positions = tuple(np.transpose(np.reshape(cells + offsets, (-1, 3))))
+    if periodic:
+        neighborhoods = np.ravel_multi_index(positions, ndiv0, mode="wrap")
+    else:
+        neighborhoods = _extended_indices(ndiv0)[positions]
+    return extended_grid, np.reshape(neighborhoods, (-1, 20)).astype(np.int32)
+
+
+def optimized_integration_weights_array(VT, energies, eF):
+    """Determine the integration weights of the optimized tetrahedron method for many
+    tetrahedra and bands at once. The energies at the corners are fitted to the
+    energies at the 20 points around each tetrahedron, the linear tetrahedron weights
+    are found with the fitted energies, and they are spread back over the 20 points.
+
+    Args:
+        VT (float): the volume of the tetrahedra.
+        energies (numpy.ndarray): the energies at the points of the neighborhoods of
+            the tetrahedra from `get_optimized_tetrahedra` along the last axis, with a
+            shape such as (number of tetrahedra, number of bands, 20).
+        eF (float or numpy.ndarray): the Fermi level, or an array of energies.
+
+    Returns:
+        weights (numpy.ndarray): the integration weights of the points of the
+            neighborhoods with shape `energies.shape[:-1] + numpy.shape(eF) + (20,)`.
+    """
+
+    fitted_energies = np.dot(energies, np.transpose(OPTIMIZED_WEIGHTS))
+    order = np.argsort(fitted_energies, axis=-1)
+    fitted_energies = np.take_along_axis(fitted_energies, order, axis=-1)
+    sorted_weights = integration_weights_array(VT, fitted_energies, eF)
+
+    # Put the weights back in the order of the corners.
+    order = np.reshape(order, np.shape(order)[:-1] + (1,)*np.ndim(eF) + (4,))
+    corner_weights = np.empty_like(sorted_weights)
+    np.put_along_axis(corner_weights, np.broadcast_to(order, np.shape(sorted_weights)),
+                      sorted_weights, axis=-1)
+    return np.dot(corner_weights, OPTIMIZED_WEIGHTS)
+
+
+def get_optimized_total_energy(EPM, neighborhoods, extended_grid, ndiv0, energies=None,
+                               fermi_level=None, periodic=False):
+    """Calculate the total energy with the optimized tetrahedron method. It has the
+    same normalization as `get_corrected_total_energy`.
+
+    Args:
+        EPM (:py:obj:`BZI.pseudopots.EmpiricalPseudopotential`): a pseudopotential object.
+            It can be an `EigenvalueCache` to share the eigenvalues with other
+            integrations.
+        neighborhoods (numpy.ndarray): the neighborhoods of the tetrahedra from
+            `get_optimized_tetrahedra`.
+        extended_grid (numpy.ndarray): the extended grid from
+            `get_optimized_tetrahedra`.
+        ndiv0 (list or numpy.ndarray): the number of divisions made creating the grid.
+        energies (numpy.ndarray): the band energies at the points of the extended grid
+            from `calc_grid_energies`. If None, they are evaluated.
+        fermi_level (float): the Fermi level. If None, `EPM.fermi_level` is used.
+        periodic (bool): if true, the neighborhoods are those of
+            `get_optimized_tetrahedra` with `periodic`.
+
+    Returns:
+        total_energy (float): the total energy.
+    """
+
+    if fermi_level is None:
+        fermi_level = EPM.fermi_level
+    nbands = int(np.ceil(EPM.nvalence_electrons/2.))
+    if energies is None:
+        energies = calc_grid_energies(EPM, extended_grid, nbands)
+
+    VT = EPM.lattice.reciprocal_volume/(np.prod(ndiv0)*6)
+    if not periodic:
+        neighborhoods = convert_tet_index(neighborhoods, ndiv0)
+    tet_energies = np.swapaxes(np.asarray(energies[neighborhoods])[..., :nbands], 1, 2)
+    weights = optimized_integration_weights_array(VT, tet_energies, fermi_level)
+    return math.fsum((weights*tet_energies).flatten())
+
+
+def tet_dos_nos(EPM, nbands, grid, energy_list, tetrahedra, weights, energies=None,
+                chunk_size=None, processes=None):
     """Calculate the density of states and number of states using the
     tetrahedron method.
 
@@ -908,30 +2320,39 @@ def tet_dos_nos(EPM, nbands, grid, energy_list, tetrahedra, weights):
         nbands (int): the number of bands included in the calculation.
         grid (list): a list of grid points.
         energy_list (list): a list of energies.
-        tetrahedra (list): a list of quadruples of tetrahedra vectices.
+        tetrahedra (list): a list of quadruples of tetrahedra vectices. See
+            `tetrahedron_chunks` for the other types accepted.
         weights (list): a list of tetrahedron weights.
+        energies (numpy.ndarray): the band energies at the grid points from
+            `calc_grid_energies`, which may be memory-mapped. If None, they are
+            evaluated.
+        chunk_size (int): the number of tetrahedra processed together. If None,
+            arrays of tetrahedra are processed all at once.
+        processes (int): the number of processes the tetrahedra are split among. If
+            None, they are processed in this process.
 
     Returns:
         energy_list (list): a list of energies, the same the argument energy_list.
-        dos (list): a list of density of states values.
-        nos (list): a list of number of states values.
+        dos (numpy.ndarray): a list of density of states values.
+        nos (numpy.ndarray): a list of number of states values.
     """
 
     VG = EPM.lattice.reciprocal_volume
-    VT = VG/len(weights)
-    dos = np.zeros(len(energy_list))
-    nos = np.zeros(len(energy_list))
-
-    # The input 'energy_list' is the same as the energies at which the
-    # tetrahedron method calculates the DOS and NOS.
-    for i,energy in enumerate(energy_list):
-        for k, tet in enumerate(tetrahedra):
-            for band in range(nbands):
-                energies = np.sort([EPM.eval(grid[j], nbands)[band]
-                                        for j in tet])
-                dos[i] += weights[k]*density_of_states(VG, VT,
-                                                           energies, energy)
-                dos[i] += weights[k]*number_of_states(VG, VT,
-                                                           energies, energy)
+    VT = VG/np.sum(weights)
+
+    if energies is None:
+        energies = calc_grid_energies(EPM, grid, nbands, tetrahedra)
+
+    args = (VG, VT, energy_list)
+    if processes is not None and processes > 1:
+        dos_nos = _parallel_tetrahedron_sums(_block_dos_nos, energies, tetrahedra,
+                                             weights, nbands, args, processes,
+                                             chunk_size)
+    else:
+        dos_nos = _tetrahedron_sums(_block_dos_nos, energies,
+                                    tetrahedron_chunks(tetrahedra, weights, chunk_size),
+                                    nbands, args)
 
+    # The sum is zero if there are no tetrahedra.
+    dos, nos = np.zeros((2, len(energy_list))) + dos_nos
     return energy_list, dos, nos
@@ -15,24 +15,52 @@ def run(tests):
                  "test_adjacent_tetrahedra",
                  "test_convert_tet_index",
                  "test_get_grid_tetrahedra",
-                 "test_find_adjacent_tetrahedra"]
+                 "test_find_adjacent_tetrahedra",
+                 "test_calc_total_states",
+                 "test_weight_arrays",
+                 "test_cell_tetrahedra",
+                 "test_vertex_tetrahedra",
+                 "test_corrected_weights_array",
+                 "test_find_fermi_level",
+                 "test_grid_orbit_representatives",
+                 "test_dos_nos_array",
+                 "test_implicit_tetrahedra",
+                 "test_streaming_integration",
+                 "test_point_weights",
+                 "test_optimized_tetrahedra",
+                 "test_parallel_integration",
+                 "test_periodic_extended_tetrahedra"]
 
     elif tests == "improved tetrahedra":
         tests = ["test_corrections",
                  "test_adjacent_tetrahedra",
                  "test_convert_tet_index",
                  "test_get_grid_tetrahedra",
-                 "test_find_adjacent_tetrahedra"]
+                 "test_find_adjacent_tetrahedra",
+                 "test_vertex_tetrahedra",
+                 "test_corrected_weights_array",
+                 "test_optimized_tetrahedra",
+                 "test_periodic_extended_tetrahedra"]
 
     elif tests == "tetrahedra physics":
         tests = ["test_number_of_states",
                  "test_density_of_states",
                  "test_integration_weights",
-                 "test_integrals"]
+                 "test_integrals",
+                 "test_calc_total_states",
+                 "test_weight_arrays",
+                 "test_find_fermi_level",
+                 "test_dos_nos_array",
+                 "test_streaming_integration",
+                 "test_point_weights",
+                 "test_parallel_integration"]
 
     elif tests == "make tetrahedra":
         tests = ["test_grid_and_tetrahedra",
-                 "test_find_irreducible_tetrahedra"]
+                 "test_find_irreducible_tetrahedra",
+                 "test_cell_tetrahedra",
+                 "test_grid_orbit_representatives",
+                 "test_implicit_tetrahedra"]
 
     # Rectangle method tests
     elif tests == "all rectangle":
@@ -40,7 +68,16 @@ def run(tests):
 
     # pseudopotential tests
     elif tests == "all pseudopotential":
-        tests = ["test_pseudopotentials"]
+        tests = ["test_pseudopotentials",
+                 "test_eval_many",
+                 "test_form_factor_matrix",
+                 "test_centrosymmetric",
+                 "test_eigensolvers",
+                 "test_get_material",
+                 "test_lazy_materials",
+                 "test_eigenvalue_cache",
+                 "test_kcentered_basis",
+                 "test_parallel_evaluator"]
 
     # Sampling tests
     elif tests == "all sampling":
@@ -51,7 +88,9 @@ def run(tests):
                  "test_swap_rows",
                  "test_HermiteNormalForm",
                  "test_UpperHermiteNormalForm",
-                 "test_make_grid2"]
+                 "test_make_grid2",
+                 "test_sphere_pts",
+                 "test_store_grid_energies"]
 
     # Symmetry tests
     elif tests == "all symmetry":
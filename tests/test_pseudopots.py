@@ -449,3 +449,327 @@ def test_pseudopotentials():
                  "show": True}
 
     # plot_band_structure(**Sn_params)
+
+@pytest.mark.skipif("test_eval_many" not in tests, reason="different tests")
+def test_eval_many():
+    kpoints = np.random.RandomState(0).uniform(-1, 1, size=(20, 3))
+    for EPM in [Si_EPM, GaAs_EPM, Al_EPM, Toy_EPM, free_EPM, multiple_free_EPM]:
+        energies = [EPM.eval(kpt, 4) for kpt in kpoints]
+        assert np.allclose(energies, EPM.eval_many(kpoints, 4))
+
+    # Atoms away from the origin.
+    EPM = EmpiricalPseudopotential(Al_lattice, Al_pff, Al_energy_cutoff, [0],
+                                   [[0.1, 0.2, 0.3]], 3, "Al")
+    energies = [EPM.eval(kpt, 4) for kpt in kpoints]
+    assert np.allclose(energies, EPM.eval_many(kpoints, 4))
+    energies = [EPM.eval(kpt, 4, adjust=True) for kpt in kpoints[:3]]
+    assert np.allclose(energies, EPM.eval_many(kpoints[:3], 4, adjust=True))
+
+    # Small stacks give the same result.
+    assert np.allclose(Si_EPM.eval_many(kpoints, 8),
+                       Si_EPM.eval_many(kpoints, 8, chunk_size=3))
+
+@pytest.mark.skipif("test_form_factor_matrix" not in tests, reason="different tests")
+def test_form_factor_matrix():
+    kpoint = [0.1, -0.2, 0.3]
+    EPM = CohenEmpiricalPseudopotential(GaAs_lattice, list(GaAs_spff), GaAs_apff,
+                                        GaAs_energy_cutoff, GaAs_atom_labels,
+                                        GaAs_atom_positions,
+                                        GaAs_nvalence_electrons, "GaAs")
+    H = EPM.hamiltonian(kpoint)
+    assert np.allclose(H, np.conj(H.T))
+    assert np.allclose(EPM.eval(kpoint, 8), np.linalg.eigvalsh(H)[:8])
+    
+    # The stored matrix is rebuilt when the form factors change.
+    EPM.antisym_form_factors = Si_apff
+    assert np.allclose(EPM.hamiltonian(kpoint).imag, 0)
+    EPM.antisym_form_factors = GaAs_apff
+    assert np.allclose(EPM.hamiltonian(kpoint), H)
+    EPM.sym_form_factors[1] += 0.1
+    assert not np.allclose(EPM.hamiltonian(kpoint), H)
+
+@pytest.mark.skipif("test_centrosymmetric" not in tests, reason="different tests")
+def test_centrosymmetric():
+    kpoints = np.array([[0.1, -0.2, 0.3], [0.05, 0.1, -0.15]])
+    for EPM in [Si_EPM, Ge_EPM, cSn_EPM]:
+        assert EPM.centrosymmetric()
+        assert EPM.hamiltonian(kpoints[0]).dtype == np.float64
+
+        # The eigenvalues agree with those of the complex Hamiltonian.
+        H = EPM.hamiltonian(kpoints[0]).astype(complex)
+        assert np.allclose(EPM.eval(kpoints[0], 8), np.linalg.eigvalsh(H)[:8])
+        assert np.allclose(EPM.eval_many(kpoints, 8),
+                           [EPM.eval(kpt, 8) for kpt in kpoints])
+
+    GaAs_EPM = CohenEmpiricalPseudopotential(GaAs_lattice, GaAs_spff, GaAs_apff,
+                                             GaAs_energy_cutoff, GaAs_atom_labels,
+                                             GaAs_atom_positions,
+                                             GaAs_nvalence_electrons, "GaAs")
+    assert not GaAs_EPM.centrosymmetric()
+    assert GaAs_EPM.hamiltonian(kpoints[0]).dtype == np.complex128
+
+@pytest.mark.skipif("test_eigensolvers" not in tests, reason="different tests")
+def test_eigensolvers(monkeypatch):
+    import bzi_3D.pseudopots as pseudopots
+    from bzi_3D.pseudopots import _lowest_eigvals, _choose_eigensolver
+    
+    assert _choose_eigensolver(59, 8) == "dense"
+    assert _choose_eigensolver(500, 8) == "subset"
+    assert _choose_eigensolver(500, 400) == "dense"
+    assert _choose_eigensolver(3000, 8) == "subset"
+    assert _choose_eigensolver(3000, 8, warm_start=True) == "lobpcg"
+    assert _choose_eigensolver(30, 8, "lobpcg") == "dense"
+    assert _choose_eigensolver(30, 8, "subset") == "subset"
+    with pytest.raises(ValueError):
+        _choose_eigensolver(30, 8, "davidson")
+    with pytest.raises(ValueError):
+        CohenEmpiricalPseudopotential(Si_lattice, Si_spff, Si_apff,
+                                      Si_energy_cutoff, Si_atom_labels,
+                                      Si_atom_positions, 8, "Si",
+                                      eigensolver="davidson")
+    
+    # A Hermitian matrix large enough for LOBPCG.
+    rstate = np.random.RandomState(0)
+    nbasis = 200
+    A = rstate.normal(size=(nbasis, nbasis)) + 1j*rstate.normal(size=(nbasis, nbasis))
+    H = (A + np.conj(A.T))/20 + np.diag(np.arange(nbasis))
+    exact = np.linalg.eigvalsh(H)
+    for eigensolver in pseudopots.eigensolvers:
+        for neigvals in [1, 8, nbasis + 5]:
+            eigvals, eigvecs = _lowest_eigvals(H, neigvals, eigensolver)
+            assert np.allclose(eigvals, exact[:neigvals])
+    
+    # Start LOBPCG from the eigenvectors of a nearby matrix.
+    eigvals, eigvecs = _lowest_eigvals(H, 8, "lobpcg")
+    assert eigvecs is not None
+    H2 = H + np.diag(np.linspace(0, 0.01, nbasis))
+    eigvals, eigvecs = _lowest_eigvals(H2, 8, "lobpcg", eigvecs)
+    assert np.allclose(eigvals, np.linalg.eigvalsh(H2)[:8])
+    
+    # Fall back to a dense solver when LOBPCG doesn't converge.
+    monkeypatch.setattr(pseudopots, "_lobpcg_maxiter", 1)
+    eigvals, eigvecs = _lowest_eigvals(H, 8, "lobpcg")
+    assert eigvecs is None
+    assert np.allclose(eigvals, exact[:8])
+    monkeypatch.undo()
+    
+    # The pseudopotentials give the same eigenvalues with every eigensolver.
+    kpoints = np.random.RandomState(1).uniform(-1, 1, size=(4, 3))
+    for EPM in [Si_EPM, Al_EPM]:
+        nbasis = len(EPM.rlat_pts)
+        for neigvals in [4, nbasis + 5]:
+            exact = np.array([np.linalg.eigvalsh(EPM.hamiltonian(kpt))[:neigvals]
+                              for kpt in kpoints])
+            for eigensolver in pseudopots.eigensolvers:
+                EPM.eigensolver = eigensolver
+                assert np.allclose([EPM.eval(kpt, neigvals) for kpt in kpoints],
+                                   exact)
+                assert np.allclose(EPM.eval_many(kpoints, neigvals), exact)
+            EPM.eigensolver = "auto"
+
+@pytest.mark.skipif("test_get_material" not in tests, reason="different tests")
+def test_get_material():
+    import bzi_3D.pseudopots as pp
+
+    # The materials are built once and the same objects are returned afterwards.
+    assert pp.get_material("Si") is pp.get_material("Si")
+    assert pp.Si_EPM is pp.get_material("Si")
+    assert pp.Si_lattice is pp.Si_EPM.lattice
+    assert pp.get_material("Al").material == "Al"
+    assert pp.get_material("cSn").material == "Sn"
+
+    # InAs takes its energy cutoff from the reciprocal lattice of GaSb.
+    GaSb_rlat = pp.GaSb_lattice.reciprocal_vectors.T
+    assert np.isclose(pp.InAs_energy_cutoff, max([np.dot(b,b) for b in GaSb_rlat])*5)
+
+    for name in pp.materials:
+        assert name + "_EPM" in pp.__all__
+        assert name + "_EPM" in dir(pp)
+
+    with pytest.raises(ValueError):
+        pp.get_material("unobtainium")
+    with pytest.raises(AttributeError):
+        pp.unobtainium_EPM
+
+@pytest.mark.skipif("test_lazy_materials" not in tests, reason="different tests")
+def test_lazy_materials(monkeypatch):
+    import bzi_3D.pseudopots as pp
+
+    # Only the materials that are used are built.
+    monkeypatch.setattr(pp, "_materials", {})
+    assert pp.Ge_EPM.material == "Ge"
+    assert pp.get_material("Al").material == "Al"
+    assert sorted(pp._materials) == ["Al", "Ge"]
+
+@pytest.mark.skipif("test_eigenvalue_cache" not in tests, reason="different tests")
+def test_eigenvalue_cache():
+    from bzi_3D.tetrahedron import (grid_and_tetrahedra, calc_fermi_level,
+                                    calc_total_energy, get_extended_tetrahedra,
+                                    get_corrected_total_energy)
+    from bzi_3D.integration import rectangular_method
+
+    ndiv = 4
+    for EPM in [Si_EPM, GaAs_EPM, Al_EPM, Sn_EPM, free_EPM]:
+        grid, tetrahedra = grid_and_tetrahedra(EPM, ndiv)
+        cache = EigenvalueCache(EPM, EPM.lattice.reciprocal_vectors/ndiv)
+        # The eigenvalues are those at the representative k-points.
+        points = cache._key_points(cache.keys(grid), grid)
+        assert np.allclose(cache.eval_many(grid, 6), EPM.eval_many(points, 6))
+        assert len(cache) < len(grid)
+        assert cache.misses == len(cache)
+        assert cache.hits + cache.misses == len(grid)
+
+        # A second pass and fewer eigenvalues only use the cache.
+        for kpt, point in zip(grid[::7], points[::7]):
+            assert np.allclose(cache.eval(kpt, 3), EPM.eval(point, 3))
+        assert cache.misses == len(cache)
+
+    # K-points that differ by a reciprocal lattice vector share a key, except for
+    # the free electron model, whose eigenvalues aren't periodic.
+    for EPM in [Si_EPM, free_EPM]:
+        cache = EigenvalueCache(EPM, EPM.lattice.reciprocal_vectors/ndiv)
+        kpt = np.dot(EPM.lattice.reciprocal_vectors, [1, 2, 3])/ndiv
+        shifted = kpt + np.dot(EPM.lattice.reciprocal_vectors, [1, -2, 0])
+        assert (cache.keys([kpt]) == cache.keys([shifted])) == (EPM is Si_EPM)
+    cache = EigenvalueCache(Si_EPM, Si_EPM.lattice.reciprocal_vectors/ndiv,
+                            periodic=False)
+    kpt = np.dot(Si_EPM.lattice.reciprocal_vectors, [1, 2, 3])/ndiv
+    shifted = kpt + np.dot(Si_EPM.lattice.reciprocal_vectors, [1, -2, 0])
+    assert None not in cache.keys([kpt, shifted])
+    assert cache.keys([kpt]) != cache.keys([shifted])
+
+    # Symmetrically equivalent k-points share a key and points off the grid aren't
+    # cached.
+    cache = EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors/ndiv)
+    kpt = np.dot(Al_EPM.lattice.reciprocal_vectors, [1, 2, 3])/ndiv
+    assert cache.keys([kpt]) == cache.keys([-kpt])
+    assert cache.keys([kpt + [1e-3, 0, 0]]) == [None]
+    cache.eval(kpt + [1e-3, 0, 0], 4)
+    cache.eval(kpt + [1e-3, 0, 0], 4)
+    assert len(cache) == 0 and cache.misses == 2
+
+    # Asking for more eigenvalues than are stored recomputes them.
+    point = cache._key_points(cache.keys([kpt]), [kpt])[0]
+    cache.eval(kpt, 2)
+    assert np.allclose(cache.eval(-kpt, 5), Al_EPM.eval(point, 5))
+    assert cache.misses == 4 and cache.hits == 0
+    assert np.allclose(cache.eval(-kpt, 2), Al_EPM.eval(point, 2))
+    assert cache.hits == 1
+
+    # The least recently used k-points are removed first.
+    cache = EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors/ndiv,
+                            maxsize=3, symmetry=False)
+    kpts = [np.dot(Al_EPM.lattice.reciprocal_vectors, [i, 0, 0])/ndiv for i in range(4)]
+    for kpt in kpts[:3]:
+        cache.eval(kpt, 4)
+    cache.eval(kpts[0], 4)
+    cache.eval(kpts[3], 4)
+    assert len(cache) == 3
+    assert cache.keys([kpts[1]])[0] not in cache._cache
+    assert cache.keys([kpts[0]])[0] in cache._cache
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 0 and cache.misses == 0
+
+    # The cache can be used by the integration methods in place of the
+    # pseudopotential.
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndiv)
+    weights = np.ones(len(tetrahedra))
+    cache = EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors/ndiv,
+                            periodic=False)
+    fermi_level = calc_fermi_level(Al_EPM, tetrahedra, weights, grid)
+    assert np.isclose(calc_fermi_level(cache, tetrahedra, weights, grid), fermi_level)
+    misses = cache.misses
+    Al_fermi_level = Al_EPM.fermi_level
+    cache.fermi_level = fermi_level
+    assert Al_EPM.fermi_level == fermi_level
+    assert np.isclose(calc_total_energy(cache, tetrahedra, weights, grid),
+                      calc_total_energy(Al_EPM, tetrahedra, weights, grid))
+    assert cache.misses == misses
+
+    # Different methods share the eigenvalues in the cache. The points of the
+    # extended grid outside the cell are brought back into it.
+    cache = EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors/ndiv)
+    rectangular_method(cache, grid, np.ones(len(grid)))
+    misses = cache.misses
+    hits = cache.hits
+    calc_total_energy(cache, tetrahedra, weights, grid)
+    extended_grid, extended_tetrahedra = get_extended_tetrahedra(Al_EPM, ndiv)
+    get_corrected_total_energy(cache, tetrahedra, extended_tetrahedra, grid,
+                               extended_grid, [ndiv]*3)
+    assert cache.misses == misses
+    assert cache.hits > hits + len(grid)
+    Al_EPM.fermi_level = Al_fermi_level
+
+    with pytest.raises(ValueError):
+        EigenvalueCache(Al_EPM, np.zeros((3,3)))
+    with pytest.raises(ValueError):
+        EigenvalueCache(Al_EPM, Al_EPM.lattice.reciprocal_vectors, maxsize=0)
+
+
+@pytest.mark.skipif("test_kcentered_basis" not in tests, reason="different tests")
+def test_kcentered_basis():
+    EPM = EmpiricalPseudopotential(Al_lattice, Al_pff, Al_energy_cutoff, [0],
+                                   [[0.]*3], 3, "Al")
+    rlat_vecs = EPM.lattice.reciprocal_vectors
+    kpoints = np.dot(np.random.RandomState(1).uniform(-1, 1, size=(10, 3)), rlat_vecs.T)
+
+    # The basis of each k-point is the one found by sphere_pts, and the Hamiltonian
+    # is the same as when it's built from scratch.
+    basis = EPM.kcentered_basis(np.max(norm(kpoints, axis=1)))
+    for kpt in kpoints:
+        rlat_pts, form_factor_mat = basis.select(kpt)
+        check_pts = sphere_pts(rlat_vecs, EPM.energy_cutoff, offset=kpt)
+        assert np.shape(rlat_pts) == np.shape(check_pts)
+        assert np.allclose(rlat_pts, check_pts)
+        r2_mat = np.sum((rlat_pts[:, np.newaxis] - rlat_pts[np.newaxis])**2, 2)
+        H = np.zeros(np.shape(r2_mat))
+        for i in range(1, len(EPM.form_factors)):
+            H[np.isclose(r2_mat, EPM.energy_shells[i])] = EPM.form_factors[i]
+        assert np.allclose(form_factor_mat, H)
+        diag = np.diag(np.sum((rlat_pts + kpt)**2, 1))
+        assert np.allclose(EPM.eval(kpt, 4, adjust=True),
+                           np.linalg.eigvalsh(H + diag)[:4]*Ry_to_eV)
+
+    # The basis is reused by the k-points it covers, and so is the selection of
+    # nearby k-points with the same plane waves.
+    assert EPM.kcentered_basis(0.) is basis
+    assert basis.select(kpoints[0]) is basis.select(kpoints[0] + 1e-9)
+    EPM.eval_many(kpoints, 4, adjust=True)
+    assert EPM.kcentered_basis(0.) is basis
+    EPM.eval(3*kpoints[0], 4, adjust=True)
+    assert EPM.kcentered_basis(0.) is not basis
+
+    # A basis isn't reused by a different lattice.
+    basis = EPM.kcentered_basis(0.)
+    EPM.lattice = Lattice(Al_centering_type, [1.1*Al_lat_const]*3, Al_lat_angles,
+                          convention="angular")
+    new_basis = EPM.kcentered_basis(0.)
+    assert new_basis is not basis
+    assert np.allclose(new_basis.rlat_pts,
+                       sphere_pts(EPM.lattice.reciprocal_vectors,
+                                  (np.sqrt(EPM.energy_cutoff) + new_basis.kmax)**2))
+
+@pytest.mark.skipif("test_parallel_evaluator" not in tests, reason="different tests")
+def test_parallel_evaluator():
+    # The pseudopotentials are rebuilt from their specifications.
+    for EPM in [Si_EPM, Al_EPM, free_EPM]:
+        model = build_model(model_spec(EPM))
+        assert type(model) is type(EPM)
+        assert np.allclose(model.eval([0.1, 0.2, 0.3], 4), EPM.eval([0.1, 0.2, 0.3], 4))
+    assert model_spec(EigenvalueCache(Si_EPM, np.eye(3)))[1]["material"] == "Si"
+
+    kpoints = np.random.RandomState(0).uniform(-1, 1, (50, 3))
+    with ParallelEvaluator(Si_EPM, processes=2, chunk_size=10) as EPM:
+        assert np.allclose(EPM.eval_many(kpoints, 6), Si_EPM.eval_many(kpoints, 6))
+        assert np.allclose(EPM.eval(kpoints[0], 6), Si_EPM.eval(kpoints[0], 6))
+
+        # The workers rebuild the pseudopotential when it changes.
+        EPM.sym_form_factors[1] += 0.1
+        try:
+            assert np.allclose(EPM.eval_many(kpoints, 6), Si_EPM.eval_many(kpoints, 6))
+        finally:
+            EPM.sym_form_factors[1] -= 0.1
+    assert EPM._executor is None
+
+    with pytest.raises(ValueError):
+        ParallelEvaluator(Si_EPM, processes=0)
@@ -71,6 +71,17 @@ def test_make_grid():
             if np.allclose(g0,g1):
                 contained = True
         assert contained == True
+
+    # Every point of a large grid is found once, and the coordinates can be single
+    # precision.
+    lat_vecs = make_rptvecs(make_ptvecs("face", [1.]*3, [np.pi/2]*3))
+    grid_vecs = lat_vecs/40
+    grid = make_grid(lat_vecs, grid_vecs, [0.5]*3, dtype=np.float32)
+    assert np.shape(grid) == (40**3, 3)
+    assert grid.dtype == np.float32
+    lat_grid = make_grid(lat_vecs, grid_vecs, [0]*3, coords="lat")
+    assert len(np.unique(np.round(lat_grid*40).astype(int), axis=0)) == 40**3
+    assert np.all((lat_grid > -1e-12) & (lat_grid < 1))
         
         
 @pytest.mark.skipif("test_make_cell_points" not in tests, reason="different tests")
@@ -370,3 +381,79 @@ def test_make_grid2():
                     for tg in total_grid:
                         if np.dot(tg-offset,tg-offset) <= r:
                             assert check_contained(tg, grid)
+
+
+@pytest.mark.skipif("test_sphere_pts" not in tests, reason="different tests")
+def test_sphere_pts():
+    lat_vecs = make_rptvecs(make_ptvecs("body", [1., 1.2, 1.5], [np.pi/2]*3))
+    for r2, offset in [(40., [0.,0.,0.]), (25., [0.7, -1.3, 2.1])]:
+        grid = sphere_pts(lat_vecs, r2, offset)
+        total_grid = large_sphere_pts(lat_vecs, r2, offset)
+        assert len(grid) == len(total_grid)
+        for g in grid:
+            assert np.dot(g - offset, g - offset) < r2 + 1e-12
+            assert check_contained(g, total_grid)
+
+        # The points are stored and returned again, and they can't be modified.
+        assert sphere_pts(lat_vecs, r2, offset) is grid
+        assert not grid.flags.writeable
+        uncached_grid = sphere_pts(lat_vecs, r2, offset, cache=False)
+        assert uncached_grid is not grid
+        assert np.array_equal(uncached_grid, grid)
+
+@pytest.mark.skipif("test_store_grid_energies" not in tests, reason="different tests")
+def test_store_grid_energies(tmpdir):
+    import json
+    from bzi_3D.sampling import store_grid_energies, load_grid_energies
+    from bzi_3D.pseudopots import Al_EPM
+    from bzi_3D.tetrahedron import grid_and_tetrahedra, calc_total_energy
+    from bzi_3D.integration import rectangular_method
+
+    ndivs = 4
+    nbands = 6
+    directory = str(tmpdir.join("Al_4"))
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndivs)
+    grid_vectors = Al_EPM.lattice.reciprocal_vectors/ndivs
+    energies = store_grid_energies(Al_EPM, grid, nbands, directory, grid_vectors,
+                                   [0.5]*3, chunk_size=10)
+    assert isinstance(energies, np.memmap) and not energies.flags.writeable
+    assert np.allclose(energies, Al_EPM.eval_many(grid, nbands))
+
+    stored_grid, stored_energies, manifest = load_grid_energies(directory)
+    assert np.array_equal(stored_grid, grid)
+    assert manifest["completed"] == len(grid)
+    assert manifest["arguments"]["material"] == Al_EPM.material
+    assert np.allclose(manifest["grid_vectors"], grid_vectors)
+
+    # The integrations read the stored energies.
+    weights = np.ones(len(tetrahedra))
+    assert np.isclose(calc_total_energy(Al_EPM, tetrahedra, weights, grid,
+                                        energies=stored_energies),
+                      calc_total_energy(Al_EPM, tetrahedra, weights, grid))
+    weights = np.ones(len(grid))
+    assert np.allclose(rectangular_method(Al_EPM, grid, weights, energies=stored_energies),
+                       rectangular_method(Al_EPM, grid, weights))
+
+    # A store without the occupied bands can't be integrated.
+    few_bands = store_grid_energies(Al_EPM, grid, 1, str(tmpdir.join("Al_4_1")))
+    with pytest.raises(ValueError):
+        rectangular_method(Al_EPM, grid, weights, energies=few_bands)
+    del stored_energies, energies, few_bands
+
+    # An interrupted calculation continues from the last chunk that was written.
+    manifest["completed"] = 30
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump(manifest, file)
+    mapped_energies = np.load(os.path.join(directory, "energies.npy"), mmap_mode="r+")
+    answer = np.array(mapped_energies)
+    mapped_energies[30:] = np.nan
+    mapped_energies.flush()
+    del mapped_energies
+    assert np.allclose(store_grid_energies(Al_EPM, grid, nbands, directory,
+                                           grid_vectors, [0.5]*3), answer)
+    assert load_grid_energies(directory)[2]["completed"] == len(grid)
+
+    # The energies are evaluated again when the parameters change.
+    energies = store_grid_energies(Al_EPM, grid, nbands + 2, directory, grid_vectors,
+                                   [0.5]*3)
+    assert np.allclose(energies, Al_EPM.eval_many(grid, nbands + 2))
@@ -6,7 +6,7 @@ import itertools
 
 from bzi_3D.tetrahedron import *
 from bzi_3D.pseudopots import FreeElectronModel, Al_EPM, free_EPM
-from bzi_3D.symmetry import make_ptvecs, make_rptvecs, Lattice
+from bzi_3D.symmetry import make_ptvecs, make_rptvecs, Lattice, get_space_group
 from conftest import run
 
 print(Al_EPM.energy_cutoff)
@@ -877,7 +877,7 @@ def test_get_grid_tetrahedra():
     fermi_level = calc_fermi_level(free_EPM, tetrahedra, weights, grid)
     new_fermi_level = calc_fermi_level(free_EPM, new_tetrahedra, weights, new_grid)
 
-    assert fermi_level == new_fermi_level
+    assert np.isclose(fermi_level, new_fermi_level)
 
     irr_tet, weights = find_irreducible_tetrahedra(free_EPM, tetrahedra, grid)
     new_irr_tet, new_weights = find_irreducible_tetrahedra(free_EPM,
@@ -885,7 +885,7 @@ def test_get_grid_tetrahedra():
     fermi_level = calc_fermi_level(free_EPM, irr_tet, weights, grid)
     new_fermi_level = calc_fermi_level(free_EPM, new_irr_tet, new_weights, new_grid)
 
-    assert fermi_level == new_fermi_level
+    assert np.isclose(fermi_level, new_fermi_level)
     # Make sure the tetrahedra for the two methods are the same.
     lat_shift = [-1./2]*3
     grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndivs, lat_shift)
@@ -1188,3 +1188,635 @@ def test_corrections():
     c_energies, corrected_weights = corrected_integration_weights(free, ex_grid, ex_tetrahedra, [0,1,3,7],
                                                                   0, [1,1,1])
     assert np.isclose(corrected_weights[1], uncorrected_weights[1] + correction)
+
+
+@pytest.mark.skipif("test_calc_total_states" not in tests, reason="different tests")
+def test_calc_total_states():
+    # The array version agrees with the number of states of each tetrahedron.
+    VG = np.pi*30
+    VT = VG/48
+    energies = np.sort(np.random.RandomState(0).uniform(-1, 1, (20,3,4)), axis=-1)
+    energies[0,0] = [0.2, 0.2, 0.5, 0.5]
+    energies[1,0] = [0.1]*4
+    for e in [-1.5, -0.5, 0., 0.1, 0.2, 0.3, 0.5, 0.8, 1.5]:
+        nos = [[number_of_states(VG, VT, band_energies, e) for band_energies in tet]
+               for tet in energies]
+        assert np.allclose(number_of_states_array(VG, VT, energies, e), nos)
+
+    # Only the vertices of the tetrahedra are evaluated.
+    ndiv = 3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndiv)
+    nbands = 3
+    energies = calc_grid_energies(Al_EPM, grid, nbands, tetrahedra[:10])
+    vertices = np.unique(tetrahedra[:10])
+    assert np.allclose(energies[vertices], Al_EPM.eval_many(grid[vertices], nbands))
+    assert np.all(np.isnan(np.delete(energies, vertices, axis=0)))
+
+    weights = np.ones(len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands)
+    Vg = Al_EPM.lattice.reciprocal_volume
+    Vt = Vg/len(tetrahedra)
+    for e in [0., 5., 10., 15.]:
+        total_states = 0.
+        for tet in tetrahedra:
+            for band_energies in np.transpose(energies[tet]):
+                total_states += number_of_states(Vg, Vt, np.sort(band_energies), e)
+        assert np.isclose(calc_total_states(Al_EPM, tetrahedra, weights, grid, e,
+                                            nbands), total_states)
+        assert np.isclose(calc_total_states(Al_EPM, tetrahedra, weights, grid, e,
+                                            nbands, energies), total_states)
+
+    fermi_level = calc_fermi_level(Al_EPM, tetrahedra, weights, grid, tol=1e-8)
+    assert np.isclose(calc_total_states(Al_EPM, tetrahedra, weights, grid, fermi_level,
+                                        nbands, energies), Al_EPM.nvalence_electrons,
+                      atol=1e-8)
+
+
+@pytest.mark.skipif("test_weight_arrays" not in tests, reason="different tests")
+def test_weight_arrays():
+    # The array kernels agree with the kernels of single tetrahedra for every
+    # case, including degenerate energies.
+    VG = np.pi*30
+    VT = VG/48
+    energies = np.sort(np.random.RandomState(1).uniform(-1, 1, (15,2,4)), axis=-1)
+    energies[0,0] = [0.2, 0.2, 0.5, 0.5]
+    energies[0,1] = [-0.3, 0.1, 0.1, 0.1]
+    energies[1,0] = [0.1]*4
+    energy_list = np.array([-1.5, -0.5, -0.3, 0., 0.1, 0.2, 0.3, 0.5, 0.8, 1.5])
+
+    nos = number_of_states_array(VG, VT, energies, energy_list)
+    dos = density_of_states_array(VG, VT, energies, energy_list)
+    weights = integration_weights_array(VT, energies, energy_list)
+    assert np.shape(nos) == (15, 2, len(energy_list))
+    assert np.shape(dos) == (15, 2, len(energy_list))
+    assert np.shape(weights) == (15, 2, len(energy_list), 4)
+
+    for i,j in itertools.product(range(15), range(2)):
+        for k,e in enumerate(energy_list):
+            assert np.isclose(nos[i,j,k], number_of_states(VG, VT, energies[i,j], e))
+            assert np.allclose(weights[i,j,k], integration_weights(VT, energies[i,j], e))
+            # The single tetrahedron density of states divides by zero when the
+            # energy equals the three highest corner energies.
+            if not (e == energies[i,j,2] == energies[i,j,3]):
+                assert np.isclose(dos[i,j,k], density_of_states(VG, VT, energies[i,j], e))
+
+    # A single energy drops the energy axis.
+    assert np.allclose(number_of_states_array(VG, VT, energies, 0.3), nos[:,:,6])
+    assert np.allclose(density_of_states_array(VG, VT, energies, 0.3), dos[:,:,6])
+    assert np.allclose(integration_weights_array(VT, energies, 0.3), weights[:,:,6])
+
+    # The total weight of a tetrahedron is its share of the number of states.
+    assert np.allclose(np.sum(weights, axis=-1), nos*VG/2)
+
+    # The array kernels give the same total energy as the single tetrahedron kernels.
+    ndiv = 3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndiv)
+    tet_weights = np.ones(len(tetrahedra))
+    nbands = int(np.ceil(Al_EPM.nvalence_electrons/2))
+    VT = Al_EPM.lattice.reciprocal_volume/len(tetrahedra)
+    energies = Al_EPM.eval_many(grid, nbands)
+    total_energy = 0.
+    for tet in tetrahedra:
+        for band_energies in np.transpose(energies[tet]):
+            band_energies = np.sort(band_energies)
+            total_energy += np.dot(integration_weights(VT, band_energies,
+                                                       Al_EPM.fermi_level), band_energies)
+    assert np.isclose(calc_total_energy(Al_EPM, tetrahedra, tet_weights, grid),
+                      total_energy)
+
+
+@pytest.mark.skipif("test_cell_tetrahedra" not in tests, reason="different tests")
+def test_cell_tetrahedra():
+    # Compare the tetrahedra to those found by splitting each cell separately.
+    ndiv0 = np.array([2,3,4])
+    lat_shift = [0.1, 0.2, 0.3]
+    grid_shift = [0.5]*3
+    for EPM in [Al_EPM, free_EPM]:
+        grid, tetrahedra = grid_and_tetrahedra(EPM, ndiv0, lat_shift, grid_shift)
+        assert tetrahedra.dtype == np.int32
+        assert len(tetrahedra) == 6*np.prod(ndiv0)
+
+        ndiv1 = ndiv0 + 1
+        indices = np.arange(len(grid)).reshape(ndiv1)
+        assert np.allclose(grid[indices[1,2,3]], np.dot(EPM.lattice.reciprocal_vectors,
+                                                        np.array([3,2,1])/ndiv0) +
+                           grid[0])
+        check_tetrahedra = []
+        for k,j,i in itertools.product(range(ndiv0[0]), range(ndiv0[1]),
+                                       range(ndiv0[2])):
+            submesh_indices = [indices[k + kk, j + kj, i + ki] for kk,kj,ki in
+                               itertools.product(range(2), repeat=3)]
+            for tet in find_tetrahedra(grid[submesh_indices]):
+                check_tetrahedra.append([submesh_indices[n-1] for n in tet])
+        assert np.array_equal(tetrahedra, check_tetrahedra)
+
+        # The periodic grid has the same tetrahedra with the indices of the points on
+        # the far faces replaced by those on the near faces.
+        periodic_grid, periodic_tetrahedra = get_grid_tetrahedra(EPM, ndiv0, lat_shift,
+                                                                 grid_shift)
+        extended_grid, periodic_indices = make_extended_grid_indices(EPM, ndiv0,
+                                                                     lat_shift,
+                                                                     grid_shift)
+        assert np.allclose(extended_grid, grid)
+        assert np.array_equal(periodic_indices[tetrahedra], periodic_tetrahedra)
+        inner = indices[:ndiv0[0], :ndiv0[1], :ndiv0[2]].flatten()
+        assert np.allclose(periodic_grid, grid[inner])
+
+    # Large grids are made quickly.
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, 40)
+    assert np.shape(tetrahedra) == (6*40**3, 4)
+    extended_grid, extended_tetrahedra = get_extended_tetrahedra(Al_EPM, 40)
+    assert np.shape(extended_tetrahedra) == (6*42**3, 4)
+
+
+@pytest.mark.skipif("test_vertex_tetrahedra" not in tests, reason="different tests")
+def test_vertex_tetrahedra():
+    ndiv0 = [2,2,2]
+    lat_shift = [-1./2]*3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndiv0, lat_shift)
+    extended_grid, extended_tetrahedra = get_extended_tetrahedra(Al_EPM, ndiv0, lat_shift)
+    indptr, tet_indices = vertex_tetrahedra(extended_tetrahedra)
+    assert len(indptr) == np.max(extended_tetrahedra) + 2
+    assert indptr[-1] == np.size(extended_tetrahedra)
+
+    # The index agrees with a search through all the tetrahedra.
+    for k in range(len(indptr) - 1):
+        adjacent_tetrahedra = [tet.tolist() for tet in extended_tetrahedra if k in tet]
+        assert find_adjacent_tetrahedra(extended_tetrahedra, k) == adjacent_tetrahedra
+        assert find_adjacent_tetrahedra(extended_tetrahedra, k,
+                                        (indptr, tet_indices)) == adjacent_tetrahedra
+
+    # Converting many indices at once gives the same positions as one at a time.
+    indices = np.arange(np.max(extended_tetrahedra) + 1)
+    assert np.array_equal(convert_tet_index(indices, ndiv0),
+                          [convert_tet_index(i, ndiv0) for i in indices])
+
+    # The corrected weights are the same with the index and energies computed ahead of
+    # time.
+    weights = np.ones(len(tetrahedra))
+    Al_fermi_level = Al_EPM.fermi_level
+    Al_EPM.fermi_level = calc_fermi_level(Al_EPM, tetrahedra, weights, grid)
+    nbands = int(np.ceil(Al_EPM.nvalence_electrons/2)+1)
+    energies = calc_grid_energies(Al_EPM, extended_grid, nbands)
+    for tet in tetrahedra[::5]:
+        for iband in range(nbands - 1):
+            tet_energies, tet_weights = corrected_integration_weights(
+                Al_EPM, extended_grid, extended_tetrahedra, tet, iband, ndiv0)
+            check_energies, check_weights = corrected_integration_weights(
+                Al_EPM, extended_grid, extended_tetrahedra, tet, iband, ndiv0,
+                (indptr, tet_indices), energies)
+            assert np.allclose(tet_energies, check_energies)
+            assert np.allclose(tet_weights, check_weights)
+    Al_EPM.fermi_level = Al_fermi_level
+
+
+@pytest.mark.skipif("test_corrected_weights_array" not in tests, reason="different tests")
+def test_corrected_weights_array():
+    for EPM, ndiv0 in [(Al_EPM, [2,2,2]), (Al_EPM, [2,3,4]), (free_EPM, [2,2,2])]:
+        grid, tetrahedra = grid_and_tetrahedra(EPM, ndiv0)
+        extended_grid, extended_tetrahedra = get_extended_tetrahedra(EPM, ndiv0)
+        weights = np.ones(len(tetrahedra))
+        fermi_level = EPM.fermi_level
+        EPM.fermi_level = calc_fermi_level(EPM, tetrahedra, weights, grid)
+
+        nbands = int(np.ceil(EPM.nvalence_electrons/2)+1)
+        energies = calc_grid_energies(EPM, extended_grid, nbands)
+        tet_energies, tet_weights = corrected_integration_weights_array(
+            EPM, tetrahedra, extended_tetrahedra, energies, ndiv0)
+        assert np.shape(tet_weights) == (len(tetrahedra), np.shape(energies)[1], 4)
+        assert np.all(np.diff(tet_energies, axis=-1) >= 0)
+
+        # The weights agree with those found for one tetrahedron and band at a time.
+        total_energy = 0.
+        for i,tet in enumerate(tetrahedra):
+            for iband in range(min(nbands - 1, np.shape(energies)[1])):
+                check_energies, check_weights = corrected_integration_weights(
+                    EPM, extended_grid, extended_tetrahedra, tet, iband, ndiv0)
+                assert np.allclose(tet_energies[i,iband], check_energies)
+                assert np.allclose(tet_weights[i,iband], check_weights)
+                total_energy += np.dot(check_weights, check_energies)
+
+        assert np.isclose(get_corrected_total_energy(EPM, tetrahedra, extended_tetrahedra,
+                                                     grid, extended_grid, ndiv0),
+                          total_energy)
+        EPM.fermi_level = fermi_level
+
+
+@pytest.mark.skipif("test_find_fermi_level" not in tests, reason="different tests")
+def test_find_fermi_level():
+    ndiv = 4
+    for EPM in [Al_EPM, free_EPM]:
+        grid, tetrahedra = grid_and_tetrahedra(EPM, ndiv)
+        weights = np.ones(len(tetrahedra))
+        nbands = int(np.ceil(EPM.nvalence_electrons)) + 1
+        new_fermi_level, npasses = find_fermi_level(EPM, tetrahedra, weights, grid,
+                                                    tol=1e-10)
+        assert calc_fermi_level(EPM, tetrahedra, weights, grid,
+                                tol=1e-10) == new_fermi_level
+        assert npasses <= 10
+        assert np.isclose(calc_total_states(EPM, tetrahedra, weights, grid,
+                                            new_fermi_level, nbands),
+                          EPM.nvalence_electrons, atol=1e-10)
+
+        # The energies can be evaluated ahead of time.
+        energies = calc_grid_energies(EPM, grid, nbands)
+        assert find_fermi_level(EPM, tetrahedra, weights, grid, tol=1e-10,
+                                energies=energies) == (new_fermi_level, npasses)
+
+        # The passes stream over blocks of tetrahedra, implicit tetrahedra, and
+        # tetrahedra split among processes.
+        implicit_tetrahedra = implicit_grid_tetrahedra(EPM, ndiv)[1]
+        for tets, chunk_size, processes in [(tetrahedra, 50, None),
+                                            (implicit_tetrahedra, 100, None),
+                                            (tetrahedra, None, 2)]:
+            fermi_level, _ = find_fermi_level(EPM, tets, weights, grid, tol=1e-10,
+                                              energies=energies, chunk_size=chunk_size,
+                                              processes=processes)
+            assert np.isclose(fermi_level, new_fermi_level)
+
+    with pytest.raises(ValueError):
+        find_fermi_level(Al_EPM, tetrahedra, weights, grid, tol=1e-14, maxiter=1)
+    with pytest.raises(ValueError):
+        find_fermi_level(Al_EPM, (block for block in [tetrahedra]), weights, grid)
+
+
+@pytest.mark.skipif("test_grid_orbit_representatives" not in tests,
+                    reason="different tests")
+def test_grid_orbit_representatives():
+    lat_shift = [-1./2]*3
+    for EPM in [Al_EPM, free_EPM]:
+        grid, tetrahedra = get_grid_tetrahedra(EPM, 4, lat_shift)
+        representatives = grid_orbit_representatives(EPM, grid)
+
+        # Every representative represents itself and comes first in its orbit.
+        assert all(representatives[representatives] == representatives)
+        assert all(representatives <= np.arange(len(grid)))
+
+        # Points in the same orbit are related by a point group operator and a
+        # reciprocal lattice vector.
+        pointgroup = get_space_group(EPM.lattice.vectors, EPM.atom_labels,
+                                     EPM.atom_positions, coords="Cart")[0]
+        rlat_vecs = EPM.lattice.reciprocal_vectors
+        for i, j in enumerate(representatives):
+            diffs = [np.dot(np.linalg.inv(rlat_vecs), np.dot(pg, grid[i]) - grid[j])
+                     for pg in pointgroup]
+            assert any([np.allclose(d, np.round(d)) for d in diffs])
+
+        irr_tet, weights = find_irreducible_tetrahedra(EPM, tetrahedra, grid)
+        assert np.sum(weights) == len(tetrahedra)
+        assert len(np.unique(irr_tet, axis=0)) == len(irr_tet)
+        assert all(np.equal(irr_tet, np.sort(representatives[irr_tet], axis=1)).flatten())
+
+    # The free electron energies only depend on the length of the k-point so they
+    # are the same for every point in an orbit.
+    grid, tetrahedra = get_grid_tetrahedra(free_EPM, 6, lat_shift)
+    representatives = grid_orbit_representatives(free_EPM, grid)
+    energies = calc_grid_energies(free_EPM, grid, 1)
+    assert np.allclose(energies, energies[representatives])
+    assert len(np.unique(representatives)) < len(grid)/4
+
+    irr_tet, weights = find_irreducible_tetrahedra(free_EPM, tetrahedra, grid)
+    assert np.isclose(calc_fermi_level(free_EPM, tetrahedra, np.ones(len(tetrahedra)),
+                                       grid),
+                      calc_fermi_level(free_EPM, irr_tet, weights, grid))
+
+
+@pytest.mark.skipif("test_dos_nos_array" not in tests, reason="different tests")
+def test_dos_nos_array():
+    ndiv = 4
+    nbands = 3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndiv)
+    weights = np.ones(len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands)
+    tet_energies = np.sort(np.swapaxes(energies[tetrahedra], 1, 2), axis=-1)
+    VG = Al_EPM.lattice.reciprocal_volume
+    VT = VG/len(tetrahedra)
+
+    # The energies don't need to be sorted and the result doesn't depend on how
+    # many pairs of tetrahedra and energies are evaluated together.
+    energy_list = np.random.RandomState(0).uniform(-2, 30, 100)
+    dos = np.sum(density_of_states_array(VG, VT, tet_energies, energy_list), axis=(0,1))
+    nos = np.sum(number_of_states_array(VG, VT, tet_energies, energy_list), axis=(0,1))
+    for max_pairs in [10, 1000, 2**22]:
+        new_dos, new_nos = dos_nos_array(VG, VT, tet_energies, weights, energy_list,
+                                         max_pairs=max_pairs)
+        assert np.allclose(dos, new_dos)
+        assert np.allclose(nos, new_nos)
+
+    # The number of states is returned separately from the density of states.
+    energy_list = np.linspace(-2, 30, 50)
+    energy_list, dos, nos = tet_dos_nos(Al_EPM, nbands, grid, energy_list, tetrahedra,
+                                        weights, energies=energies)
+    assert np.allclose(nos[-1], 2*nbands)
+    assert all(np.diff(nos) >= 0)
+    assert np.isclose(nos[10], calc_total_states(Al_EPM, tetrahedra, weights, grid,
+                                                 energy_list[10], nbands,
+                                                 energies=energies))
+    dos_10 = 0
+    for i, tet in enumerate(tetrahedra):
+        for band in range(nbands):
+            dos_10 += weights[i]*density_of_states(VG, VT, np.sort(energies[tet, band]),
+                                                   energy_list[10])
+    assert np.isclose(dos[10], dos_10)
+
+
+@pytest.mark.skipif("test_implicit_tetrahedra" not in tests, reason="different tests")
+def test_implicit_tetrahedra():
+    lat_shift = [-1./2]*3
+    grid_shift = [1./2, 0, 0]
+    for EPM in [Al_EPM, free_EPM]:
+        for ndivs in [3, [2,3,4]]:
+            for periodic, make in [(False, grid_and_tetrahedra),
+                                   (True, get_grid_tetrahedra)]:
+                grid, tetrahedra = make(EPM, ndivs, lat_shift, grid_shift)
+                new_grid, new_tetrahedra = implicit_grid_tetrahedra(
+                    EPM, ndivs, lat_shift, grid_shift, periodic=periodic)
+
+                assert np.allclose(grid, new_grid)
+                assert len(new_tetrahedra) == len(tetrahedra)
+                assert np.array_equal(np.asarray(new_tetrahedra), tetrahedra)
+                assert np.array_equal(new_tetrahedra[5], tetrahedra[5])
+                assert np.array_equal(new_tetrahedra[-1], tetrahedra[-1])
+                assert np.array_equal(new_tetrahedra[7:23], tetrahedra[7:23])
+                assert np.array_equal(new_tetrahedra[1::5], tetrahedra[1::5])
+                indices = np.random.RandomState(0).randint(-len(tetrahedra),
+                                                           len(tetrahedra), 50)
+                assert np.array_equal(new_tetrahedra[indices], tetrahedra[indices])
+                assert np.array_equal(np.concatenate(list(new_tetrahedra.chunks(7))),
+                                      tetrahedra)
+
+    with pytest.raises(IndexError):
+        new_tetrahedra[len(new_tetrahedra)]
+
+
+@pytest.mark.skipif("test_streaming_integration" not in tests, reason="different tests")
+def test_streaming_integration(tmpdir):
+    import tracemalloc
+
+    ndivs = 4
+    nbands = 3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, ndivs)
+    weights = np.ones(len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands)
+    energy_list = np.linspace(-2, 30, 50)
+    total_states = calc_total_states(Al_EPM, tetrahedra, weights, grid,
+                                     Al_EPM.fermi_level, nbands, energies=energies)
+    total_energy = calc_total_energy(Al_EPM, tetrahedra, weights, grid)
+    dos, nos = tet_dos_nos(Al_EPM, nbands, grid, energy_list, tetrahedra, weights,
+                           energies=energies)[1:]
+
+    # The energies can be read from a memory-mapped file and the tetrahedra can be
+    # implicit, in blocks of an array, or from a generator.
+    filename = str(tmpdir.join("energies.npy"))
+    np.save(filename, energies)
+    mapped_energies = np.load(filename, mmap_mode="r")
+    implicit_tetrahedra = implicit_grid_tetrahedra(Al_EPM, ndivs)[1]
+    for tets, chunk_size in [(tetrahedra, 7), (implicit_tetrahedra, 100),
+                             (implicit_tetrahedra.chunks(33), None)]:
+        assert np.isclose(calc_total_states(Al_EPM, tets, weights, grid,
+                                            Al_EPM.fermi_level, nbands,
+                                            energies=mapped_energies,
+                                            chunk_size=chunk_size), total_states)
+    for tets, chunk_size in [(tetrahedra, 7), (implicit_tetrahedra, 100),
+                             (implicit_tetrahedra.chunks(33), None)]:
+        assert np.isclose(calc_total_energy(Al_EPM, tets, weights, grid,
+                                            energies=mapped_energies,
+                                            chunk_size=chunk_size), total_energy)
+    for tets, chunk_size in [(tetrahedra, 7), (implicit_tetrahedra, 100),
+                             (implicit_tetrahedra.chunks(33), None)]:
+        new_dos, new_nos = tet_dos_nos(Al_EPM, nbands, grid, energy_list, tets, weights,
+                                       energies=mapped_energies,
+                                       chunk_size=chunk_size)[1:]
+        assert np.allclose(dos, new_dos)
+        assert np.allclose(nos, new_nos)
+
+    # The memory used by the integration doesn't grow with the grid.
+    ndivs = 30
+    grid, tetrahedra = implicit_grid_tetrahedra(free_EPM, ndivs)
+    energies = np.sum(grid**2, axis=1)[:, None]
+    weights = np.ones(len(tetrahedra))
+    tracemalloc.start()
+    total_states = calc_total_states(free_EPM, tetrahedra, weights, grid, 20., 1,
+                                     energies=energies, chunk_size=1000)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 10*1000*4*8
+    assert np.isclose(total_states, calc_total_states(free_EPM, np.asarray(tetrahedra),
+                                                      weights, grid, 20., 1,
+                                                      energies=energies))
+
+
+@pytest.mark.skipif("test_point_weights" not in tests, reason="different tests")
+def test_point_weights():
+    # The delta weights are the derivatives of the integration weights and add up to
+    # the density of states.
+    VG = Al_EPM.lattice.reciprocal_volume
+    VT = VG/100
+    energies = np.sort(np.random.RandomState(1).uniform(0, 5, (50, 3, 4)), axis=-1)
+    energy_list = np.linspace(-0.5, 5.5, 37)
+    de = 1e-6
+    derivative = (integration_weights_array(VT, energies, energy_list + de) -
+                  integration_weights_array(VT, energies, energy_list - de))/(2*de)
+    delta_weights = delta_weights_array(VT, energies, energy_list)
+    assert np.allclose(derivative, delta_weights, atol=1e-8)
+    assert np.allclose(np.sum(delta_weights, axis=-1)*2/VG,
+                       density_of_states_array(VG, VT, energies, energy_list))
+
+    # Integrating the band energies with the occupation weights gives the total energy
+    # and integrating one with the delta weights gives the density of states.
+    nbands = 2
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, 4)
+    weights = np.ones(len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands)
+    fermi_level = 7.
+    point_weights = occupation_point_weights(Al_EPM, tetrahedra, weights, energies,
+                                             fermi_level, chunk_size=100)
+    assert np.shape(point_weights) == (len(grid), nbands)
+    tet_energies = np.sort(np.swapaxes(energies[tetrahedra], 1, 2), axis=-1)
+    int_weights = integration_weights_array(VG/len(tetrahedra), tet_energies,
+                                            fermi_level)
+    assert np.isclose(integrate_point_weights(point_weights, energies),
+                      np.sum(int_weights*tet_energies))
+
+    energy_list = np.array([5., 8., 10.])
+    point_weights = delta_point_weights(Al_EPM, tetrahedra, weights, energies,
+                                        energy_list)
+    assert np.shape(point_weights) == (len(grid), nbands, len(energy_list))
+    dos = tet_dos_nos(Al_EPM, nbands, grid, energy_list, tetrahedra, weights,
+                      energies=energies)[1]
+    assert np.allclose(integrate_point_weights(point_weights, np.ones_like(energies))*
+                       2/VG, dos)
+
+    # Quantities with more than one component are integrated together.
+    values = np.stack([energies, energies**2], axis=-1)
+    integrals = integrate_point_weights(point_weights, values)
+    assert np.shape(integrals) == (len(energy_list), 2)
+    assert np.allclose(integrals[:,0], integrate_point_weights(point_weights, energies))
+
+    # Many small blocks on a larger grid give the same weights as a single block.
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, 7)
+    weights = np.random.RandomState(2).uniform(0.5, 1.5, len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands)
+    for point_weights_function, e in [(occupation_point_weights, fermi_level),
+                                      (delta_point_weights, energy_list)]:
+        point_weights = point_weights_function(Al_EPM, tetrahedra, weights, energies,
+                                               e)
+        assert np.allclose(point_weights_function(Al_EPM, tetrahedra, weights,
+                                                  energies, e, chunk_size=13),
+                           point_weights)
+        assert np.allclose(point_weights_function(
+            Al_EPM, implicit_grid_tetrahedra(Al_EPM, 7)[1], weights, energies, e,
+            chunk_size=50), point_weights)
+
+
+@pytest.mark.skipif("test_optimized_tetrahedra" not in tests, reason="different tests")
+def test_optimized_tetrahedra():
+    ndiv0 = [3,3,3]
+    extended_grid, neighborhoods = get_optimized_tetrahedra(free_EPM, ndiv0)
+    grid, tetrahedra = grid_and_tetrahedra(free_EPM, ndiv0)
+    assert np.shape(neighborhoods) == (len(tetrahedra), 20)
+    assert np.array_equal(np.sort(neighborhoods[:,:4]), np.sort(tetrahedra))
+
+    # The fitted energies of a linear function are its values at the corners.
+    points = extended_grid[convert_tet_index(neighborhoods, ndiv0)]
+    energies = np.dot(points, [0.3, -1.2, 0.7])
+    assert np.allclose(np.dot(energies, OPTIMIZED_WEIGHTS.T), energies[:,:4])
+    assert np.allclose(points[:,4], 2*points[:,0] - points[:,1])
+    assert np.allclose(points[:,19], points[:,2] - points[:,3] + points[:,0])
+
+    # The weights of occupied tetrahedra add up to their volume.
+    VT = free_EPM.lattice.reciprocal_volume/len(tetrahedra)
+    weights = optimized_integration_weights_array(VT, energies, [energies.max() + 1,
+                                                                 energies.min() - 1])
+    assert np.shape(weights) == (len(tetrahedra), 2, 20)
+    assert np.allclose(np.sum(weights, axis=-1), [VT, 0])
+
+    # The total energy of the free electron model converges much faster than with
+    # the linear tetrahedron method.
+    fermi_level = free_EPM.fermi_level
+    free_EPM.fermi_level = free_EPM.fermi_level_ans
+    linear_energies = []
+    optimized_energies = []
+    for ndiv in [4, 8]:
+        grid, tetrahedra = grid_and_tetrahedra(free_EPM, ndiv)
+        linear_energies.append(calc_total_energy(free_EPM, tetrahedra,
+                                                 np.ones(len(tetrahedra)), grid))
+        extended_grid, neighborhoods = get_optimized_tetrahedra(free_EPM, ndiv)
+        optimized_energies.append(get_optimized_total_energy(free_EPM, neighborhoods,
+                                                             extended_grid, [ndiv]*3))
+    assert (abs(np.diff(optimized_energies)) < abs(np.diff(linear_energies))/10)
+    free_EPM.fermi_level = fermi_level
+
+
+@pytest.mark.skipif("test_parallel_integration" not in tests, reason="different tests")
+def test_parallel_integration(monkeypatch):
+    from multiprocessing import Pool
+    import bzi_3D.tetrahedron as tetrahedron
+
+    nbands = 3
+    grid, tetrahedra = grid_and_tetrahedra(Al_EPM, 5)
+    weights = np.ones(len(tetrahedra))
+    energies = calc_grid_energies(Al_EPM, grid, nbands + 1)
+    energy_list = np.linspace(0, 12, 25)
+    fermi_level = Al_EPM.fermi_level
+    Al_EPM.fermi_level = 7.
+
+    # Splitting the tetrahedra among processes gives the same sums, and the sums
+    # don't depend on how the processes are scheduled.
+    _, implicit_tetrahedra = implicit_grid_tetrahedra(Al_EPM, 5)
+    for tets, chunk_size in [(tetrahedra, None), (tetrahedra, 100),
+                             (implicit_tetrahedra, 100)]:
+        total_states = calc_total_states(Al_EPM, tets, weights, grid, 7., nbands,
+                                         energies=energies, chunk_size=chunk_size,
+                                         processes=3)
+        assert np.isclose(total_states,
+                          calc_total_states(Al_EPM, tetrahedra, weights, grid, 7., nbands,
+                                            energies=energies))
+        total_energy = calc_total_energy(Al_EPM, tets, weights, grid, energies=energies,
+                                         chunk_size=chunk_size, processes=3)
+        assert np.isclose(total_energy,
+                          calc_total_energy(Al_EPM, tetrahedra, weights, grid,
+                                            energies=energies))
+        assert total_energy == calc_total_energy(Al_EPM, tets, weights, grid,
+                                                 energies=energies,
+                                                 chunk_size=chunk_size, processes=3)
+        _, dos, nos = tet_dos_nos(Al_EPM, nbands, grid, energy_list, tets, weights,
+                                  energies=energies, chunk_size=chunk_size,
+                                  processes=2)
+        _, check_dos, check_nos = tet_dos_nos(Al_EPM, nbands, grid, energy_list,
+                                              tetrahedra, weights, energies=energies)
+        assert np.allclose(dos, check_dos)
+        assert np.allclose(nos, check_nos)
+
+    # A generator of tetrahedra can't be split among processes.
+    with pytest.raises(ValueError):
+        calc_total_states(Al_EPM, (block for block in [tetrahedra]), weights, grid, 7.,
+                          nbands, energies=energies, processes=2)
+    Al_EPM.fermi_level = fermi_level
+
+    # The processes and shared memory are made once for all the passes of the Fermi
+    # level search.
+    pools = []
+    def counted_pool(processes):
+        pools.append(processes)
+        return Pool(processes)
+    monkeypatch.setattr(tetrahedron, "Pool", counted_pool)
+    new_fermi_level, npasses = find_fermi_level(Al_EPM, tetrahedra, weights, grid,
+                                                tol=1e-10, energies=energies,
+                                                processes=2)
+    assert npasses > 1
+    assert pools == [2]
+    assert np.isclose(new_fermi_level,
+                      find_fermi_level(Al_EPM, tetrahedra, weights, grid, tol=1e-10,
+                                       energies=energies)[0])
+
+
+class CosineModel(object):
+    """A model with band energies that are periodic in the reciprocal lattice."""
+
+    def __init__(self, EPM):
+        self.lattice = EPM.lattice
+        self.nvalence_electrons = 3
+        self.fermi_level = 0.3
+
+    def eval_many(self, kpoints, neigvals):
+        coords = np.dot(kpoints, np.linalg.inv(self.lattice.reciprocal_vectors).T)
+        energies = -np.sum(np.cos(2*np.pi*coords), axis=-1)
+        return np.stack([energies + 2*n for n in range(neigvals)], axis=-1)
+
+
+@pytest.mark.skipif("test_periodic_extended_tetrahedra" not in tests,
+                    reason="different tests")
+def test_periodic_extended_tetrahedra():
+    model = CosineModel(Al_EPM)
+    for ndiv0 in [[3,3,3], [4,4,4]]:
+        grid, tetrahedra = grid_and_tetrahedra(model, ndiv0)
+        extended_grid, extended_tetrahedra = get_extended_tetrahedra(model, ndiv0)
+        periodic_grid, periodic_tetrahedra = get_extended_tetrahedra(model, ndiv0,
+                                                                     periodic=True)
+        check_grid, check_tetrahedra = get_grid_tetrahedra(model, ndiv0)
+        assert np.allclose(periodic_grid, check_grid)
+        assert np.array_equal(periodic_tetrahedra, check_tetrahedra)
+
+        # Every point is only evaluated once, and the corrected weights are the same
+        # when the energies are periodic.
+        assert len(periodic_grid) == np.prod(ndiv0)
+        assert np.isclose(get_corrected_total_energy(model, periodic_tetrahedra,
+                                                     periodic_tetrahedra, periodic_grid,
+                                                     periodic_grid, ndiv0,
+                                                     periodic=True),
+                          get_corrected_total_energy(model, tetrahedra,
+                                                     extended_tetrahedra, grid,
+                                                     extended_grid, ndiv0))
+
+        # The same holds for the optimized tetrahedron method.
+        extended_grid, neighborhoods = get_optimized_tetrahedra(model, ndiv0)
+        periodic_grid, periodic_neighborhoods = get_optimized_tetrahedra(
+            model, ndiv0, periodic=True)
+        assert np.array_equal(np.sort(periodic_neighborhoods[:,:4]),
+                              np.sort(periodic_tetrahedra))
+        assert np.isclose(get_optimized_total_energy(model, periodic_neighborhoods,
+                                                     periodic_grid, ndiv0,
+                                                     periodic=True),
+                          get_optimized_total_energy(model, neighborhoods,
+                                                     extended_grid, ndiv0))